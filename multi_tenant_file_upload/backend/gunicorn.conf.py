@@ -0,0 +1,40 @@
+# gunicorn reads this file from the working directory, next to manage.py
+import os
+import shutil
+import tempfile
+
+# the workers write their metrics to files there, a scrape of /metrics sums them up
+os.environ.setdefault(
+    "PROMETHEUS_MULTIPROC_DIR", os.path.join(tempfile.gettempdir(), "mtfu_metrics")
+)
+
+
+def on_starting(server):
+    # the samples of a previous run would be summed up too
+    shutil.rmtree(os.environ["PROMETHEUS_MULTIPROC_DIR"], ignore_errors=True)
+    os.makedirs(os.environ["PROMETHEUS_MULTIPROC_DIR"])
+
+
+def post_worker_init(worker):
+    # the app is loaded now, connect to S3 before the first request has to
+    from mtfu.file_manager.s3_utils import S3_CLIENTS
+
+    S3_CLIENTS.warm_up()
+
+
+def worker_exit(server, worker):
+    from mtfu.file_manager.file_cache import get_file_cache
+    from mtfu.file_manager.s3_utils import S3_CLIENTS
+
+    server.log.info("S3 connection pools of worker %s: %s", worker.pid, S3_CLIENTS.stats())
+    cache = get_file_cache()
+    if cache is not None:
+        server.log.info("Download cache of worker %s: %s", worker.pid, cache.stats())
+        # its files stay cached, counted by another worker
+        cache.close()
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
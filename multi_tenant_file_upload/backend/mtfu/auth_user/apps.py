@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class AuthUserConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "mtfu.auth_user"
+
+    def ready(self):
+        from mtfu.auth_user import signals  # noqa: F401
@@ -0,0 +1,115 @@
+from collections import OrderedDict
+import threading
+import time
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+from mtfu.auth_user.models import Tenant
+
+# the Tenant fields the views use, the others are loaded on access
+TENANT_FIELDS = ["id", "username"]
+
+
+class TenantCache:
+    """
+    An LRU cache of the tenants' fields with a TTL, per process.
+
+    The process that saves or deletes a tenant invalidates it right away (see
+    signals.py), the other processes after at most ttl seconds.
+    """
+
+    def __init__(self, size, ttl):
+        self.size = size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, tenant_id):
+        with self._lock:
+            entry = self._entries.get(tenant_id)
+            if entry is None:
+                return None
+            values, expire_at = entry
+            if expire_at < time.monotonic():
+                del self._entries[tenant_id]
+                return None
+            self._entries.move_to_end(tenant_id)
+            return values
+
+    def set(self, tenant_id, values):
+        with self._lock:
+            self._entries[tenant_id] = (values, time.monotonic() + self.ttl)
+            self._entries.move_to_end(tenant_id)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, tenant_id):
+        with self._lock:
+            self._entries.pop(tenant_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+TENANT_CACHE = TenantCache(settings.TENANT_AUTH_CACHE_SIZE, settings.TENANT_AUTH_CACHE_TTL)
+
+
+def get_tenant_id(validated_token):
+    try:
+        return validated_token[api_settings.USER_ID_CLAIM]
+    except KeyError:
+        raise InvalidToken("Token contained no recognizable user identification")
+
+
+def get_cached_tenant(tenant_id):
+    """Returns the cached tenant, or None when it has to be loaded."""
+    if not settings.TENANT_AUTH_CACHE_SIZE:
+        return None
+    values = TENANT_CACHE.get(tenant_id)
+    if values is None:
+        return None
+    # the same instance a Tenant.objects.only(*TENANT_FIELDS) query returns
+    return Tenant.from_db(DEFAULT_DB_ALIAS, TENANT_FIELDS, values)
+
+
+def cache_tenant(tenant):
+    if settings.TENANT_AUTH_CACHE_SIZE:
+        tenant_id = getattr(tenant, api_settings.USER_ID_FIELD)
+        TENANT_CACHE.set(tenant_id, [getattr(tenant, field) for field in TENANT_FIELDS])
+
+
+def get_tenant_queryset(tenant_id):
+    return Tenant.objects.only(*TENANT_FIELDS).filter(
+        **{api_settings.USER_ID_FIELD: tenant_id}
+    )
+
+
+def check_tenant(tenant):
+    if tenant is None:
+        raise AuthenticationFailed("User not found", code="user_not_found")
+    if not tenant.is_active:
+        raise AuthenticationFailed("User is inactive", code="user_inactive")
+
+
+class TenantJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication that takes the tenant from TENANT_CACHE instead of loading it
+    on every request. Only a cache miss queries the database.
+    """
+
+    def get_user(self, validated_token):
+        tenant_id = get_tenant_id(validated_token)
+
+        tenant = get_cached_tenant(tenant_id)
+        if tenant is None:
+            tenant = get_tenant_queryset(tenant_id).first()
+            check_tenant(tenant)
+            cache_tenant(tenant)
+
+        return tenant
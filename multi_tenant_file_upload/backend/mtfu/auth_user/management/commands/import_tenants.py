@@ -0,0 +1,62 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from mtfu.batch.init_data_impl import copy_to_postgresql
+
+
+class Command(BaseCommand):
+    help = (
+        "Creates the tenants of a CSV file of username,password rows and their folders, "
+        "skipping the existing usernames."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="CSV file, an optional username,password header")
+        parser.add_argument(
+            "--chunk-size", type=int, default=settings.TENANT_IMPORT_CHUNK_SIZE
+        )
+        parser.add_argument(
+            "--processes",
+            type=int,
+            default=settings.TENANT_IMPORT_PROCESSES,
+            help="Processes hashing the passwords.",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=settings.TENANT_IMPORT_MAX_WORKERS,
+            help="Folder markers written at once.",
+        )
+        parser.add_argument(
+            "--skip-folders",
+            action="store_true",
+            help="Do not write the folder markers, for a storage without folders.",
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+
+        def report(stats):
+            self.stdout.write(format_stats(stats, time.monotonic() - started))
+
+        stats = copy_to_postgresql(
+            options["path"],
+            chunk_size=options["chunk_size"],
+            processes=options["processes"],
+            max_workers=options["workers"],
+            create_folders=not options["skip_folders"],
+            on_chunk=report,
+        )
+        self.stdout.write(
+            self.style.SUCCESS(f"Done: {format_stats(stats, time.monotonic() - started)}")
+        )
+
+
+def format_stats(stats, seconds):
+    seconds = max(seconds, 1e-6)
+    return (
+        f"{stats['rows']} rows, {stats['created']} created, {stats['existing']} existing, "
+        f"{stats['invalid']} invalid, {stats['failed']} failed "
+        f"in {seconds:.1f}s ({stats['rows'] / seconds:.0f} rows/s)"
+    )
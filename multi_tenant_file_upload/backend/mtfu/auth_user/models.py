@@ -1,9 +1,15 @@
-from django.db import models
+import time
+from datetime import timedelta
+
+from django.db import models, transaction
+from django.db.models import F, Value
+from django.db.models.functions import Greatest, Least
+from django.db.models.lookups import GreaterThanOrEqual
 from django.contrib.auth.models import AbstractBaseUser
 from django.contrib.auth.models import UserManager
-import boto3
 from django.conf import settings
-from botocore.exceptions import ClientError
+from django.utils import timezone
+from mtfu.file_manager.storage import StorageError, get_storage
 
 
 class Tenant(AbstractBaseUser):
@@ -21,19 +27,10 @@ class Tenant(AbstractBaseUser):
 
     @classmethod
     def create(cls, username, password):
-        # create a folder for the tenant in S3
-        s3_client = boto3.client(
-            "s3",
-            aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
-            aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
-            region_name=settings.AWS_S3_REGION_NAME,
-        )
+        # create a folder for the tenant in the storage
         try:
-            s3_client.put_object(
-                Bucket=settings.AWS_STORAGE_BUCKET_NAME,
-                Key=f"{settings.ASSET_IMAGE_FOLDER}/{username}/",
-            )
-        except ClientError as e:
+            get_storage().create_folder(f"{settings.ASSET_IMAGE_FOLDER}/{username}/")
+        except StorageError as e:
             print(e)
             return None
 
@@ -42,3 +39,95 @@ class Tenant(AbstractBaseUser):
         tenant.save()
 
         return tenant
+
+
+class TokenBucket(models.Model):
+    """
+    A token bucket of a tenant, in the database so that every worker shares it.
+
+    It holds at most capacity tokens and refills at rate tokens per second, counted
+    from updated_at, in seconds since the epoch, when it is next taken from.
+    """
+
+    tenant = models.ForeignKey(Tenant, on_delete=models.CASCADE)
+    name = models.CharField(max_length=20)
+    tokens = models.FloatField()
+    updated_at = models.FloatField()
+
+    class Meta:
+        unique_together = (("tenant", "name"),)
+
+    @classmethod
+    def take(cls, tenant, name, rate, capacity, cost=1):
+        """
+        Takes cost tokens from the tenant's bucket name. Returns 0 when they were taken,
+        or else the seconds to wait until they can be.
+
+        A cost above capacity waits for a full bucket and leaves it in debt, the next
+        requests wait for the debt to be paid back.
+        """
+        needed = min(cost, capacity)
+        for _ in range(2):
+            now = time.time()
+            # the clocks of the servers may differ a little, no refill then
+            refilled = Least(
+                Value(float(capacity)),
+                F("tokens") + Value(float(rate)) * Greatest(Value(now) - F("updated_at"), 0.0),
+            )
+            # one UPDATE checks and takes the tokens, the row lock orders the workers
+            taken = (
+                cls.objects.filter(tenant=tenant, name=name)
+                .filter(GreaterThanOrEqual(refilled, Value(float(needed))))
+                .update(tokens=refilled - Value(float(cost)), updated_at=now)
+            )
+            if taken:
+                return 0
+
+            bucket = cls.objects.filter(tenant=tenant, name=name).first()
+            if bucket is not None:
+                tokens = min(capacity, bucket.tokens + rate * max(now - bucket.updated_at, 0))
+                return (needed - tokens) / rate
+
+            # a full bucket for the first request, or for the concurrent one
+            cls.objects.bulk_create(
+                [cls(tenant=tenant, name=name, tokens=capacity, updated_at=now)],
+                ignore_conflicts=True,
+            )
+        return 0
+
+
+class UploadLease(models.Model):
+    """
+    An upload in progress, the tenants may have at most TENANT_MAX_CONCURRENT_UPLOADS.
+
+    A lease that was not released, its worker died, stops counting at expire_at.
+    """
+
+    tenant = models.ForeignKey(Tenant, on_delete=models.CASCADE)
+    expire_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["tenant", "expire_at"], name="upload_lease_tenant_idx")
+        ]
+
+    @classmethod
+    def acquire(cls, tenant, limit, ttl):
+        """Returns the id of a new lease, or None when the tenant already has limit."""
+        now = timezone.now()
+        with transaction.atomic():
+            # the tenant's acquisitions wait for each other, NO KEY UPDATE leaves the
+            # inserts referencing the tenant free to go
+            Tenant.objects.select_for_update(no_key=True).filter(id=tenant.id).values_list(
+                "id", flat=True
+            ).first()
+            leases = cls.objects.filter(tenant=tenant)
+            if leases.filter(expire_at__gt=now).count() >= limit:
+                # the leases of dead workers are only cleaned up on this slow path
+                leases.filter(expire_at__lte=now).delete()
+                return None
+            return cls.objects.create(tenant=tenant, expire_at=now + timedelta(seconds=ttl)).id
+
+    @classmethod
+    def release(cls, lease_id):
+        cls.objects.filter(id=lease_id).delete()
@@ -0,0 +1,13 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework_simplejwt.settings import api_settings
+
+from mtfu.auth_user.authentication import TENANT_CACHE
+from mtfu.auth_user.models import Tenant
+
+
+@receiver(post_save, sender=Tenant)
+@receiver(post_delete, sender=Tenant)
+def invalidate_cached_tenant(sender, instance, **kwargs):
+    # QuerySet.update() sends no signal, the TTL bounds how stale that leaves the cache
+    TENANT_CACHE.invalidate(getattr(instance, api_settings.USER_ID_FIELD))
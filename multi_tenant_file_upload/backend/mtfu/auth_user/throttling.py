@@ -0,0 +1,115 @@
+"""
+Per tenant admission control, shared by the workers through the database.
+
+- TenantRequestThrottle: TENANT_REQUEST_RATE requests per second, bursts of
+  TENANT_REQUEST_BURST, for every view
+- TenantUploadBytesThrottle: TENANT_UPLOAD_BYTES_RATE bytes per second, bursts of
+  TENANT_UPLOAD_BYTES_BURST, for the views receiving file content, the Content-Length
+  is taken before the body is read
+- UploadLeaseMixin: at most TENANT_MAX_CONCURRENT_UPLOADS uploads at once, so that a
+  tenant uploading in bulk leaves worker threads to the others
+
+A throttled request gets a 429 with a Retry-After header. A rate of 0 turns its limit off.
+"""
+from rest_framework.exceptions import Throttled
+from rest_framework.throttling import BaseThrottle
+from django.conf import settings
+
+from mtfu.auth_user.models import TokenBucket, UploadLease
+
+
+class TenantThrottle(BaseThrottle):
+    bucket = None
+
+    def get_rate(self):
+        """Returns the tokens per second and the capacity of the bucket."""
+        raise NotImplementedError
+
+    def get_cost(self, request):
+        return 1
+
+    def allow_request(self, request, view):
+        self.retry_after = None
+        rate, capacity = self.get_rate()
+        if not rate or not request.user or not request.user.is_authenticated:
+            return True
+
+        self.retry_after = TokenBucket.take(
+            request.user, self.bucket, rate, capacity, self.get_cost(request)
+        )
+        return not self.retry_after
+
+    def wait(self):
+        return self.retry_after
+
+
+class TenantRequestThrottle(TenantThrottle):
+    bucket = "requests"
+
+    def get_rate(self):
+        return settings.TENANT_REQUEST_RATE, settings.TENANT_REQUEST_BURST
+
+
+class TenantUploadBytesThrottle(TenantThrottle):
+    bucket = "upload_bytes"
+
+    def get_rate(self):
+        return settings.TENANT_UPLOAD_BYTES_RATE, settings.TENANT_UPLOAD_BYTES_BURST
+
+    def get_cost(self, request):
+        return int(request.META.get("CONTENT_LENGTH") or 0)
+
+
+UPLOAD_THROTTLES = [TenantRequestThrottle, TenantUploadBytesThrottle]
+
+
+def check_throttles(request, view, throttle_classes):
+    """APIView.check_throttles for the async views."""
+    waits = []
+    for throttle_class in throttle_classes:
+        throttle = throttle_class()
+        if not throttle.allow_request(request, view):
+            waits.append(throttle.wait())
+    if waits:
+        raise Throttled(max(waits))
+
+
+def acquire_upload_lease(tenant):
+    """Returns the id of a new upload lease, None without a limit, or raises Throttled."""
+    if not settings.TENANT_MAX_CONCURRENT_UPLOADS:
+        return None
+
+    lease_id = UploadLease.acquire(
+        tenant, settings.TENANT_MAX_CONCURRENT_UPLOADS, settings.UPLOAD_LEASE_TTL
+    )
+    if lease_id is None:
+        raise Throttled(
+            settings.UPLOAD_LEASE_RETRY_AFTER, detail="Too many concurrent uploads."
+        )
+    return lease_id
+
+
+def release_upload_lease(lease_id):
+    if lease_id is not None:
+        UploadLease.release(lease_id)
+
+
+class UploadLeaseMixin:
+    """
+    Holds an upload lease of the tenant from the checks of the request until the view
+    returns, or raises an exception DRF does not turn into a response.
+    """
+
+    upload_lease_id = None
+
+    def dispatch(self, request, *args, **kwargs):
+        try:
+            return super().dispatch(request, *args, **kwargs)
+        finally:
+            release_upload_lease(self.upload_lease_id)
+            self.upload_lease_id = None
+
+    def initial(self, request, *args, **kwargs):
+        # authenticated and throttled first
+        super().initial(request, *args, **kwargs)
+        self.upload_lease_id = acquire_upload_lease(request.user)
@@ -0,0 +1,131 @@
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from mtfu.file_manager.models import Blob, File
+from mtfu.file_manager.storage import get_storage
+
+# the most keys a single DeleteObjects request accepts
+DELETE_OBJECTS_MAX_KEYS = 1000
+
+
+def gc_files(chunk_size=None, max_workers=None, on_chunk=None):
+    """Removes the soft deleted files, their stored objects first and then their rows."""
+    files = File.objects.filter(delete_flg=True)
+    return collect_files(files, chunk_size, max_workers, on_chunk)
+
+
+def reap_expired_files(chunk_size=None, max_workers=None, on_chunk=None):
+    """Removes the files that expired, their stored objects first and then their rows."""
+    files = File.objects.filter(expire_at__lt=timezone.now())
+    return collect_files(files, chunk_size, max_workers, on_chunk)
+
+
+def collect_files(files, chunk_size=None, max_workers=None, on_chunk=None):
+    """
+    Deletes the files' stored objects and rows, one chunk of rows at a time.
+
+    The ids are streamed with a server-side cursor, then each chunk is claimed with
+    SELECT ... FOR UPDATE SKIP LOCKED, so several collectors can run at once. The
+    chunk's rows stay locked until its objects are gone. An upload to the location of
+    a collected row deletes the row before writing, see File.reclaim_locations: it
+    waits for the chunk to be done, or the row is gone and the location left alone.
+
+    An object still used by a file that is not deleted is kept, the same location can
+    be shared by several resources. Rows whose object could not be deleted are kept
+    for the next run. The content of a deduplicated file is a blob, only its reference
+    is dropped, see gc_blobs.
+
+    on_chunk is called with the running totals after each chunk. Returns the number
+    of deleted rows, deleted objects and failed objects.
+    """
+    chunk_size = chunk_size or settings.FILE_GC_CHUNK_SIZE
+    max_workers = max_workers or settings.FILE_GC_MAX_WORKERS
+    stats = {"files": 0, "objects": 0, "failed": 0}
+
+    ids = files.order_by("id").values_list("id", flat=True).iterator(chunk_size=chunk_size)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for chunk_ids in _batches(ids, chunk_size):
+            with transaction.atomic():
+                chunk = list(
+                    files.filter(id__in=chunk_ids)
+                    .select_for_update(skip_locked=True)
+                    .values_list("id", "location", "blob_id")
+                )
+                if chunk:
+                    _collect_chunk(chunk, executor, stats)
+            if on_chunk is not None:
+                on_chunk(stats)
+
+    return stats
+
+
+def _collect_chunk(chunk, executor, stats):
+    ids = [file_id for file_id, _, _ in chunk]
+    locations = {location for _, location, blob_id in chunk if blob_id is None}
+
+    shared = set(
+        File.objects.filter(location__in=locations, delete_flg=False)
+        .exclude(id__in=ids)
+        .values_list("location", flat=True)
+    )
+    deletable = sorted(locations - shared)
+
+    failed = set()
+    batches = _batches(deletable, DELETE_OBJECTS_MAX_KEYS)
+    for failed_locations in executor.map(delete_objects, batches):
+        failed.update(failed_locations)
+
+    deleted = [
+        (file_id, blob_id) for file_id, location, blob_id in chunk if location not in failed
+    ]
+    File.objects.filter(id__in=[file_id for file_id, _ in deleted]).delete()
+    Blob.release([blob_id for _, blob_id in deleted if blob_id is not None])
+
+    stats["files"] += len(deleted)
+    stats["objects"] += len(deletable) - len(failed)
+    stats["failed"] += len(failed)
+
+
+def gc_blobs(chunk_size=None):
+    """
+    Removes the blobs no file points at any more, their stored objects first and then
+    their rows. Returns the number of deleted and failed blobs.
+    """
+    chunk_size = min(chunk_size or settings.FILE_GC_CHUNK_SIZE, DELETE_OBJECTS_MAX_KEYS)
+    stats = {"blobs": 0, "failed": 0}
+
+    last_id = 0
+    while True:
+        with transaction.atomic():
+            # locked, an upload acquiring one of them waits and then stores it again
+            chunk = list(
+                Blob.objects.filter(ref_count=0, id__gt=last_id)
+                .order_by("id")
+                .select_for_update(skip_locked=True)
+                .values_list("id", "location")[:chunk_size]
+            )
+            if not chunk:
+                return stats
+            last_id = chunk[-1][0]
+
+            failed = delete_objects([location for _, location in chunk])
+            Blob.objects.filter(
+                id__in=[blob_id for blob_id, location in chunk if location not in failed]
+            ).delete()
+
+        stats["blobs"] += len(chunk) - len(failed)
+        stats["failed"] += len(failed)
+
+
+def delete_objects(locations):
+    """Deletes up to 1000 objects, in one request on S3, returns the ones that failed."""
+    return get_storage().delete_many(locations)
+
+
+def _batches(items, size):
+    items = iter(items)
+    while batch := list(islice(items, size)):
+        yield batch
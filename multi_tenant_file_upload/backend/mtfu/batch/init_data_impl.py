@@ -1,17 +1,139 @@
+import csv
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import islice
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
 from mtfu.auth_user.models import Tenant
-from django.db.models import Q
+from mtfu.batch.password_hashing import init_hashing_process
+from mtfu.file_manager.storage import StorageError, get_storage
+
+logger = logging.getLogger(__name__)
+
+USERNAME_MAX_LENGTH = Tenant._meta.get_field("username").max_length
 
 
-def copy_to_postgresql():
-    create_tenants()
+def copy_to_postgresql(path=None, **options):
+    """
+    Creates the tenants listed in the CSV file at path, or john1 to john10 with the
+    password "test" to start manual testing. See import_tenants for the options.
+    """
+    if path is None:
+        return import_tenants(((f"john{i}", "test") for i in range(1, 11)), **options)
 
+    with open(path, newline="", encoding="utf8") as file:
+        return import_tenants(read_tenants(file), **options)
 
-def create_tenants():
-    for i in range(1, 11):
-        username = "john" + str(i)
 
-        # check if user exists
-        if Tenant.objects.filter(Q(username=username)).exists():
+def read_tenants(file):
+    """Yields the (username, password) of each row of a CSV file, a header is skipped."""
+    for line_number, row in enumerate(csv.reader(file), 1):
+        if not row or (line_number == 1 and row[:2] == ["username", "password"]):
             continue
+        yield row[0].strip(), row[1] if len(row) > 1 else ""
+
+
+def import_tenants(
+    rows,
+    chunk_size=None,
+    processes=None,
+    max_workers=None,
+    create_folders=True,
+    on_chunk=None,
+):
+    """
+    Creates the tenants of the (username, password) rows, one chunk at a time.
+
+    Each chunk costs one query for the existing usernames, one bulk INSERT and one
+    query counting the inserted tenants. The passwords are hashed in a pool of
+    processes while the folder markers are written by a pool of threads. Existing
+    usernames are skipped, as well as the invalid rows, an empty or too long username
+    or an empty password, and the tenants whose folder marker could not be written.
+
+    on_chunk is called with the running totals after each chunk. Returns the number
+    of rows read, created tenants, existing, invalid and failed ones.
+    """
+    chunk_size = chunk_size or settings.TENANT_IMPORT_CHUNK_SIZE
+    processes = processes or settings.TENANT_IMPORT_PROCESSES
+    max_workers = max_workers or settings.TENANT_IMPORT_MAX_WORKERS
+    stats = {"rows": 0, "created": 0, "existing": 0, "invalid": 0, "failed": 0}
+
+    rows = iter(rows)
+    # a few tasks per process and chunk, each sends a batch of passwords to hash
+    hash_batch_size = max(chunk_size // (processes * 4), 1)
+    with ProcessPoolExecutor(
+        processes,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=init_hashing_process,
+        initargs=(settings.PASSWORD_HASHERS,),
+    ) as hashers, ThreadPoolExecutor(max_workers) as uploaders:
+        while chunk := list(islice(rows, chunk_size)):
+            _import_chunk(chunk, hashers, hash_batch_size, uploaders, create_folders, stats)
+            if on_chunk is not None:
+                on_chunk(stats)
+
+    return stats
+
+
+def _import_chunk(chunk, hashers, hash_batch_size, uploaders, create_folders, stats):
+    stats["rows"] += len(chunk)
+
+    passwords = {}
+    for username, password in chunk:
+        if (
+            not username
+            or not password
+            or len(username) > USERNAME_MAX_LENGTH
+            or username in passwords
+        ):
+            stats["invalid"] += 1
+        else:
+            passwords[username] = password
+
+    existing = set(
+        Tenant.objects.filter(username__in=passwords).values_list("username", flat=True)
+    )
+    stats["existing"] += len(existing)
+    usernames = [username for username in passwords if username not in existing]
+    if not usernames:
+        return
+
+    # both pools work at once, the processes on the CPU and the threads on the network
+    hashes = hashers.map(
+        make_password,
+        [passwords[username] for username in usernames],
+        chunksize=hash_batch_size,
+    )
+    folders = uploaders.map(_create_folder, usernames) if create_folders else None
+
+    hashes = dict(zip(usernames, hashes))
+    failed = set()
+    if folders is not None:
+        failed = {username for username, created in zip(usernames, folders) if not created}
+
+    tenants = [
+        Tenant(username=username, password=hashes[username])
+        for username in usernames
+        if username not in failed
+    ]
+    # a username created meanwhile by another import is skipped, the salted hashes of
+    # the passwords tell the inserted tenants from the ones it created
+    Tenant.objects.bulk_create(tenants, ignore_conflicts=True)
+    created = Tenant.objects.filter(
+        username__in=[tenant.username for tenant in tenants],
+        password__in=[tenant.password for tenant in tenants],
+    ).count()
+    stats["created"] += created
+    stats["existing"] += len(tenants) - created
+    stats["failed"] += len(failed)
+
 
-        Tenant.create(username=username, password="test")
+def _create_folder(username):
+    try:
+        get_storage().create_folder(f"{settings.ASSET_IMAGE_FOLDER}/{username}/")
+    except StorageError as e:
+        logger.error(e)
+        return False
+    return True
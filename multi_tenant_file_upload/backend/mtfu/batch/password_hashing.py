@@ -0,0 +1,13 @@
+"""
+The password hashing processes of import_tenants.
+
+They are spawned, not forked, so they share no database connection or S3 connection
+pool with the importing process. A spawned process starts without the settings and
+the app registry: this module imports no model and the initializer only configures
+what make_password reads.
+"""
+from django.conf import settings
+
+
+def init_hashing_process(password_hashers):
+    settings.configure(PASSWORD_HASHERS=password_hashers)
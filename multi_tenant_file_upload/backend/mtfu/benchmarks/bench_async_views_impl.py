@@ -0,0 +1,155 @@
+import contextlib
+import itertools
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from django.conf import settings
+
+from mtfu.auth_user.models import Tenant
+from mtfu.benchmarks.s3_stub_impl import S3Stub
+
+CONCURRENCY = (1, 8, 32, 64)
+REQUESTS = 256
+S3_LATENCY = 0.05  # seconds per S3 request
+USERNAME = "bench_async"
+PASSWORD = "bench_async"
+
+# one worker process each, the sync one is configured like docker-compose.yml's
+SERVERS = {
+    "sync": "gunicorn mtfu.wsgi:application --workers 1 --threads 3 --bind 127.0.0.1:{port}",
+    "async": "uvicorn mtfu.asgi:application --workers 1 --port {port} --no-access-log",
+}
+
+
+def bench_async_views(concurrency=CONCURRENCY, count=REQUESTS, latency=S3_LATENCY):
+    """
+    Prints the throughput and the p95 latency of uploads and retrieves served by one
+    sync gunicorn worker and by one async uvicorn worker, concurrency clients at a time,
+    with a local S3 stand-in that answers after latency seconds.
+    """
+    stub = S3Stub(latency).start()
+    tenant = create_tenant()
+    try:
+        print(
+            f"{'server':>6} {'clients':>8} {'upload (req/s)':>15} {'p95 (ms)':>9} "
+            f"{'retrieve (req/s)':>17} {'p95 (ms)':>9}"
+        )
+        for mode, command in SERVERS.items():
+            env = {
+                **os.environ,
+                "ASYNC_VIEWS": str(mode == "async"),
+                "AWS_S3_ENDPOINT_URL": stub.endpoint_url,
+                "DEBUG": "False",
+            }
+            with run_server(command, env) as base_url:
+                headers = {"Authorization": f"Bearer {get_token(base_url)}"}
+                file_numbers = itertools.count()
+
+                for clients in concurrency:
+                    upload = time_requests(
+                        lambda: upload_file(
+                            base_url, headers, f"{mode}_{next(file_numbers)}.txt"
+                        ),
+                        clients,
+                        count,
+                    )
+                    retrieve = time_requests(
+                        lambda: retrieve_files(base_url, headers), clients, count
+                    )
+                    print(
+                        f"{mode:>6} {clients:>8} {upload[0]:>15.1f} {upload[1]:>9.1f} "
+                        f"{retrieve[0]:>17.1f} {retrieve[1]:>9.1f}"
+                    )
+    finally:
+        stub.stop()
+        # the files go with the tenant
+        tenant.delete()
+
+
+def create_tenant():
+    Tenant.objects.filter(username=USERNAME).delete()
+    tenant = Tenant(username=USERNAME)
+    tenant.set_password(PASSWORD)
+    tenant.save()
+    return tenant
+
+
+@contextlib.contextmanager
+def run_server(command, env):
+    port = get_free_port()
+    process = subprocess.Popen(
+        [sys.executable, "-m", *command.format(port=port).split()],
+        env=env,
+        cwd=settings.BASE_DIR,
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        wait_for_server(base_url)
+        yield base_url
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def get_free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_server(base_url, timeout=30):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            requests.get(f"{base_url}/api/list_files")
+            return
+        except requests.ConnectionError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.2)
+
+
+def get_token(base_url):
+    response = requests.post(
+        f"{base_url}/api/token/", data={"username": USERNAME, "password": PASSWORD}
+    )
+    response.raise_for_status()
+    return response.json()["access"]
+
+
+def upload_file(base_url, headers, name):
+    response = requests.post(
+        f"{base_url}/api/upload",
+        data={"resource": "bench", "resource_id": "1"},
+        files={"file": (name, b"bench content")},
+        headers=headers,
+    )
+    response.raise_for_status()
+
+
+def retrieve_files(base_url, headers):
+    response = requests.get(f"{base_url}/api/files/bench/1", headers=headers)
+    response.raise_for_status()
+
+
+def time_requests(send, clients, count):
+    """Sends count requests from clients threads, returns the requests/s and the p95 in ms."""
+
+    def timed_send(_):
+        start = time.perf_counter()
+        send()
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as executor:
+        timings = list(executor.map(timed_send, range(count)))
+    elapsed = time.perf_counter() - start
+
+    p95 = statistics.quantiles(timings, n=20)[-1] if len(timings) > 1 else timings[0]
+    return count / elapsed, p95 * 1000
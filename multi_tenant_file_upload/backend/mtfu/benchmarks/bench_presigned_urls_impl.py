@@ -0,0 +1,105 @@
+import statistics
+import time
+from unittest import mock
+
+from dateutil.relativedelta import relativedelta
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from mtfu.auth_user.models import Tenant
+from mtfu.file_manager.models import File
+from mtfu.file_manager.s3_utils import S3_SESSION
+from mtfu.file_manager.serializers import FileSerializer
+from mtfu.file_manager.storage import S3Storage
+from mtfu.file_manager.views import FileView
+
+PAGE_SIZES = (10, 100, 500)
+ROUNDS = 5
+
+
+class Rollback(Exception):
+    pass
+
+
+def legacy_get_url(self, obj):
+    # FileSerializer.get_url before the cache, a new client and a new signature per row
+    s3_client = S3_SESSION.client("s3")
+    return s3_client.generate_presigned_url(
+        "get_object",
+        Params={
+            "Bucket": settings.AWS_STORAGE_BUCKET_NAME,
+            "Key": obj.location,
+        },
+        ExpiresIn=settings.AWS_S3_PRESIGNED_URLS_EXPIRE,
+    )
+
+
+def bench_presigned_urls(page_sizes=PAGE_SIZES, rounds=ROUNDS):
+    """Prints the median time of one FileView.get page before and after the URL cache."""
+    try:
+        with transaction.atomic():
+            tenant = seed_files(max(page_sizes))
+
+            print(f"{'page_size':>10} {'before (ms)':>12} {'cold (ms)':>12} {'warm (ms)':>12}")
+            for page_size in page_sizes:
+                with mock.patch.object(
+                    FileSerializer, "get_url", legacy_get_url
+                ), mock.patch.object(S3Storage, "get_urls", return_value={}):
+                    before = time_page(tenant, page_size, rounds)
+
+                cold = time_page(tenant, page_size, rounds, before_each=clear_cache)
+                warm = time_page(tenant, page_size, rounds)
+                print(f"{page_size:>10} {before:>12.2f} {cold:>12.2f} {warm:>12.2f}")
+
+            # nothing seeded is kept
+            raise Rollback()
+    except Rollback:
+        pass
+
+
+def seed_files(count):
+    tenant = Tenant(username="bench_presigned")
+    tenant.set_password("bench_presigned")
+    tenant.save()
+
+    tomorrow = timezone.now() + relativedelta(days=1)
+    File.objects.bulk_create(
+        [
+            File(
+                tenant=tenant,
+                name=f"bench_file_{i:05}.txt",
+                location=File.get_location(tenant, f"bench_file_{i:05}.txt"),
+                resource="bench",
+                resource_id="1",
+                expire_at=tomorrow,
+            )
+            for i in range(count)
+        ]
+    )
+    return tenant
+
+
+def clear_cache():
+    caches[settings.PRESIGNED_URLS_CACHE].clear()
+
+
+def time_page(tenant, page_size, rounds, before_each=None):
+    view = FileView.as_view()
+    factory = APIRequestFactory()
+
+    timings = []
+    for _ in range(rounds):
+        if before_each is not None:
+            before_each()
+
+        request = factory.get("/api/files/bench/1", {"page_size": page_size})
+        force_authenticate(request, user=tenant)
+
+        start = time.perf_counter()
+        view(request, resource="bench", resourceId="1").render()
+        timings.append(time.perf_counter() - start)
+
+    return statistics.median(timings) * 1000
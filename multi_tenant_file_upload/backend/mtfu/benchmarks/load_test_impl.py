@@ -0,0 +1,242 @@
+"""
+End-to-end load test: seeds tenants and files, then drives concurrent clients with JWT
+tokens against a server and the local S3 stand-in, and reports the latency percentiles,
+the throughput and the error rate of each endpoint.
+
+The results are saved as JSON to be compared with the ones of another release, see
+compare_results.
+"""
+import contextlib
+import itertools
+import os
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from dateutil.relativedelta import relativedelta
+from django.utils import timezone
+
+from mtfu.auth_user.models import Tenant
+from mtfu.batch.init_data_impl import import_tenants
+from mtfu.benchmarks.bench_async_views_impl import SERVERS, S3_LATENCY, run_server
+from mtfu.benchmarks.s3_stub_impl import S3Stub
+from mtfu.file_manager.models import File
+
+ENDPOINTS = ("upload", "retrieve", "list_files")
+USERNAME_PREFIX = "load_test_"
+PASSWORD = "load_test"
+RESOURCE = "load_test"
+# latencies and error rates compared with the baseline, and the worse direction
+METRICS = {"p50": 1, "p95": 1, "p99": 1, "throughput": -1, "error_rate": 1}
+
+
+def run_load_test(
+    tenants=10,
+    files=100,
+    page_size=10,
+    clients=16,
+    count=500,
+    latency=S3_LATENCY,
+    server="sync",
+    base_url=None,
+):
+    """
+    Seeds tenants with files each, sends count requests to each endpoint from clients
+    threads and returns the results. The server is started with a local S3 stand-in
+    answering after latency seconds, unless base_url points at a running server that
+    uses the same database. The seeded tenants and their files are deleted afterwards.
+    """
+    config = {
+        "tenants": tenants,
+        "files": files,
+        "page_size": page_size,
+        "clients": clients,
+        "requests": count,
+        "s3_latency": latency if base_url is None else None,
+        "server": server if base_url is None else base_url,
+    }
+    seed(tenants, files)
+    try:
+        with start_server(server, latency, base_url) as url:
+            tokens = get_tokens(url, tenants, clients)
+            endpoints = {
+                endpoint: drive(get_sender(endpoint, url, tokens, page_size), clients, count)
+                for endpoint in ENDPOINTS
+            }
+    finally:
+        # the files go with the tenants
+        Tenant.objects.filter(username__startswith=USERNAME_PREFIX).delete()
+
+    return {
+        "created_at": timezone.now().isoformat(),
+        "config": config,
+        "endpoints": endpoints,
+    }
+
+
+def seed(tenants, files):
+    Tenant.objects.filter(username__startswith=USERNAME_PREFIX).delete()
+    import_tenants(
+        ((f"{USERNAME_PREFIX}{i}", PASSWORD) for i in range(tenants)), create_folders=False
+    )
+
+    tomorrow = timezone.now() + relativedelta(days=1)
+    for tenant in Tenant.objects.filter(username__startswith=USERNAME_PREFIX):
+        File.objects.bulk_create(
+            [
+                File(
+                    tenant=tenant,
+                    name=f"seeded_{i:06}.txt",
+                    location=File.get_location(tenant, f"seeded_{i:06}.txt"),
+                    resource=RESOURCE,
+                    resource_id="1",
+                    expire_at=tomorrow,
+                )
+                for i in range(files)
+            ],
+            batch_size=1000,
+        )
+
+
+@contextlib.contextmanager
+def start_server(server, latency, base_url):
+    if base_url is not None:
+        yield base_url.rstrip("/")
+        return
+
+    stub = S3Stub(latency).start()
+    env = {
+        **os.environ,
+        "ASYNC_VIEWS": str(server == "async"),
+        "AWS_S3_ENDPOINT_URL": stub.endpoint_url,
+        "DEBUG": "False",
+    }
+    try:
+        with run_server(SERVERS[server], env) as url:
+            yield url
+    finally:
+        stub.stop()
+
+
+def get_tokens(base_url, tenants, clients):
+    def get_token(i):
+        response = requests.post(
+            f"{base_url}/api/token/",
+            data={"username": f"{USERNAME_PREFIX}{i}", "password": PASSWORD},
+        )
+        response.raise_for_status()
+        return response.json()["access"]
+
+    with ThreadPoolExecutor(max_workers=clients) as executor:
+        return list(executor.map(get_token, range(tenants)))
+
+
+def get_sender(endpoint, base_url, tokens, page_size):
+    """Returns a function sending the request number i of endpoint, it returns the status."""
+    file_numbers = itertools.count()
+
+    def get_headers(i):
+        # the tenants take turns
+        return {"Authorization": f"Bearer {tokens[i % len(tokens)]}"}
+
+    def upload(i):
+        return requests.post(
+            f"{base_url}/api/upload",
+            data={"resource": f"{RESOURCE}_upload", "resource_id": "1"},
+            files={"file": (f"uploaded_{next(file_numbers)}.txt", b"load test content")},
+            headers=get_headers(i),
+        ).status_code
+
+    def retrieve(i):
+        return requests.get(
+            f"{base_url}/api/files/{RESOURCE}/1",
+            params={"page_size": page_size},
+            headers=get_headers(i),
+        ).status_code
+
+    def list_files(i):
+        return requests.get(
+            f"{base_url}/api/list_files",
+            params={"page_size": page_size},
+            headers=get_headers(i),
+        ).status_code
+
+    return {"upload": upload, "retrieve": retrieve, "list_files": list_files}[endpoint]
+
+
+def drive(send, clients, count):
+    """Sends count requests from clients threads, returns their summary."""
+
+    def timed_send(i):
+        start = time.perf_counter()
+        try:
+            ok = send(i) < 400
+        except requests.RequestException:
+            ok = False
+        return time.perf_counter() - start, ok
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as executor:
+        results = list(executor.map(timed_send, range(count)))
+    elapsed = time.perf_counter() - start
+
+    timings = [timing for timing, _ in results]
+    errors = sum(1 for _, ok in results if not ok)
+    return summarize(timings, errors, elapsed)
+
+
+def summarize(timings, errors, elapsed):
+    """Returns the p50, p95 and p99 in ms, the requests/s and the error rate."""
+    if len(timings) > 1:
+        percentiles = statistics.quantiles(timings, n=100, method="inclusive")
+        p50, p95, p99 = percentiles[49], percentiles[94], percentiles[98]
+    else:
+        p50 = p95 = p99 = timings[0] if timings else 0
+
+    return {
+        "requests": len(timings),
+        "errors": errors,
+        "error_rate": errors / max(len(timings), 1),
+        "throughput": len(timings) / max(elapsed, 1e-6),
+        "p50": p50 * 1000,
+        "p95": p95 * 1000,
+        "p99": p99 * 1000,
+    }
+
+
+def compare_results(results, baseline, tolerance=0.2):
+    """
+    Compares the results of each endpoint with the baseline ones. Returns a line per
+    metric and the regressions: a latency or an error rate higher, or a throughput
+    lower, than the baseline by more than tolerance (a fraction of the baseline).
+    """
+    lines, regressions = [], []
+    for endpoint, stats in results["endpoints"].items():
+        baseline_stats = baseline["endpoints"].get(endpoint)
+        if baseline_stats is None:
+            continue
+
+        for metric, direction in METRICS.items():
+            before, after = baseline_stats[metric], stats[metric]
+            change = (after - before) / before if before else (1 if after else 0)
+            line = f"{endpoint} {metric}: {before:.2f} -> {after:.2f} ({change:+.0%})"
+            if change * direction > tolerance:
+                regressions.append(line)
+                line += " REGRESSION"
+            lines.append(line)
+
+    return lines, regressions
+
+
+def format_results(results):
+    lines = [
+        f"{'endpoint':>10} {'req/s':>8} {'p50 (ms)':>9} {'p95 (ms)':>9} {'p99 (ms)':>9} "
+        f"{'errors':>7}"
+    ]
+    for endpoint, stats in results["endpoints"].items():
+        lines.append(
+            f"{endpoint:>10} {stats['throughput']:>8.1f} {stats['p50']:>9.1f} "
+            f"{stats['p95']:>9.1f} {stats['p99']:>9.1f} {stats['error_rate']:>7.1%}"
+        )
+    return lines
@@ -0,0 +1,91 @@
+"""
+A local S3 stand-in for the benchmarks: the objects live in memory and every request
+waits for the injected latency before it is answered, like a round trip to S3 would.
+
+Only the path style requests the views make are handled: put, get, head and delete
+object, and creating a bucket. Point the app at it with AWS_S3_ENDPOINT_URL.
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote, urlsplit
+import hashlib
+import threading
+import time
+
+
+class S3StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_PUT(self):
+        self.wait()
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        bucket, key = self.get_bucket_and_key()
+        etag = f'"{hashlib.md5(body).hexdigest()}"'
+        if key:
+            self.server.objects[(bucket, key)] = (body, etag)
+        self.respond(200, headers={"ETag": etag})
+
+    def do_GET(self):
+        self.wait()
+        stored = self.server.objects.get(self.get_bucket_and_key())
+        if stored is None:
+            return self.respond(404, b"<Error><Code>NoSuchKey</Code></Error>")
+        body, etag = stored
+        self.respond(200, body, headers={"ETag": etag})
+
+    def do_HEAD(self):
+        self.wait()
+        stored = self.server.objects.get(self.get_bucket_and_key())
+        if stored is None:
+            return self.respond(404)
+        body, etag = stored
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", etag)
+        self.end_headers()
+
+    def do_DELETE(self):
+        self.wait()
+        self.server.objects.pop(self.get_bucket_and_key(), None)
+        self.respond(204)
+
+    def wait(self):
+        if self.server.latency:
+            time.sleep(self.server.latency)
+
+    def get_bucket_and_key(self):
+        path = unquote(urlsplit(self.path).path)
+        bucket, _, key = path.lstrip("/").partition("/")
+        return bucket, key
+
+    def respond(self, status, body=b"", headers=None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class S3Stub(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, latency=0.05, host="127.0.0.1", port=0):
+        super().__init__((host, port), S3StubHandler)
+        self.latency = latency
+        self.objects = {}
+
+    @property
+    def endpoint_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
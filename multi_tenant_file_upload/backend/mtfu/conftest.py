@@ -1,6 +1,91 @@
 import pytest
 
+from dateutil.relativedelta import relativedelta
+from django.utils import timezone
+from rest_framework.test import APIClient
+from mtfu.auth_user.authentication import TENANT_CACHE
+from mtfu.auth_user.models import Tenant
+from mtfu.file_manager.models import File
+
 
 @pytest.fixture(autouse=True)
 def enable_db_access_for_all_tests(db):
     pass
+
+
+@pytest.fixture(autouse=True)
+def clear_tenant_cache():
+    # tenant ids are reused once a test's transaction is rolled back
+    TENANT_CACHE.clear()
+
+
+@pytest.fixture
+def john():
+    return Tenant.create("john", "mypassword")
+
+
+@pytest.fixture
+def jimmy():
+    return Tenant.create("jimmy", "mypassword")
+
+
+@pytest.fixture
+def john_client(john):
+    return api_client(john)
+
+
+@pytest.fixture
+def jimmy_client(jimmy):
+    return api_client(jimmy)
+
+
+def api_client(tenant):
+    token_data = {
+        "username": tenant.username,
+        "password": "mypassword",
+    }
+    token_response = APIClient().post("/api/token/", data=token_data)
+
+    token = token_response.data["access"]
+
+    # Create an authenticated test client using the JWT token
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+
+    return client
+
+
+@pytest.fixture
+def tmp_file(tmp_path):
+    file_path = tmp_path / "test_file.txt"
+    with open(file_path, "w") as f:
+        f.write("test content")
+    return file_path
+
+
+@pytest.fixture
+def create_files():
+    """
+    Returns a function creating count live files of a tenant, named test_file_<i>.txt,
+    for each product id of resource_ids, in one query.
+    """
+
+    def create(tenant, count, resource_ids=("1",), is_public=False):
+        tomorrow = timezone.now() + relativedelta(days=1)
+        File.objects.bulk_create(
+            [
+                File(
+                    tenant=tenant,
+                    name=f"test_file_{i}.txt",
+                    location=File.get_location(tenant, f"test_file_{i}.txt"),
+                    resource="product",
+                    resource_id=resource_id,
+                    expire_at=tomorrow,
+                    is_public=is_public,
+                )
+                for i in range(count)
+                for resource_id in resource_ids
+            ]
+        )
+
+    return create
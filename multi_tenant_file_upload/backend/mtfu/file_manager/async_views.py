@@ -0,0 +1,233 @@
+"""
+Async versions of the upload, retrieve and list views.
+
+They are plain Django async views, DRF views are sync only, and are routed instead of
+the DRF ones when ASYNC_VIEWS is on and the app is served through mtfu.asgi. Requests
+and responses are the same as the sync views'. While boto3 waits on S3 in the S3
+thread pool, and the ORM on the database, the event loop keeps serving requests.
+"""
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+from django.views import View
+from rest_framework import exceptions
+
+from mtfu.auth_user.authentication import (
+    TenantJWTAuthentication,
+    cache_tenant,
+    check_tenant,
+    get_cached_tenant,
+    get_tenant_id,
+    get_tenant_queryset,
+)
+from mtfu.auth_user.throttling import (
+    UPLOAD_THROTTLES,
+    TenantRequestThrottle,
+    acquire_upload_lease,
+    check_throttles,
+    release_upload_lease,
+)
+from mtfu.file_manager.file_cache import get_file_cache, invalidate_cached_files
+from mtfu.file_manager.models import File, PreconditionFailed
+from mtfu.file_manager.pagination_utils import apaginate_files
+from mtfu.file_manager.serializers import UploadSerializer
+
+JWT_AUTHENTICATION = TenantJWTAuthentication()
+
+
+async def authenticate(request):
+    """
+    TenantJWTAuthentication.authenticate for async views: the token is validated in
+    the event loop and a tenant missing from the cache is loaded with the async ORM.
+    """
+    header = JWT_AUTHENTICATION.get_header(request)
+    if header is None:
+        return None
+
+    raw_token = JWT_AUTHENTICATION.get_raw_token(header)
+    if raw_token is None:
+        return None
+
+    validated_token = JWT_AUTHENTICATION.get_validated_token(raw_token)
+    tenant_id = get_tenant_id(validated_token)
+
+    tenant = get_cached_tenant(tenant_id)
+    if tenant is None:
+        tenant = await get_tenant_queryset(tenant_id).afirst()
+        check_tenant(tenant)
+        cache_tenant(tenant)
+
+    return tenant
+
+
+def get_form_data(request):
+    """The fields and the files of a form, parsed from the body on the first call."""
+    data = request.POST.copy()
+    data.update(request.FILES)
+    return data
+
+
+class AsyncAPIView(View):
+    """
+    Base of the async views, with the authentication, permission, throttling and error
+    responses of the DRF views using TenantJWTAuthentication and IsAuthenticated.
+    """
+
+    throttle_classes = [TenantRequestThrottle]
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        view = super().as_view(**initkwargs)
+        # authenticated by the JWT, like APIView
+        view.csrf_exempt = True
+        return view
+
+    async def dispatch(self, request, *args, **kwargs):
+        try:
+            request.user = await authenticate(request)
+            if request.user is None:
+                raise exceptions.NotAuthenticated()
+            await sync_to_async(check_throttles)(request, self, self.throttle_classes)
+            return await super().dispatch(request, *args, **kwargs)
+        except exceptions.APIException as e:
+            return self.handle_exception(e)
+
+    def handle_exception(self, exc):
+        detail = exc.detail
+        if not isinstance(detail, (list, dict)):
+            detail = {"detail": detail}
+        response = JsonResponse(detail, status=exc.status_code, safe=False)
+
+        if isinstance(exc, (exceptions.NotAuthenticated, exceptions.AuthenticationFailed)):
+            response["WWW-Authenticate"] = JWT_AUTHENTICATION.authenticate_header(self.request)
+        if getattr(exc, "wait", None):
+            response["Retry-After"] = "%d" % exc.wait
+        return response
+
+
+class AsyncUploadView(AsyncAPIView):
+    throttle_classes = UPLOAD_THROTTLES
+
+    async def post(self, request):
+        lease_id = await sync_to_async(acquire_upload_lease)(request.user)
+        try:
+            return await self.upload(request)
+        finally:
+            await sync_to_async(release_upload_lease)(lease_id)
+
+    async def upload(self, request):
+        # parsing reads the whole body and hashes the files, not on the event loop
+        data = await sync_to_async(get_form_data, thread_sensitive=False)(request)
+
+        serializer = UploadSerializer(data=data)
+        if serializer.is_valid():
+            upload_file = serializer.validated_data["file"]
+            resource = serializer.validated_data["resource"]
+            resource_id = serializer.validated_data["resource_id"]
+
+            try:
+                etag = await File.acreate(
+                    request.user,
+                    upload_file,
+                    resource,
+                    resource_id,
+                    serializer.validated_data.get("checksum"),
+                    request.META.get("HTTP_IF_MATCH"),
+                    request.META.get("HTTP_IF_NONE_MATCH"),
+                )
+            except PreconditionFailed as e:
+                return JsonResponse({"message": str(e)}, status=412)
+            except ValueError as e:
+                return JsonResponse({"message": str(e)}, status=400)
+
+            if etag is None:
+                return JsonResponse({"message": "File is unchanged"})
+            return JsonResponse(
+                {"message": "File uploaded successfully"}, headers={"ETag": etag}
+            )
+        else:
+            return JsonResponse(serializer.errors, status=400)
+
+
+class AsyncFileView(AsyncAPIView):
+    async def get(self, request, resource, resourceId):
+        # get user from session
+        user = request.user
+
+        files = File.objects.visible_to(user).filter(
+            resource=resource,
+            resource_id=resourceId,
+        )
+
+        returned_fields = [
+            "id",
+            "tenant_username",
+            "resource",
+            "resource_id",
+            "name",
+            "location",
+            "expire_at",
+            "is_public",
+            "etag",
+            "checksum",
+            "size",
+            "url",
+        ]
+        data = await apaginate_files(request, files, returned_fields)
+        return JsonResponse(data)
+
+    async def delete(self, request, resource, resourceId):
+        # get user from session
+        user = request.user
+
+        files = File.objects.filter(
+            tenant=user,
+            resource=resource,
+            resource_id=resourceId,
+            delete_flg=False,
+        )
+        locations = []
+        if get_file_cache():
+            locations = [
+                location async for location in files.values_list("location", flat=True)
+            ]
+
+        # one UPDATE, the objects are removed from S3 later by gc_files
+        await files.aupdate(delete_flg=True)
+        invalidate_cached_files(locations)
+
+        return JsonResponse({"message": "File deleted successfully"})
+
+
+class AsyncListFilesView(AsyncAPIView):
+    async def get(self, request):
+        # get user from session
+        user = request.user
+        files = File.objects.visible_to(user)
+
+        tenant_username = request.GET.get("tenant_username", None)
+        if tenant_username is not None:
+            files = files.filter(tenant__username=tenant_username)
+
+        resource = request.GET.get("resource", None)
+        if resource is not None:
+            files = files.filter(resource=resource)
+
+        resource_id = request.GET.get("resource_id", None)
+        if resource_id is not None:
+            files = files.filter(resource_id=resource_id)
+
+        returned_fields = [
+            "id",
+            "tenant_username",
+            "resource",
+            "resource_id",
+            "name",
+            "location",
+            "expire_at",
+            "is_public",
+            "etag",
+            "checksum",
+            "size",
+        ]
+        data = await apaginate_files(request, files, returned_fields)
+        return JsonResponse(data)
@@ -0,0 +1,167 @@
+import logging
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse
+from django.utils.http import content_disposition_header
+from rest_framework import status
+from rest_framework.response import Response
+
+from mtfu.file_manager.file_cache import get_file_cache, open_cached_file
+from mtfu.file_manager.storage import StorageError, get_storage
+
+logger = logging.getLogger(__name__)
+
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def serve_file(request, location, filename, etag=None):
+    """
+    Returns a response that streams the content at location, DOWNLOAD_CHUNK_SIZE bytes
+    at a time, or hands the transfer to the front proxy with DOWNLOAD_ACCEL_REDIRECT.
+
+    Supports a single byte range (Range, If-Range) and If-None-Match on the ETag.
+    With the etag of the File row the content is read through the disk cache, see
+    file_cache.py, a hit is sent with sendfile without a request to the storage.
+    """
+    storage = get_storage()
+    try:
+        path, cache_status = get_cached_path(storage, location, etag)
+        if path is not None:
+            info = {"size": os.path.getsize(path), "etag": etag}
+        else:
+            info = storage.stat(location)
+    except (StorageError, OSError) as e:
+        logger.error(e)
+        return Response({"message": "File not found"}, status=status.HTTP_404_NOT_FOUND)
+
+    size, etag = info["size"], info["etag"]
+    headers = {"ETag": etag, "Accept-Ranges": "bytes"}
+    if cache_status is not None:
+        headers["X-Cache"] = cache_status
+
+    if etag_matches(request.META.get("HTTP_IF_NONE_MATCH"), etag, weak=True):
+        return HttpResponse(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    if settings.DOWNLOAD_ACCEL_REDIRECT:
+        # the proxy fetches the content itself and serves Range and conditional requests
+        return HttpResponse(
+            content_type=get_content_type(filename),
+            headers={
+                "X-Accel-Redirect": settings.DOWNLOAD_ACCEL_REDIRECT + quote(location),
+                "Content-Disposition": content_disposition_header(False, filename),
+                **headers,
+            },
+        )
+
+    byte_range = None
+    if_range = request.META.get("HTTP_IF_RANGE")
+    if if_range is None or if_range == etag:
+        try:
+            byte_range = parse_range(request.META.get("HTTP_RANGE"), size)
+        except ValueError:
+            return HttpResponse(
+                status=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+                headers={"Content-Range": f"bytes */{size}", **headers},
+            )
+
+    offset, length = byte_range or (0, size)
+    file = None
+    if path is not None:
+        try:
+            file = open_cached_file(path, offset, length if byte_range else None)
+        except StorageError:
+            # evicted by another worker meanwhile
+            pass
+        else:
+            if cache_status == "HIT":
+                get_file_cache().record_hit(length)
+
+    if file is None:
+        try:
+            file = storage.open(location, offset, length if byte_range else None)
+        except StorageError as e:
+            logger.error(e)
+            return Response({"message": "File not found"}, status=status.HTTP_404_NOT_FOUND)
+
+    response = FileResponse(
+        file,
+        filename=filename,
+        status=status.HTTP_206_PARTIAL_CONTENT if byte_range else status.HTTP_200_OK,
+        headers=headers,
+    )
+    response.block_size = settings.DOWNLOAD_CHUNK_SIZE
+    response["Content-Length"] = length
+    if byte_range:
+        response["Content-Range"] = f"bytes {offset}-{offset + length - 1}/{size}"
+    return response
+
+
+def get_cached_path(storage, location, etag):
+    """
+    Returns the path of the cached content at location, filling the cache on a miss,
+    and the X-Cache status. The path is None when the content is not cached.
+    """
+    cache = get_file_cache()
+    if cache is None or not etag or settings.DOWNLOAD_ACCEL_REDIRECT:
+        return None, None
+
+    path = cache.get(location, etag)
+    if path is not None:
+        return path, "HIT"
+    return cache.fill(storage, location, etag), "MISS"
+
+
+def parse_range(header, size):
+    """
+    Returns the (offset, length) of a single byte range header, or None when the whole
+    content has to be sent. Raises ValueError when the range is not satisfiable.
+    """
+    if not header:
+        return None
+
+    # several ranges, or another unit, are answered with the whole content
+    match = RANGE_RE.match(header.strip())
+    if match is None:
+        return None
+
+    start, end = match.groups()
+    if not start:
+        if not end:
+            return None
+        # the last end bytes
+        suffix = min(int(end), size)
+        if suffix == 0:
+            raise ValueError("Empty suffix range")
+        return size - suffix, suffix
+
+    start = int(start)
+    end = min(int(end), size - 1) if end else size - 1
+    if start >= size or end < start:
+        raise ValueError("Unsatisfiable range")
+    return start, end - start + 1
+
+
+def etag_matches(header, etag, weak=False):
+    """
+    Whether the ETags of an If-Match or If-None-Match header list etag, or are "*".
+    The weak comparison, of reads, ignores the W/ prefixes, W/"x" matches "x". The
+    strong one, of writes, never matches a weak ETag.
+    """
+    if not header:
+        return False
+    tags = [tag.strip() for tag in header.split(",")]
+    if "*" in tags:
+        return True
+    if etag is None:
+        return False
+    if weak:
+        return etag.removeprefix("W/") in (tag.removeprefix("W/") for tag in tags)
+    return not etag.startswith("W/") and etag in tags
+
+
+def get_content_type(filename):
+    return mimetypes.guess_type(filename)[0] or "application/octet-stream"
@@ -0,0 +1,298 @@
+"""
+A read-through cache of the files' content on the local disk, for the downloads.
+
+Entries are keyed by location and ETag and the ETag comes from the File row, so an
+overwritten file is a new key and a stale copy is never served, wherever it was
+cached. The worker that records an overwrite also drops the old copies right away,
+the others let them age out.
+
+The directory is shared by the workers of a node, a file cached by one is a hit for
+the others. DOWNLOAD_CACHE_SIZE is the budget of the node: each of its
+DOWNLOAD_CACHE_WORKERS workers keeps at most its share in the directory, least recently
+used entries are evicted first. A file is counted by the one worker that filled it,
+the others only read it, so every file counts once and the directory never holds more
+than the budget. A worker that exits hands its files over to another one, and the
+first worker of the node adopts the files of a previous run.
+"""
+import fcntl
+import functools
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import uuid
+from collections import OrderedDict
+
+from django.conf import settings
+
+from mtfu.file_manager.storage import COPY_BUFFER_SIZE, FileRange, StorageError
+from mtfu.metrics.collectors import (
+    DOWNLOAD_CACHE_BYTES,
+    DOWNLOAD_CACHE_EVICTIONS,
+    DOWNLOAD_CACHE_LOOKUPS,
+    DOWNLOAD_CACHE_SIZE,
+)
+
+logger = logging.getLogger(__name__)
+
+# next to the entries, whose names are hex digests
+WORKERS_LOCK = ".workers.lock"
+ADOPT_LOCK = ".adopt.lock"
+RELEASED_DIR = ".released"
+
+
+class FileCache:
+    def __init__(self, root, max_size, max_file_size):
+        self.root = root
+        self.max_size = max_size
+        self.max_file_size = max_file_size
+        # key -> size, in least recently used first order
+        self._entries = OrderedDict()
+        self._keys = {}  # location -> its cached keys
+        self._size = 0
+        self._lock = threading.Lock()
+        self._fill_locks = {}
+        self._stats = {
+            "hits": 0,
+            "misses": 0,
+            "bytes_saved": 0,
+            "bytes_fetched": 0,
+            "evictions": 0,
+        }
+        os.makedirs(os.path.join(root, RELEASED_DIR), exist_ok=True)
+        self._join_workers()
+
+    def get(self, location, etag):
+        """Returns the path of the cached content, or None."""
+        key = get_key(location, etag)
+        path = self._lookup(key, location)
+        with self._lock:
+            self._stats["hits" if path else "misses"] += 1
+        DOWNLOAD_CACHE_LOOKUPS.labels("hit" if path else "miss").inc()
+        return path
+
+    def fill(self, storage, location, etag):
+        """
+        Copies the content at location into the cache and returns its path. Returns None
+        when it is too big to be cached or when the storage has another version.
+        """
+        key = get_key(location, etag)
+        self._adopt_released_files()
+        with self._lock:
+            fill_lock = self._fill_locks.setdefault(key, threading.Lock())
+
+        # concurrent misses of one file fetch it once
+        with fill_lock:
+            try:
+                path = self._lookup(key, location)
+                if path is not None:
+                    return path
+
+                info = storage.stat(location)
+                if info["etag"] != etag or info["size"] > self.max_file_size:
+                    return None
+
+                path = os.path.join(self.root, key)
+                try:
+                    filled = self._copy(storage, location, path)
+                except OSError as e:
+                    # e.g. a full disk, the download goes on without the cache
+                    logger.error(e)
+                    return None
+            finally:
+                with self._lock:
+                    self._fill_locks.pop(key, None)
+
+        with self._lock:
+            self._stats["bytes_fetched"] += info["size"]
+            if filled:
+                self._add(key, location, info["size"])
+        DOWNLOAD_CACHE_BYTES.labels("fetched").inc(info["size"])
+        return path
+
+    def record_hit(self, size):
+        with self._lock:
+            self._stats["bytes_saved"] += size
+        DOWNLOAD_CACHE_BYTES.labels("saved").inc(size)
+
+    def invalidate(self, location):
+        """Drops every cached version of location."""
+        with self._lock:
+            keys = self._keys.pop(location, set())
+            for key in keys:
+                self._remove(key)
+
+    def close(self):
+        """Hands the files of the worker over to another one, when it exits."""
+        with self._lock:
+            if self._entries:
+                locations = {
+                    key: location for location, keys in self._keys.items() for key in keys
+                }
+                entries = [
+                    [key, locations.get(key), size] for key, size in self._entries.items()
+                ]
+                fd, temp_path = tempfile.mkstemp(dir=self.root, prefix=".tmp")
+                with os.fdopen(fd, "w") as file:
+                    json.dump(entries, file)
+                os.replace(temp_path, os.path.join(self.root, RELEASED_DIR, uuid.uuid4().hex))
+
+            DOWNLOAD_CACHE_SIZE.dec(self._size)
+            self._entries.clear()
+            self._keys.clear()
+            self._size = 0
+        self._workers_lock.close()
+
+    def stats(self):
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"]
+            return {
+                **self._stats,
+                "hit_rate": self._stats["hits"] / lookups if lookups else 0.0,
+                "size": self._size,
+                "entries": len(self._entries),
+            }
+
+    def _copy(self, storage, location, path):
+        """
+        Copies the content at location to path, returns False when another worker
+        filled it first.
+        """
+        fd, temp_path = tempfile.mkstemp(dir=self.root, prefix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as destination, storage.open(location) as source:
+                shutil.copyfileobj(source, destination, COPY_BUFFER_SIZE)
+            # unlike a rename, the link of only one worker succeeds
+            os.link(temp_path, path)
+            return True
+        except FileExistsError:
+            return False
+        finally:
+            os.unlink(temp_path)
+
+    def _lookup(self, key, location):
+        path = os.path.join(self.root, key)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return path
+
+        # filled by another worker, which keeps counting and evicting it
+        return path if os.path.exists(path) else None
+
+    def _add(self, key, location, size):
+        if key not in self._entries:
+            self._size += size
+            DOWNLOAD_CACHE_SIZE.inc(size)
+        self._entries[key] = size
+        self._entries.move_to_end(key)
+        if location is not None:
+            self._keys.setdefault(location, set()).add(key)
+
+        while self._size > self.max_size and len(self._entries) > 1:
+            self._remove(next(iter(self._entries)))
+            self._stats["evictions"] += 1
+            DOWNLOAD_CACHE_EVICTIONS.inc()
+
+    def _remove(self, key):
+        size = self._entries.pop(key, 0)
+        self._size -= size
+        DOWNLOAD_CACHE_SIZE.dec(size)
+        try:
+            # a download that has the file open keeps reading it
+            os.unlink(os.path.join(self.root, key))
+        except FileNotFoundError:
+            pass
+
+    def _join_workers(self):
+        # the running workers hold a shared lock on the directory, the starting ones
+        # take their turn to find out whether they are the first one
+        with open(os.path.join(self.root, ADOPT_LOCK), "a") as adopt_lock:
+            fcntl.flock(adopt_lock, fcntl.LOCK_EX)
+            self._workers_lock = open(os.path.join(self.root, WORKERS_LOCK), "a")
+            try:
+                fcntl.flock(self._workers_lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                pass
+            else:
+                self._adopt_existing_files()
+            fcntl.flock(self._workers_lock, fcntl.LOCK_SH)
+
+    def _adopt_existing_files(self):
+        # the files of a previous run, their locations are unknown until looked up
+        files = []
+        for entry in os.scandir(self.root):
+            if entry.name.startswith(".tmp"):
+                # a copy that was cut short
+                os.unlink(entry.path)
+            elif entry.is_file() and not entry.name.startswith("."):
+                stat = entry.stat()
+                files.append((stat.st_mtime, entry.name, stat.st_size))
+        for _, key, size in sorted(files):
+            self._add(key, None, size)
+
+        # handed over by the workers of the previous run, their files are adopted already
+        for name in os.listdir(os.path.join(self.root, RELEASED_DIR)):
+            os.unlink(os.path.join(self.root, RELEASED_DIR, name))
+
+    def _adopt_released_files(self):
+        released_dir = os.path.join(self.root, RELEASED_DIR)
+        for name in os.listdir(released_dir):
+            # the rename of only one worker succeeds
+            claimed_path = os.path.join(self.root, f".tmp{uuid.uuid4().hex}")
+            try:
+                os.rename(os.path.join(released_dir, name), claimed_path)
+            except FileNotFoundError:
+                continue
+            try:
+                with open(claimed_path) as file:
+                    entries = json.load(file)
+            finally:
+                os.unlink(claimed_path)
+
+            with self._lock:
+                for key, location, size in entries:
+                    if os.path.exists(os.path.join(self.root, key)):
+                        self._add(key, location, size)
+
+
+def get_key(location, etag):
+    return hashlib.sha256(f"{location}\0{etag}".encode("utf8")).hexdigest()
+
+
+def open_cached_file(path, offset=0, length=None):
+    try:
+        file = open(path, "rb")
+    except OSError as e:
+        raise StorageError(str(e)) from e
+    if offset:
+        file.seek(offset)
+    if length is None:
+        return file
+    return FileRange(file, length)
+
+
+def get_file_cache():
+    """Returns the cache of the process, None when DOWNLOAD_CACHE_SIZE is 0."""
+    if not settings.DOWNLOAD_CACHE_SIZE:
+        return None
+    return _get_file_cache(
+        settings.DOWNLOAD_CACHE_DIR,
+        settings.DOWNLOAD_CACHE_SIZE // max(settings.DOWNLOAD_CACHE_WORKERS, 1),
+        settings.DOWNLOAD_CACHE_MAX_FILE_SIZE,
+    )
+
+
+@functools.lru_cache(maxsize=None)
+def _get_file_cache(root, max_size, max_file_size):
+    return FileCache(root, max_size, max_file_size)
+
+
+def invalidate_cached_files(locations):
+    cache = get_file_cache()
+    if cache is not None:
+        for location in locations:
+            cache.invalidate(location)
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+from mtfu.auth_user.models import Tenant
+from mtfu.file_manager.models import Blob
+
+
+class Command(BaseCommand):
+    help = "Prints the deduplication ratio of each tenant, see DEDUP_UPLOADS."
+
+    def handle(self, *args, **options):
+        stats = Blob.get_stats()
+        usernames = dict(Tenant.objects.filter(id__in=stats).values_list("id", "username"))
+
+        total = {"files": 0, "blobs": 0, "file_size": 0, "stored_size": 0}
+        for tenant_id, tenant_stats in sorted(
+            stats.items(), key=lambda item: item[1]["file_size"], reverse=True
+        ):
+            self.stdout.write(f"{usernames[tenant_id]}: {format_stats(tenant_stats)}")
+            for key in total:
+                total[key] += tenant_stats[key]
+
+        total["dedup_ratio"] = total["file_size"] / max(total["stored_size"], 1)
+        self.stdout.write(self.style.SUCCESS(f"Total: {format_stats(total)}"))
+
+
+def format_stats(stats):
+    return (
+        f"{stats['files']} files in {stats['blobs']} blobs, "
+        f"{stats['file_size']} bytes stored as {stats['stored_size']} "
+        f"(ratio {stats['dedup_ratio']:.2f})"
+    )
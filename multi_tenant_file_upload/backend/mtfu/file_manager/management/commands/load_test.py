@@ -0,0 +1,72 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from mtfu.benchmarks.bench_async_views_impl import SERVERS, S3_LATENCY
+from mtfu.benchmarks.load_test_impl import compare_results, format_results, run_load_test
+
+
+class Command(BaseCommand):
+    help = (
+        "Seeds tenants and files, load tests the upload, retrieve and list endpoints and "
+        "prints their latency percentiles, throughput and error rate."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--tenants", type=int, default=10)
+        parser.add_argument("--files", type=int, default=100, help="Files per tenant.")
+        parser.add_argument("--page-size", type=int, default=10)
+        parser.add_argument("--clients", type=int, default=16, help="Concurrent clients.")
+        parser.add_argument(
+            "--requests", type=int, default=500, help="Requests sent to each endpoint."
+        )
+        parser.add_argument(
+            "--s3-latency",
+            type=float,
+            default=S3_LATENCY,
+            help="Seconds the S3 stand-in waits before each answer.",
+        )
+        parser.add_argument("--server", choices=SERVERS, default="sync")
+        parser.add_argument(
+            "--base-url",
+            help="Load test a running server using the same database instead of starting one.",
+        )
+        parser.add_argument("--output", help="Save the results as JSON to this file.")
+        parser.add_argument(
+            "--compare", help="Compare the results with a baseline saved by --output."
+        )
+        parser.add_argument(
+            "--tolerance",
+            type=float,
+            default=0.2,
+            help="Regression threshold, a fraction of the baseline metric.",
+        )
+
+    def handle(self, *args, **options):
+        results = run_load_test(
+            tenants=options["tenants"],
+            files=options["files"],
+            page_size=options["page_size"],
+            clients=options["clients"],
+            count=options["requests"],
+            latency=options["s3_latency"],
+            server=options["server"],
+            base_url=options["base_url"],
+        )
+        for line in format_results(results):
+            self.stdout.write(line)
+
+        if options["output"]:
+            with open(options["output"], "w") as file:
+                json.dump(results, file, indent=2)
+
+        if options["compare"]:
+            with open(options["compare"]) as file:
+                baseline = json.load(file)
+            if baseline["config"] != results["config"]:
+                self.stdout.write(self.style.WARNING("The baseline has another config"))
+
+            lines, regressions = compare_results(results, baseline, options["tolerance"])
+            for line in lines:
+                self.stdout.write(line)
+            if regressions:
+                raise CommandError(f"{len(regressions)} metrics regressed")
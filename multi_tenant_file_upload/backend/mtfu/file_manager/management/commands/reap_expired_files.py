@@ -0,0 +1,61 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from mtfu.batch.gc_files_impl import gc_blobs, reap_expired_files
+
+
+class Command(BaseCommand):
+    help = (
+        "Deletes the expired files, their S3 objects first and then their rows, "
+        "and the blobs no file uses any more."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=settings.FILE_GC_CHUNK_SIZE)
+        parser.add_argument("--workers", type=int, default=settings.FILE_GC_MAX_WORKERS)
+        parser.add_argument(
+            "--pause",
+            type=float,
+            default=0,
+            help="Seconds to sleep between chunks, to leave room for the foreground queries.",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=0,
+            help="Run again every INTERVAL seconds instead of only once.",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            self.reap(options)
+            if not options["interval"]:
+                break
+            time.sleep(options["interval"])
+
+    def reap(self, options):
+        started = time.monotonic()
+
+        def report(stats):
+            self.stdout.write(format_stats(stats, time.monotonic() - started))
+            if options["pause"]:
+                time.sleep(options["pause"])
+
+        stats = reap_expired_files(options["chunk_size"], options["workers"], on_chunk=report)
+        self.stdout.write(
+            self.style.SUCCESS(f"Done: {format_stats(stats, time.monotonic() - started)}")
+        )
+
+        blob_stats = gc_blobs(options["chunk_size"])
+        if blob_stats["blobs"] or blob_stats["failed"]:
+            self.stdout.write(f"{blob_stats['blobs']} blobs, {blob_stats['failed']} failed")
+
+
+def format_stats(stats, seconds):
+    seconds = max(seconds, 1e-6)
+    return (
+        f"{stats['files']} files, {stats['objects']} objects, {stats['failed']} failed "
+        f"in {seconds:.1f}s ({stats['files'] / seconds:.0f} files/s, "
+        f"{stats['objects'] / seconds:.0f} objects/s)"
+    )
@@ -0,0 +1,63 @@
+# Generated by Django 4.2.1 on 2026-10-18 09:50
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class AddIndexConcurrentlyOnPostgres(AddIndexConcurrently):
+    """
+    Builds the index without blocking the writes to the file table on PostgreSQL, a
+    plain CREATE INDEX elsewhere, e.g. on SQLite for the tests.
+    """
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == "postgresql":
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+        else:
+            migrations.AddIndex.database_forwards(
+                self, app_label, schema_editor, from_state, to_state
+            )
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == "postgresql":
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
+        else:
+            migrations.AddIndex.database_backwards(
+                self, app_label, schema_editor, from_state, to_state
+            )
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY can not run in a transaction
+    atomic = False
+
+    dependencies = [
+        ("file_manager", "0005_upload_session"),
+    ]
+
+    operations = [
+        AddIndexConcurrentlyOnPostgres(
+            model_name="file",
+            index=models.Index(
+                condition=models.Q(("delete_flg", False)),
+                fields=["resource", "resource_id", "expire_at"],
+                name="file_resource_live_idx",
+            ),
+        ),
+        AddIndexConcurrentlyOnPostgres(
+            model_name="file",
+            index=models.Index(
+                condition=models.Q(("delete_flg", False)),
+                fields=["tenant", "name", "id"],
+                name="file_tenant_name_live_idx",
+            ),
+        ),
+        AddIndexConcurrentlyOnPostgres(
+            model_name="file",
+            index=models.Index(
+                condition=models.Q(("delete_flg", False), ("is_public", True)),
+                fields=["name", "id"],
+                name="file_public_name_live_idx",
+            ),
+        ),
+    ]
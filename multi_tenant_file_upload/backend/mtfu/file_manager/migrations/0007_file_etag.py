@@ -0,0 +1,17 @@
+# Generated by Django 4.2.1 on 2026-10-18 10:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("file_manager", "0006_file_live_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="file",
+            name="etag",
+            field=models.CharField(blank=True, max_length=100, null=True),
+        ),
+    ]
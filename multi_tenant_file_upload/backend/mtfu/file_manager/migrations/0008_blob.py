@@ -0,0 +1,67 @@
+# Generated by Django 4.2.1 on 2026-10-18 10:43
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("file_manager", "0007_file_etag"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Blob",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("digest", models.CharField(max_length=64)),
+                ("location", models.CharField(max_length=100)),
+                ("size", models.BigIntegerField()),
+                ("etag", models.CharField(blank=True, max_length=100, null=True)),
+                ("ref_count", models.PositiveIntegerField(default=0)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "tenant",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "blob",
+            },
+        ),
+        migrations.AddField(
+            model_name="file",
+            name="blob",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.PROTECT,
+                to="file_manager.blob",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="blob",
+            index=models.Index(
+                condition=models.Q(("ref_count", 0)),
+                fields=["id"],
+                name="blob_unreferenced_idx",
+            ),
+        ),
+        migrations.AlterUniqueTogether(
+            name="blob",
+            unique_together={("tenant", "digest")},
+        ),
+    ]
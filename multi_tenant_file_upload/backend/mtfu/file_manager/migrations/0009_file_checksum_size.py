@@ -0,0 +1,22 @@
+# Generated by Django 4.2.1 on 2026-10-18 10:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("file_manager", "0008_blob"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="file",
+            name="checksum",
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name="file",
+            name="size",
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 4.2.1 on 2026-10-18 11:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("file_manager", "0009_file_checksum_size"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="uploadsession",
+            name="etag",
+            field=models.CharField(blank=True, max_length=100, null=True),
+        ),
+        migrations.AddField(
+            model_name="uploadsession",
+            name="size",
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name="uploadsession",
+            name="status",
+            field=models.CharField(
+                choices=[
+                    ("in_progress", "In progress"),
+                    ("assembled", "Assembled"),
+                    ("completed", "Completed"),
+                    ("aborted", "Aborted"),
+                ],
+                default="in_progress",
+                max_length=20,
+            ),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.1 on 2026-10-18 12:11
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("file_manager", "0010_upload_session_assembled"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="file",
+            name="blob",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.RESTRICT,
+                to="file_manager.blob",
+            ),
+        ),
+    ]
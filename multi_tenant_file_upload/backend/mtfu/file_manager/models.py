@@ -1,15 +1,180 @@
-from django.db import models
+from asgiref.sync import sync_to_async
+from django.db import connection, models, transaction
+from django.db.models import Case, Count, F, Q, Sum, Value, When
 from mtfu.auth_user.models import Tenant
-from mtfu.file_manager.s3_utils import get_s3_client
+from mtfu.file_manager.download_utils import etag_matches
+from mtfu.file_manager.file_cache import invalidate_cached_files
+from mtfu.file_manager.s3_utils import run_s3
+from mtfu.file_manager.storage import StorageError, get_sha256, get_storage
+from mtfu.metrics.collectors import count_upload_bytes
 from django.conf import settings
 from dateutil.relativedelta import relativedelta
-from botocore.exceptions import ClientError
 from django.utils import timezone
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 import logging
+import re
+import uuid
 
 logger = logging.getLogger(__name__)
 
 
+class PreconditionFailed(ValueError):
+    """The If-Match or If-None-Match of a conditional upload does not hold."""
+
+
+def check_preconditions(current, if_match, if_none_match):
+    """
+    current is the live File an upload would replace, or None. The ETags are compared
+    strongly, as a write requires.
+    """
+    if if_match is not None:
+        if current is None or not etag_matches(if_match, current.etag):
+            raise PreconditionFailed("File has changed")
+    if if_none_match is not None and current is not None:
+        if etag_matches(if_none_match, current.etag):
+            raise PreconditionFailed("File already exists")
+
+
+class FileQuerySet(models.QuerySet):
+    def live(self):
+        return self.filter(delete_flg=False, expire_at__gte=timezone.now())
+
+    def visible_to(self, user):
+        # a tenant sees its own files and the public files of every tenant
+        return self.live().filter(Q(tenant=user) | Q(is_public=True))
+
+
+class Blob(models.Model):
+    """
+    Content stored once for all the files of a tenant that have it, with DEDUP_UPLOADS.
+
+    ref_count is the number of File rows pointing at the blob, soft deleted ones
+    included. Blobs nobody points at any more are removed by gc_blobs.
+    """
+
+    tenant = models.ForeignKey(Tenant, on_delete=models.CASCADE)
+    digest = models.CharField(max_length=64)  # SHA-256 of the content
+    location = models.CharField(max_length=100, blank=False, null=False)
+    size = models.BigIntegerField()
+    etag = models.CharField(max_length=100, blank=True, null=True)
+    ref_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = "blob"
+        unique_together = ("tenant", "digest")
+        indexes = [
+            models.Index(
+                fields=["id"], condition=Q(ref_count=0), name="blob_unreferenced_idx"
+            ),
+        ]
+
+    @classmethod
+    def store(cls, user, upload_file, digest=None):
+        """
+        Returns the blob with the content of upload_file, holding one more reference.
+        The content is only uploaded when the tenant has no blob with it yet.
+        """
+        digest = digest or get_sha256(upload_file)
+        blob = cls.acquire(user, digest)
+        if blob is not None:
+            return blob
+
+        location = cls.get_location(user, digest)
+        try:
+            etag = get_storage().save(location, upload_file)
+        except StorageError as e:
+            logger.error(e)
+            raise ValueError("File upload failed")
+        return cls.record(user, digest, location, upload_file.size, etag)
+
+    @classmethod
+    async def astore(cls, user, upload_file, digest=None):
+        """store for async views, hashing and the upload run on the S3 thread pool."""
+        digest = digest or await run_s3(get_sha256, upload_file)
+        blob = await sync_to_async(cls.acquire)(user, digest)
+        if blob is not None:
+            return blob
+
+        location = cls.get_location(user, digest)
+        try:
+            etag = await run_s3(get_storage().save, location, upload_file)
+        except StorageError as e:
+            logger.error(e)
+            raise ValueError("File upload failed")
+        return await sync_to_async(cls.record)(user, digest, location, upload_file.size, etag)
+
+    @classmethod
+    def acquire(cls, user, digest, count=1):
+        """Adds count references to the tenant's blob with digest, None if it has none."""
+        # the UPDATE waits for a gc_blobs removing it and then finds no row
+        if cls.objects.filter(tenant=user, digest=digest).update(
+            ref_count=F("ref_count") + count
+        ):
+            return cls.objects.get(tenant=user, digest=digest)
+        return None
+
+    @classmethod
+    def record(cls, user, digest, location, size, etag, count=1):
+        """Creates the row of content just stored at location, holding count references."""
+        blob, created = cls.objects.get_or_create(
+            tenant=user,
+            digest=digest,
+            defaults={"location": location, "size": size, "etag": etag, "ref_count": count},
+        )
+        if not created:
+            # stored meanwhile by a concurrent upload of the same content
+            cls.objects.filter(id=blob.id).update(ref_count=F("ref_count") + count)
+        return blob
+
+    @classmethod
+    def release(cls, blob_ids):
+        """Drops one reference per id, an id may be repeated."""
+        by_count = {}
+        for blob_id, count in Counter(blob_ids).items():
+            by_count.setdefault(count, []).append(blob_id)
+        for count, ids in by_count.items():
+            cls.objects.filter(id__in=ids).update(ref_count=F("ref_count") - count)
+
+    @staticmethod
+    def get_location(user, digest):
+        return f"{settings.BLOB_FOLDER}/{user.username}/{digest}"
+
+    @classmethod
+    def get_stats(cls):
+        """
+        Returns the deduplication statistics of each tenant with blobs, by tenant id.
+        file_size is what the live files would take without deduplication.
+        """
+        stats = {}
+        blobs = (
+            cls.objects.filter(ref_count__gt=0)
+            .values("tenant_id")
+            .annotate(blobs=Count("id"), stored_size=Sum("size"))
+        )
+        for row in blobs:
+            tenant_id = row.pop("tenant_id")
+            stats[tenant_id] = {**row, "files": 0, "file_size": 0}
+
+        files = (
+            File.objects.live()
+            .exclude(blob=None)
+            .values("tenant_id")
+            .annotate(files=Count("id"), file_size=Sum("blob__size"))
+        )
+        for row in files:
+            tenant_id = row.pop("tenant_id")
+            if tenant_id in stats:
+                stats[tenant_id].update(row)
+
+        for tenant_stats in stats.values():
+            tenant_stats["dedup_ratio"] = tenant_stats["file_size"] / max(
+                tenant_stats["stored_size"], 1
+            )
+        return stats
+
+
 class File(models.Model):
     tenant = models.ForeignKey(Tenant, on_delete=models.CASCADE)
     name = models.CharField(max_length=100, blank=False, null=False)
@@ -19,48 +184,943 @@ class File(models.Model):
     resource = models.CharField(max_length=100, blank=True, null=True)
     resource_id = models.CharField(max_length=100, blank=True, null=True)
     delete_flg = models.BooleanField(default=False)
+    # of the stored content, it keys the download cache
+    etag = models.CharField(max_length=100, blank=True, null=True)
+    # the shared content with DEDUP_UPLOADS, location is then the blob's
+    blob = models.ForeignKey(Blob, blank=True, null=True, on_delete=models.RESTRICT)
+    # SHA-256 and bytes of the content, the checksum is unknown when it did not pass
+    # through the API in one piece, e.g. direct and resumable uploads
+    checksum = models.CharField(max_length=64, blank=True, null=True)
+    size = models.BigIntegerField(blank=True, null=True)
+
+    objects = FileQuerySet.as_manager()
 
     class Meta:
         db_table = "file"
         unique_together = ("tenant", "name", "resource", "resource_id")
+        # partial indexes only cover live rows, soft deleted rows do not bloat them
+        indexes = [
+            # FileView: the files of one resource
+            models.Index(
+                fields=["resource", "resource_id", "expire_at"],
+                condition=Q(delete_flg=False),
+                name="file_resource_live_idx",
+            ),
+            # ListFilesView: the files of a tenant ordered by name, id for cursors
+            models.Index(
+                fields=["tenant", "name", "id"],
+                condition=Q(delete_flg=False),
+                name="file_tenant_name_live_idx",
+            ),
+            # ListFilesView: the public files ordered by name
+            models.Index(
+                fields=["name", "id"],
+                condition=Q(delete_flg=False, is_public=True),
+                name="file_public_name_live_idx",
+            ),
+        ]
+
+    @classmethod
+    def create(
+        cls,
+        user,
+        upload_file,
+        resource,
+        resource_id,
+        checksum=None,
+        if_match=None,
+        if_none_match=None,
+    ):
+        """
+        Stores upload_file as the file of the resource named after it. Returns the ETag
+        of the new content, or None when the file already had this content, it is then
+        only kept one more day, without any storage call.
+
+        checksum is the SHA-256 computed by the client. if_match and if_none_match are
+        the conditional request headers, compared with the ETag of the current file.
+        """
+        checksum = cls.get_checksum(upload_file, checksum)
+        if if_match is None and if_none_match is None:
+            return cls._create(user, upload_file, resource, resource_id, checksum)
+        return cls._create_conditionally(
+            user, upload_file, resource, resource_id, checksum, if_match, if_none_match
+        )
+
+    @classmethod
+    async def acreate(
+        cls,
+        user,
+        upload_file,
+        resource,
+        resource_id,
+        checksum=None,
+        if_match=None,
+        if_none_match=None,
+    ):
+        """create for async views, hashing and the upload run on the S3 thread pool."""
+        if if_match is not None or if_none_match is not None:
+            # the lock needs a transaction, which the async ORM can not open
+            return await sync_to_async(cls.create)(
+                user, upload_file, resource, resource_id, checksum, if_match, if_none_match
+            )
+
+        checksum = await run_s3(cls.get_checksum, upload_file, checksum)
+        unchanged = cls._get_unchanged(
+            user, upload_file.name, resource, resource_id, checksum, upload_file.size
+        )
+        if await unchanged.aupdate(expire_at=timezone.now() + relativedelta(days=1)):
+            return None
+
+        if settings.DEDUP_UPLOADS:
+            blob = await Blob.astore(user, upload_file, checksum)
+            await sync_to_async(cls.record_blob)(
+                user, upload_file.name, resource, resource_id, blob
+            )
+            return blob.etag
+
+        file_location = cls.get_location(user, upload_file.name)
+        await sync_to_async(cls.reclaim_locations)(user, [upload_file.name])
+
+        try:
+            etag = await run_s3(get_storage().save, file_location, upload_file)
+        except StorageError as e:
+            logger.error(e)
+            raise ValueError("File upload failed")
+
+        await cls.arecord_upload(
+            user,
+            upload_file.name,
+            resource,
+            resource_id,
+            file_location,
+            etag,
+            checksum,
+            upload_file.size,
+        )
+        return etag
 
     @classmethod
-    def create(cls, user, upload_file, resource, resource_id):
-        s3_client = get_s3_client()
-        file_location = f"{settings.ASSET_IMAGE_FOLDER}/{user.username}/{upload_file.name}"
+    def _create(cls, user, upload_file, resource, resource_id, checksum):
+        if cls.refresh(
+            user, upload_file.name, resource, resource_id, checksum, upload_file.size
+        ):
+            return None
+
+        if settings.DEDUP_UPLOADS:
+            blob = Blob.store(user, upload_file, checksum)
+            cls.record_blob(user, upload_file.name, resource, resource_id, blob)
+            return blob.etag
+
+        file_location = cls.get_location(user, upload_file.name)
+        cls.reclaim_locations(user, [upload_file.name])
 
         try:
-            cls._upload_file_to_s3(upload_file, s3_client, file_location)
-        except ClientError as e:
+            etag = get_storage().save(file_location, upload_file)
+        except StorageError as e:
             logger.error(e)
             raise ValueError("File upload failed")
 
+        cls.record_upload(
+            user,
+            upload_file.name,
+            resource,
+            resource_id,
+            file_location,
+            etag,
+            checksum,
+            upload_file.size,
+        )
+        return etag
+
+    @classmethod
+    def _create_conditionally(
+        cls, user, upload_file, resource, resource_id, checksum, if_match, if_none_match
+    ):
+        """
+        The content is staged without any lock. Then the conditional uploads of the file
+        name are serialized, the preconditions checked again and the content moved in
+        place, so the later uploads see its new ETag.
+        """
+        filename = upload_file.name
+        # before anything is uploaded
+        check_preconditions(
+            cls._get_current(user, filename, resource, resource_id), if_match, if_none_match
+        )
+        if cls.refresh(user, filename, resource, resource_id, checksum, upload_file.size):
+            return None
+
+        blob = staging_location = None
+        if settings.DEDUP_UPLOADS:
+            blob = Blob.store(user, upload_file, checksum)
+        else:
+            staging_location = cls.get_staging_location(user, filename)
+            try:
+                get_storage().save(staging_location, upload_file)
+            except StorageError as e:
+                logger.error(e)
+                raise ValueError("File upload failed")
+
+        try:
+            with transaction.atomic():
+                cls._lock_name(user, filename)
+                check_preconditions(
+                    cls._get_current(user, filename, resource, resource_id),
+                    if_match,
+                    if_none_match,
+                )
+                if blob is not None:
+                    cls.record_blob(user, filename, resource, resource_id, blob)
+                    return blob.etag
+
+                file_location, etag = cls.move_upload(user, filename, staging_location)
+                cls.record_upload(
+                    user,
+                    filename,
+                    resource,
+                    resource_id,
+                    file_location,
+                    etag,
+                    checksum,
+                    upload_file.size,
+                )
+                return etag
+        except PreconditionFailed:
+            # replaced meanwhile
+            if blob is not None:
+                Blob.release([blob.id])
+            else:
+                cls.discard_upload(staging_location)
+            raise
+
+    @classmethod
+    def create_many(cls, user, upload_files, resource, resource_id):
+        """
+        Uploads the files to the storage concurrently and records them with one bulk upsert.
+        The files that already have the same content are only kept one more day.
+
+        Returns a dict mapping each file name to an error message, or None when
+        the file was uploaded and recorded.
+        """
+        results = {upload_file.name: None for upload_file in upload_files}
+
+        max_workers = min(settings.BATCH_UPLOAD_MAX_WORKERS, len(upload_files))
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            checksums = dict(
+                zip(
+                    [upload_file.name for upload_file in upload_files],
+                    executor.map(get_sha256, upload_files),
+                )
+            )
+            unchanged = cls.refresh_many(
+                user,
+                resource,
+                resource_id,
+                {
+                    upload_file.name: (checksums[upload_file.name], upload_file.size)
+                    for upload_file in upload_files
+                },
+            )
+            upload_files = [
+                upload_file
+                for upload_file in upload_files
+                if upload_file.name not in unchanged
+            ]
+            if not upload_files:
+                return results
+
+            if settings.DEDUP_UPLOADS:
+                cls._create_many_deduplicated(
+                    user, upload_files, resource, resource_id, checksums, executor, results
+                )
+            else:
+                cls._create_many_by_name(
+                    user, upload_files, resource, resource_id, checksums, executor, results
+                )
+
+        return results
+
+    @classmethod
+    def _create_many_by_name(
+        cls, user, upload_files, resource, resource_id, checksums, executor, results
+    ):
+        storage = get_storage()
+        contents = {}
+        cls.reclaim_locations(user, [upload_file.name for upload_file in upload_files])
+
+        futures = {
+            upload_file: executor.submit(
+                storage.save, cls.get_location(user, upload_file.name), upload_file
+            )
+            for upload_file in upload_files
+        }
+        for upload_file, future in futures.items():
+            try:
+                etag = future.result()
+            except StorageError as e:
+                logger.error(e)
+                results[upload_file.name] = "File upload failed"
+            else:
+                contents[upload_file.name] = (
+                    etag,
+                    checksums[upload_file.name],
+                    upload_file.size,
+                )
+
+        if not contents:
+            return
+
+        locations = [cls.get_location(user, filename) for filename in contents]
+        try:
+            cls._create_file_objects(user, contents, resource, resource_id)
+        except Exception as e:
+            logger.error(e)
+            # Remove uploaded files from the storage
+            cls.discard_uploads(locations)
+            for filename in contents:
+                results[filename] = "File save failed"
+        else:
+            invalidate_cached_files(locations)
+
+    @classmethod
+    def _create_many_deduplicated(
+        cls, user, upload_files, resource, resource_id, digests, executor, results
+    ):
+        """create_many with DEDUP_UPLOADS, only the content new to the tenant is uploaded."""
+        digests = {upload_file.name: digests[upload_file.name] for upload_file in upload_files}
+        counts = Counter(digests.values())
+
+        blobs = {}
+        for digest, count in counts.items():
+            blob = Blob.acquire(user, digest, count)
+            if blob is not None:
+                blobs[digest] = blob
+
+        # one upload per new content, whatever the number of files having it
+        new_files = {}
+        for upload_file in upload_files:
+            digest = digests[upload_file.name]
+            if digest not in blobs:
+                new_files.setdefault(digest, upload_file)
+        futures = {
+            digest: executor.submit(
+                get_storage().save, Blob.get_location(user, digest), upload_file
+            )
+            for digest, upload_file in new_files.items()
+        }
+
+        for digest, future in futures.items():
+            try:
+                etag = future.result()
+            except StorageError as e:
+                logger.error(e)
+                continue
+            blobs[digest] = Blob.record(
+                user,
+                digest,
+                Blob.get_location(user, digest),
+                new_files[digest].size,
+                etag,
+                counts[digest],
+            )
+
+        recorded = {}
+        for filename, digest in digests.items():
+            if digest in blobs:
+                recorded[filename] = blobs[digest]
+            else:
+                results[filename] = "File upload failed"
+        if not recorded:
+            return
+
+        try:
+            cls._create_file_objects(user, recorded, resource, resource_id)
+        except Exception as e:
+            logger.error(e)
+            Blob.release([blob.id for blob in recorded.values()])
+            for filename in recorded:
+                results[filename] = "File save failed"
+
+    @classmethod
+    def refresh(cls, user, filename, resource, resource_id, checksum, size=None):
+        """
+        Keeps the file one more day if its content has checksum, and size when given.
+        Returns whether it had, nothing has to be uploaded then.
+        """
+        unchanged = cls._get_unchanged(user, filename, resource, resource_id, checksum, size)
+        return bool(unchanged.update(expire_at=timezone.now() + relativedelta(days=1)))
+
+    @staticmethod
+    def refresh_many(user, resource, resource_id, contents):
+        """
+        refresh for several files of one resource, contents maps their names to their
+        (checksum, size). Returns the names of the files that had this content.
+        """
+        files = File.objects.filter(
+            tenant=user,
+            resource=resource,
+            resource_id=resource_id,
+            name__in=contents,
+            delete_flg=False,
+        )
+        unchanged = {
+            filename
+            for filename, checksum, size in files.values_list("name", "checksum", "size")
+            if checksum is not None and (checksum, size) == contents[filename]
+        }
+        if unchanged:
+            files.filter(name__in=unchanged).update(
+                expire_at=timezone.now() + relativedelta(days=1)
+            )
+        return unchanged
+
+    @staticmethod
+    def _get_unchanged(user, filename, resource, resource_id, checksum, size):
+        files = File.objects.filter(
+            tenant=user,
+            name=filename,
+            resource=resource,
+            resource_id=resource_id,
+            delete_flg=False,
+            checksum=checksum,
+        )
+        if size is not None:
+            files = files.filter(size=size)
+        return files
+
+    @staticmethod
+    def get_checksum(upload_file, expected=None):
+        """Returns the SHA-256 of upload_file, raises ValueError when it is not expected."""
+        checksum = get_sha256(upload_file)
+        if expected is not None and expected.lower() != checksum:
+            raise ValueError("Checksum mismatch")
+        return checksum
+
+    @staticmethod
+    def _get_current(user, filename, resource, resource_id):
+        return (
+            File.objects.live()
+            .filter(tenant=user, name=filename, resource=resource, resource_id=resource_id)
+            .first()
+        )
+
+    @staticmethod
+    def _lock_name(user, filename):
+        """
+        Holds a lock on a file name of the tenant until the end of the transaction. It is
+        an advisory lock, neither the tenant row nor the file rows are locked.
+        """
+        if connection.vendor != "postgresql":
+            # SQLite writes one transaction at a time
+            return
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT pg_advisory_xact_lock(hashtextextended(%s, 0))",
+                [f"file:{user.id}:{filename}"],
+            )
+
+    @classmethod
+    def record_upload(
+        cls,
+        user,
+        filename,
+        resource,
+        resource_id,
+        file_location,
+        etag,
+        checksum=None,
+        size=None,
+        discard=True,
+    ):
+        """
+        Creates the File row for an object that is already stored at file_location. The
+        object is removed when the row can not be created, unless discard is False.
+        """
+        try:
+            cls._create_file_object(
+                user, filename, resource, resource_id, file_location, etag, checksum, size
+            )
+        except Exception as e:
+            logger.error(e)
+            if discard:
+                # Remove uploaded file from the storage
+                cls.discard_upload(file_location)
+            raise ValueError("File save failed")
+
+        # the copies of the content it replaced
+        invalidate_cached_files([file_location])
+
+    @classmethod
+    async def arecord_upload(
+        cls,
+        user,
+        filename,
+        resource,
+        resource_id,
+        file_location,
+        etag,
+        checksum=None,
+        size=None,
+    ):
+        try:
+            await sync_to_async(cls._create_file_object)(
+                user, filename, resource, resource_id, file_location, etag, checksum, size
+            )
+        except Exception as e:
+            logger.error(e)
+            # Remove uploaded file from the storage
+            await run_s3(cls.discard_upload, file_location)
+            raise ValueError("File save failed")
+
+        invalidate_cached_files([file_location])
+
+    @classmethod
+    def record_blob(cls, user, filename, resource, resource_id, blob):
+        """Creates the File row of blob, taking over the reference the caller holds."""
         try:
             cls._create_file_object(
-                user, upload_file.name, resource, resource_id, file_location
+                user,
+                filename,
+                resource,
+                resource_id,
+                blob.location,
+                blob.etag,
+                blob.digest,
+                blob.size,
+                blob,
             )
         except Exception as e:
             logger.error(e)
-            # Remove uploaded file from S3
-            s3_client.delete_object(Bucket=settings.AWS_STORAGE_BUCKET_NAME, Key=file_location)
+            Blob.release([blob.id])
             raise ValueError("File save failed")
 
     @staticmethod
-    def _upload_file_to_s3(upload_file, s3_client, file_location):
-        s3_client.upload_fileobj(upload_file, settings.AWS_STORAGE_BUCKET_NAME, file_location)
+    def discard_upload(file_location):
+        get_storage().delete(file_location)
+
+    @staticmethod
+    def discard_uploads(file_locations):
+        get_storage().delete_many(file_locations)
+
+    @staticmethod
+    def reclaim_locations(user, filenames):
+        """
+        Called before new content is written to the locations of filenames. The deleted
+        and expired files stored there, which gc_files or reap_expired_files would remove
+        the location of, go first: the DELETE waits for a collector holding them, which
+        is then done with the location, or the collector no longer finds them.
+        """
+        File.objects.filter(
+            Q(delete_flg=True) | Q(expire_at__lt=timezone.now()),
+            tenant=user,
+            name__in=filenames,
+            blob=None,
+        ).delete()
+
+    @staticmethod
+    def get_location(user, filename):
+        return f"{settings.ASSET_IMAGE_FOLDER}/{user.username}/{filename}"
+
+    @staticmethod
+    def get_staging_location(user, filename):
+        return (
+            f"{settings.UPLOAD_STAGING_FOLDER}/{user.username}/{uuid.uuid4().hex}/{filename}"
+        )
+
+    @staticmethod
+    def is_staging_location(user, filename, location):
+        """Whether location is one get_staging_location returns for the file."""
+        folder, username, key, name = (location.split("/", 3) + [None] * 4)[:4]
+        return (
+            folder == settings.UPLOAD_STAGING_FOLDER
+            and username == user.username
+            and re.fullmatch(r"[0-9a-f]{32}", key or "") is not None
+            and name == filename
+        )
+
+    @classmethod
+    def move_upload(cls, user, filename, staging_location):
+        """Moves an accepted upload in place, returns its location and its ETag."""
+        file_location = cls.get_location(user, filename)
+        cls.reclaim_locations(user, [filename])
+
+        try:
+            etag = get_storage().move(staging_location, file_location)
+        except StorageError as e:
+            logger.error(e)
+            cls.discard_upload(staging_location)
+            raise ValueError("File upload failed")
+        return file_location, etag
+
+    @classmethod
+    def complete_upload(cls, user, filename, upload_file):
+        """
+        Stores a streamed upload accepted by the view, pending until now at the location
+        of the file, returns its ETag.
+        """
+        cls.reclaim_locations(user, [filename])
+
+        try:
+            return upload_file.complete()
+        except StorageError as e:
+            logger.error(e)
+            upload_file.discard()
+            raise ValueError("File upload failed")
+
+    @staticmethod
+    def presign_upload(user, filename):
+        """
+        Returns the presigned POST of a staging location of its own, the content is only
+        moved in place once the upload is confirmed.
+        """
+        staging_location = File.get_staging_location(user, filename)
+
+        try:
+            return get_storage().presign_upload(
+                staging_location,
+                settings.MAX_DIRECT_UPLOAD_SIZE,
+                settings.AWS_S3_PRESIGNED_POST_EXPIRE,
+            )
+        except StorageError as e:
+            logger.error(e)
+            raise ValueError("Upload presign failed")
+
+    @classmethod
+    def confirm_upload(
+        cls, user, filename, resource, resource_id, staging_location, size=None, checksum=None
+    ):
+        """
+        Records the content posted to staging_location, the key of a presigned POST of
+        the file. It is checked against the size and the SHA-256 given by the client.
+        """
+        if not cls.is_staging_location(user, filename, staging_location):
+            raise ValueError("Invalid upload key")
+
+        try:
+            info = get_storage().stat(staging_location)
+        except StorageError as e:
+            logger.error(e)
+            raise ValueError("Uploaded file not found")
+
+        if size is not None and info["size"] != size:
+            cls.discard_upload(staging_location)
+            raise ValueError("Size mismatch")
+
+        if checksum is not None:
+            try:
+                actual_checksum = get_storage().get_sha256(staging_location)
+            except StorageError as e:
+                logger.error(e)
+                raise ValueError("Uploaded file not found")
+            if actual_checksum != checksum.lower():
+                cls.discard_upload(staging_location)
+                raise ValueError("Checksum mismatch")
+            checksum = actual_checksum
+
+        file_location, etag = cls.move_upload(user, filename, staging_location)
+        cls.record_upload(
+            user,
+            filename,
+            resource,
+            resource_id,
+            file_location,
+            etag,
+            checksum=checksum,
+            size=info["size"],
+        )
 
     @staticmethod
-    def _create_file_object(user, filename, resource, resource_id, file_location):
+    def _create_file_object(
+        user,
+        filename,
+        resource,
+        resource_id,
+        file_location,
+        etag,
+        checksum=None,
+        size=None,
+        blob=None,
+    ):
         tomorrow = timezone.now() + relativedelta(days=1)
 
         defaults = {
             "expire_at": tomorrow,
             "location": file_location,
+            "etag": etag,
+            "checksum": checksum,
+            "size": size,
+            "blob": blob,
+            # uploading a soft deleted file again revives it
+            "delete_flg": False,
         }
-        File.objects.update_or_create(
+        files = File.objects.filter(
+            tenant=user, resource=resource, resource_id=resource_id, name=filename
+        )
+        with transaction.atomic():
+            # the blob of the content it replaces loses a reference
+            previous_blob_id = (
+                files.select_for_update().values_list("blob_id", flat=True).first()
+            )
+            File.objects.update_or_create(
+                tenant=user,
+                resource=resource,
+                resource_id=resource_id,
+                name=filename,
+                defaults=defaults,
+            )
+            if blob is None:
+                File._update_shared_objects(user, {filename: (etag, checksum, size)})
+            if previous_blob_id is not None:
+                Blob.release([previous_blob_id])
+        count_upload_bytes(user, size)
+
+    @staticmethod
+    def _create_file_objects(user, contents, resource, resource_id):
+        """
+        contents maps the name of each file to the (etag, checksum, size) of its content,
+        or to its Blob with DEDUP_UPLOADS.
+        """
+        tomorrow = timezone.now() + relativedelta(days=1)
+
+        files = []
+        for filename, content in contents.items():
+            if isinstance(content, Blob):
+                location, blob = content.location, content
+                etag, checksum, size = content.etag, content.digest, content.size
+            else:
+                location, blob = File.get_location(user, filename), None
+                etag, checksum, size = content
+            files.append(
+                File(
+                    tenant=user,
+                    resource=resource,
+                    resource_id=resource_id,
+                    name=filename,
+                    expire_at=tomorrow,
+                    location=location,
+                    etag=etag,
+                    checksum=checksum,
+                    size=size,
+                    blob=blob,
+                )
+            )
+
+        with transaction.atomic():
+            previous_blob_ids = list(
+                File.objects.select_for_update()
+                .filter(
+                    tenant=user,
+                    resource=resource,
+                    resource_id=resource_id,
+                    name__in=contents,
+                    blob__isnull=False,
+                )
+                .values_list("blob_id", flat=True)
+            )
+            # one INSERT .. ON CONFLICT DO UPDATE, same outcome as update_or_create per file
+            File.objects.bulk_create(
+                files,
+                update_conflicts=True,
+                unique_fields=["tenant", "name", "resource", "resource_id"],
+                update_fields=[
+                    "expire_at",
+                    "location",
+                    "delete_flg",
+                    "etag",
+                    "checksum",
+                    "size",
+                    "blob",
+                ],
+            )
+            File._update_shared_objects(
+                user,
+                {
+                    filename: content
+                    for filename, content in contents.items()
+                    if not isinstance(content, Blob)
+                },
+            )
+            Blob.release(previous_blob_ids)
+        count_upload_bytes(user, sum(file.size or 0 for file in files))
+
+    @staticmethod
+    def _update_shared_objects(user, contents):
+        """
+        The files of the other resources with the same name share the stored object, so
+        its new content is theirs too. contents maps names to (etag, checksum, size).
+        """
+        if not contents:
+            return
+
+        def by_name(index, output_field):
+            return Case(
+                *[
+                    When(name=filename, then=Value(content[index]))
+                    for filename, content in contents.items()
+                ],
+                output_field=output_field,
+            )
+
+        File.objects.filter(
+            tenant=user, name__in=contents, delete_flg=False, blob=None
+        ).update(
+            etag=by_name(0, models.CharField()),
+            checksum=by_name(1, models.CharField()),
+            size=by_name(2, models.BigIntegerField()),
+        )
+
+
+class UploadSession(models.Model):
+    STATUS_IN_PROGRESS = "in_progress"
+    # the parts are assembled in the storage, the file row is not recorded yet
+    STATUS_ASSEMBLED = "assembled"
+    STATUS_COMPLETED = "completed"
+    STATUS_ABORTED = "aborted"
+    STATUS_CHOICES = [
+        (STATUS_IN_PROGRESS, "In progress"),
+        (STATUS_ASSEMBLED, "Assembled"),
+        (STATUS_COMPLETED, "Completed"),
+        (STATUS_ABORTED, "Aborted"),
+    ]
+
+    tenant = models.ForeignKey(Tenant, on_delete=models.CASCADE)
+    name = models.CharField(max_length=100, blank=False, null=False)
+    location = models.CharField(max_length=100, blank=False, null=False)
+    resource = models.CharField(max_length=100, blank=True, null=True)
+    resource_id = models.CharField(max_length=100, blank=True, null=True)
+    upload_id = models.CharField(max_length=1024, blank=False, null=False)
+    status = models.CharField(
+        max_length=20, choices=STATUS_CHOICES, default=STATUS_IN_PROGRESS
+    )
+    # of the assembled object
+    etag = models.CharField(max_length=100, blank=True, null=True)
+    size = models.BigIntegerField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = "upload_session"
+
+    @classmethod
+    def start(cls, user, filename, resource, resource_id):
+        file_location = File.get_location(user, filename)
+
+        try:
+            upload_id = get_storage().start_multipart(file_location)
+        except StorageError as e:
+            logger.error(e)
+            raise ValueError("Upload session start failed")
+
+        return cls.objects.create(
             tenant=user,
+            name=filename,
+            location=file_location,
             resource=resource,
             resource_id=resource_id,
-            name=filename,
-            defaults=defaults,
+            upload_id=upload_id,
+        )
+
+    def upload_part(self, part_number, body):
+        if self.status != self.STATUS_IN_PROGRESS:
+            raise ValueError("Upload session is not in progress")
+
+        if not 1 <= part_number <= settings.MAX_UPLOAD_PARTS:
+            raise ValueError(f"Part number must be between 1 and {settings.MAX_UPLOAD_PARTS}")
+
+        # a retried part replaces the previous attempt, so it does not count twice
+        uploaded_size = (
+            self.parts.exclude(part_number=part_number).aggregate(total=models.Sum("size"))[
+                "total"
+            ]
+            or 0
+        )
+        if uploaded_size + len(body) > settings.MAX_UPLOAD_SESSION_FILE_SIZE:
+            raise ValueError(
+                "File size exceeds the maximum allowed size of "
+                f"{settings.MAX_UPLOAD_SESSION_FILE_SIZE} bytes"
+            )
+
+        try:
+            etag = get_storage().upload_part(self.location, self.upload_id, part_number, body)
+        except StorageError as e:
+            logger.error(e)
+            raise ValueError("Part upload failed")
+
+        UploadPart.objects.update_or_create(
+            session=self,
+            part_number=part_number,
+            defaults={"etag": etag, "size": len(body)},
+        )
+
+    def complete(self):
+        if self.status == self.STATUS_COMPLETED:
+            # the client may retry a completion whose response it never received
+            return
+
+        if self.status == self.STATUS_IN_PROGRESS:
+            self.assemble()
+        elif self.status != self.STATUS_ASSEMBLED:
+            raise ValueError("Upload session is not in progress")
+
+        # a retry of a session assembled before the row failed to be recorded resumes here,
+        # so the assembled object is kept
+        File.record_upload(
+            self.tenant,
+            self.name,
+            self.resource,
+            self.resource_id,
+            self.location,
+            self.etag,
+            size=self.size,
+            discard=False,
         )
+
+        self.status = self.STATUS_COMPLETED
+        self.save(update_fields=["status"])
+
+    def assemble(self):
+        """Completes the multipart upload, its parts can not be uploaded again after it."""
+        parts = list(self.parts.order_by("part_number"))
+        if not parts:
+            raise ValueError("No parts were uploaded")
+
+        File.reclaim_locations(self.tenant, [self.name])
+        try:
+            etag = get_storage().complete_multipart(
+                self.location,
+                self.upload_id,
+                [(part.part_number, part.etag) for part in parts],
+            )
+        except StorageError as e:
+            logger.error(e)
+            raise ValueError("Upload session completion failed")
+
+        self.status = self.STATUS_ASSEMBLED
+        self.etag = etag
+        self.size = sum(part.size for part in parts)
+        self.save(update_fields=["status", "etag", "size"])
+        self.parts.all().delete()
+
+    def abort(self):
+        if self.status != self.STATUS_IN_PROGRESS:
+            raise ValueError("Upload session is not in progress")
+
+        try:
+            get_storage().abort_multipart(self.location, self.upload_id)
+        except StorageError as e:
+            logger.error(e)
+            raise ValueError("Upload session abort failed")
+
+        self.status = self.STATUS_ABORTED
+        self.save(update_fields=["status"])
+        self.parts.all().delete()
+
+
+class UploadPart(models.Model):
+    session = models.ForeignKey(UploadSession, on_delete=models.CASCADE, related_name="parts")
+    part_number = models.PositiveIntegerField()
+    etag = models.CharField(max_length=100)
+    size = models.BigIntegerField()
+
+    class Meta:
+        db_table = "upload_part"
+        unique_together = ("session", "part_number")
@@ -1,31 +1,335 @@
+import base64
+import binascii
+import json
+import math
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.core.paginator import Paginator, PageNotAnInteger, EmptyPage
+from django.db import connection
+from django.db.models import Q
+from django.utils.functional import cached_property
+from rest_framework.exceptions import ValidationError
+from mtfu.file_manager.storage import get_storage
 from mtfu.file_manager.serializers import FileSerializer
 
 DEFAULT_PAGE_NUMBER = 1
 DEFAULT_PAGE_SIZE = 10
 
+CURSOR_PAGINATION = "cursor"
+CURSOR_NEXT = "n"
+CURSOR_PREVIOUS = "p"
+
+COUNT_EXACT = "exact"
+COUNT_ESTIMATED = "estimated"
+COUNT_NONE = "none"
+COUNT_MODES = (COUNT_EXACT, COUNT_ESTIMATED, COUNT_NONE)
+
+# model columns needed to serialize each returned field
+FIELD_COLUMNS = {
+    "tenant_username": ["tenant__username"],
+    "url": ["location"],
+}
+
 
 def paginate_files(request, files, returned_fields):
+    files = project_files(files, returned_fields)
+
+    if is_cursor_pagination(request):
+        return paginate_files_by_cursor(request, files, returned_fields)
+
+    count_mode = get_count_mode(request, COUNT_EXACT)
+    if count_mode == COUNT_NONE:
+        return paginate_files_without_count(request, files, returned_fields)
+    if count_mode == COUNT_ESTIMATED:
+        return paginate_files_with_estimate(request, files, returned_fields)
+
     page_number = request.GET.get("page", DEFAULT_PAGE_NUMBER)
     page_size = request.GET.get("page_size", DEFAULT_PAGE_SIZE)
 
     files = files.order_by("name")
 
     paginator = Paginator(files, page_size)
+    file_list = get_page(paginator, page_number)
+    return get_page_data(paginator, file_list, returned_fields)
+
+
+async def apaginate_files(request, files, returned_fields):
+    """paginate_files for async views, the counts and the pages use the async ORM."""
+    files = project_files(files, returned_fields)
+
+    if is_cursor_pagination(request):
+        return await apaginate_files_by_cursor(request, files, returned_fields)
+
+    count_mode = get_count_mode(request, COUNT_EXACT)
+    if count_mode in (COUNT_NONE, COUNT_ESTIMATED):
+        page_size, bottom, top = get_page_slice(request)
+        file_list = [file async for file in files.order_by("name")[bottom:top]]
+        if count_mode == COUNT_NONE:
+            return get_page_data_without_count(file_list, page_size, returned_fields)
+
+        count = await acount_files(files, count_mode)
+        return get_page_data_with_estimate(file_list, page_size, count, returned_fields)
+
+    page_number = request.GET.get("page", DEFAULT_PAGE_NUMBER)
+    page_size = request.GET.get("page_size", DEFAULT_PAGE_SIZE)
+
+    files = files.order_by("name")
+
+    count = await files.acount()
+    paginator = CountedPaginator(files, page_size, count)
+    page = get_page(paginator, page_number)
+    file_list = [file async for file in page.object_list]
+    return get_page_data(paginator, file_list, returned_fields)
+
+
+def get_page(paginator, page_number):
     try:
-        file_list = paginator.page(page_number)
+        return paginator.page(page_number)
     except PageNotAnInteger:
-        file_list = paginator.page(DEFAULT_PAGE_NUMBER)
+        return paginator.page(DEFAULT_PAGE_NUMBER)
     except EmptyPage:
-        file_list = paginator.page(paginator.num_pages)
+        return paginator.page(paginator.num_pages)
 
-    serializer = FileSerializer(file_list, many=True, fields=returned_fields)
 
+def get_page_data(paginator, file_list, returned_fields):
     # Return serialized data with pagination information
     data = {
         "count": paginator.count,
         "num_pages": paginator.num_pages,
         "page_range": list(paginator.page_range),
-        "files": serializer.data,
+        "files": serialize_files(file_list, returned_fields),
     }
     return data
+
+
+def paginate_files_without_count(request, files, returned_fields):
+    """Page number pagination that never counts, it only tells whether a next page exists."""
+    page_size, bottom, top = get_page_slice(request)
+    file_list = list(files.order_by("name")[bottom:top])
+    return get_page_data_without_count(file_list, page_size, returned_fields)
+
+
+def get_page_slice(request):
+    page_size = get_page_size(request)
+    try:
+        page_number = max(int(request.GET.get("page", DEFAULT_PAGE_NUMBER)), 1)
+    except ValueError:
+        page_number = DEFAULT_PAGE_NUMBER
+
+    # one extra row tells whether there is a next page
+    bottom = (page_number - 1) * page_size
+    top = bottom + page_size + 1
+    return page_size, bottom, top
+
+
+def get_page_data_without_count(file_list, page_size, returned_fields):
+    data = {
+        "count": None,
+        "num_pages": None,
+        "page_range": None,
+        "has_next": len(file_list) > page_size,
+        "files": serialize_files(file_list[:page_size], returned_fields),
+    }
+    return data
+
+
+def paginate_files_with_estimate(request, files, returned_fields):
+    """
+    Page number pagination with the planner's estimate of the count.
+
+    The pages are sliced by offset as without a count, the estimate is only reported:
+    a page clipped to a wrong estimate would repeat or hide files.
+    """
+    page_size, bottom, top = get_page_slice(request)
+    file_list = list(files.order_by("name")[bottom:top])
+    return get_page_data_with_estimate(
+        file_list, page_size, estimate_count(files), returned_fields
+    )
+
+
+def get_page_data_with_estimate(file_list, page_size, count, returned_fields):
+    data = get_page_data_without_count(file_list, page_size, returned_fields)
+    # the first page is there even without files, as with the Paginator
+    num_pages = max(math.ceil(count / page_size), 1)
+    data.update(count=count, num_pages=num_pages, page_range=list(range(1, num_pages + 1)))
+    return data
+
+
+def paginate_files_by_cursor(request, files, returned_fields):
+    """
+    Keyset pagination ordered by (name, id).
+
+    Each page is one indexed range query whatever its depth: no COUNT(*), no OFFSET.
+    The next and previous cursors are opaque to the client.
+    """
+    page_size = get_page_size(request)
+    count_mode = get_count_mode(request, COUNT_NONE)
+    position = get_cursor_position(request)
+
+    count = None
+    if count_mode != COUNT_NONE:
+        count = count_files(files, count_mode)
+
+    # one extra row tells whether there is another page in that direction
+    file_list = list(get_cursor_files(files, position)[: page_size + 1])
+    return get_cursor_page_data(file_list, page_size, position, count, returned_fields)
+
+
+async def apaginate_files_by_cursor(request, files, returned_fields):
+    page_size = get_page_size(request)
+    count_mode = get_count_mode(request, COUNT_NONE)
+    position = get_cursor_position(request)
+
+    count = None
+    if count_mode != COUNT_NONE:
+        count = await acount_files(files, count_mode)
+
+    file_list = [file async for file in get_cursor_files(files, position)[: page_size + 1]]
+    return get_cursor_page_data(file_list, page_size, position, count, returned_fields)
+
+
+def is_cursor_pagination(request):
+    return request.GET.get("pagination") == CURSOR_PAGINATION or "cursor" in request.GET
+
+
+def get_cursor_position(request):
+    cursor = request.GET.get("cursor")
+    return decode_cursor(cursor) if cursor else None
+
+
+def get_cursor_files(files, position):
+    if position is None:
+        return files.order_by("name", "id")
+    if position["direction"] == CURSOR_PREVIOUS:
+        return files.filter(
+            Q(name__lt=position["name"]) | Q(name=position["name"], id__lt=position["id"])
+        ).order_by("-name", "-id")
+    return files.filter(
+        Q(name__gt=position["name"]) | Q(name=position["name"], id__gt=position["id"])
+    ).order_by("name", "id")
+
+
+def get_cursor_page_data(file_list, page_size, position, count, returned_fields):
+    backwards = position is not None and position["direction"] == CURSOR_PREVIOUS
+    has_more = len(file_list) > page_size
+    file_list = file_list[:page_size]
+    if backwards:
+        file_list.reverse()
+
+    next_cursor = None
+    previous_cursor = None
+    if file_list:
+        if has_more or backwards:
+            next_cursor = encode_cursor(file_list[-1], CURSOR_NEXT)
+        if (has_more and backwards) or (position is not None and not backwards):
+            previous_cursor = encode_cursor(file_list[0], CURSOR_PREVIOUS)
+
+    data = {
+        "next": next_cursor,
+        "previous": previous_cursor,
+        "files": serialize_files(file_list, returned_fields),
+    }
+    if count is not None:
+        data["count"] = count
+    return data
+
+
+def serialize_files(file_list, returned_fields):
+    context = {}
+    if "url" in returned_fields and not settings.DOWNLOAD_URLS:
+        context["urls"] = get_storage().get_urls([file.location for file in file_list])
+
+    serializer = FileSerializer(file_list, many=True, fields=returned_fields, context=context)
+    return serializer.data
+
+
+def project_files(files, returned_fields):
+    """Loads only the columns the returned fields need, joining the tenant when needed."""
+    # the name is always needed to order the files
+    columns = {"name"}
+    for field in returned_fields:
+        columns.update(FIELD_COLUMNS.get(field, [field]))
+
+    if "tenant__username" in columns:
+        files = files.select_related("tenant")
+    return files.only(*columns)
+
+
+class CountedPaginator(Paginator):
+    """
+    A Paginator that takes a count obtained elsewhere, such as with the async ORM, instead
+    of running COUNT(*). The count must be exact, the pages are clipped to it.
+    """
+
+    def __init__(self, object_list, per_page, count):
+        super().__init__(object_list, per_page)
+        self._count = count
+
+    @cached_property
+    def count(self):
+        return self._count
+
+
+def count_files(files, count_mode):
+    if count_mode == COUNT_ESTIMATED:
+        return estimate_count(files)
+    return files.count()
+
+
+async def acount_files(files, count_mode):
+    if count_mode == COUNT_ESTIMATED:
+        # EXPLAIN has no async API
+        return await sync_to_async(estimate_count)(files)
+    return await files.acount()
+
+
+def estimate_count(files):
+    """
+    Returns the planner's row estimate for the files, which costs no scan.
+
+    Other databases than PostgreSQL fall back to an exact count.
+    """
+    if connection.vendor != "postgresql":
+        return files.count()
+
+    plan = json.loads(files.order_by().explain(format="json"))
+    return plan[0]["Plan"]["Plan Rows"]
+
+
+def get_count_mode(request, default):
+    count_mode = request.GET.get("count", default)
+    if count_mode not in COUNT_MODES:
+        raise ValidationError({"count": ["Invalid count"]})
+    return count_mode
+
+
+def get_page_size(request):
+    try:
+        page_size = int(request.GET.get("page_size", DEFAULT_PAGE_SIZE))
+    except ValueError:
+        raise ValidationError({"page_size": ["Invalid page size"]})
+
+    if page_size < 1:
+        raise ValidationError({"page_size": ["Invalid page size"]})
+    return page_size
+
+
+def encode_cursor(file, direction):
+    position = json.dumps([file.name, file.id, direction]).encode("utf8")
+    return base64.urlsafe_b64encode(position).decode("ascii")
+
+
+def decode_cursor(cursor):
+    try:
+        name, file_id, direction = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except (ValueError, TypeError, binascii.Error):
+        raise ValidationError({"cursor": ["Invalid cursor"]})
+
+    if (
+        not isinstance(name, str)
+        or not isinstance(file_id, int)
+        or direction not in (CURSOR_NEXT, CURSOR_PREVIOUS)
+    ):
+        raise ValidationError({"cursor": ["Invalid cursor"]})
+    return {"name": name, "id": file_id, "direction": direction}
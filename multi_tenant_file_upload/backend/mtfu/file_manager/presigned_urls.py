@@ -0,0 +1,55 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import caches
+from mtfu.file_manager.sigv4 import get_url_signer
+from mtfu.metrics.collectors import time_presign
+
+
+def get_presigned_url(location):
+    return get_presigned_urls([location])[location]
+
+
+def get_presigned_urls(locations):
+    """
+    Returns a dict mapping each location to a presigned download URL.
+
+    Signed URLs are cached until less than AWS_S3_PRESIGNED_URLS_MIN_TTL seconds of
+    their validity are left, then they are signed again, so a served URL is always
+    usable for at least that long.
+    """
+    cache = caches[settings.PRESIGNED_URLS_CACHE]
+    cache_keys = {location: _get_cache_key(location) for location in set(locations)}
+
+    cached_urls = cache.get_many(cache_keys.values())
+    urls = {}
+    for location, cache_key in cache_keys.items():
+        if cache_key in cached_urls:
+            urls[location] = cached_urls[cache_key]
+
+    missing_locations = [location for location in cache_keys if location not in urls]
+    if missing_locations:
+        signed_urls = _sign_urls(missing_locations)
+        cache.set_many(
+            {cache_keys[location]: url for location, url in signed_urls.items()},
+            timeout=settings.AWS_S3_PRESIGNED_URLS_EXPIRE
+            - settings.AWS_S3_PRESIGNED_URLS_MIN_TTL,
+        )
+        urls.update(signed_urls)
+
+    return urls
+
+
+def _get_cache_key(location):
+    # locations can be longer than, or contain characters not allowed in, cache keys
+    digest = hashlib.sha256(
+        f"{settings.AWS_STORAGE_BUCKET_NAME}/{location}".encode("utf8")
+    ).hexdigest()
+    return f"presigned_url:{digest}"
+
+
+def _sign_urls(locations):
+    with time_presign():
+        return get_url_signer().presign_get_objects(
+            settings.AWS_STORAGE_BUCKET_NAME, locations, settings.AWS_S3_PRESIGNED_URLS_EXPIRE
+        )
@@ -1,5 +1,18 @@
+import asyncio
+import contextvars
+import functools
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
 import boto3
+from botocore.config import Config
+from botocore.exceptions import BotoCoreError, ClientError
 from django.conf import settings
+from mtfu.metrics.collectors import instrument_s3_client, observe_s3_pools
+
+logger = logging.getLogger(__name__)
 
 S3_SESSION = boto3.session.Session(
     aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
@@ -8,5 +21,123 @@ S3_SESSION = boto3.session.Session(
 )
 
 
+class S3ClientRegistry:
+    """
+    The S3 clients of the process, one per signature version, shared by every thread.
+
+    Clients are thread safe and each one holds a connection pool, so sharing them
+    keeps endpoint resolution and service model loading to once per process and lets
+    requests reuse the open, kept alive, connections. A forked child starts with an
+    empty registry, the parent's sockets must not be shared.
+    """
+
+    def __init__(self, session):
+        self.session = session
+        self._clients = {}
+        self._lock = threading.Lock()
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self.reset)
+
+    def get(self, signature_version=None):
+        client = self._clients.get(signature_version)
+        if client is None:
+            with self._lock:
+                client = self._clients.get(signature_version)
+                if client is None:
+                    client = self._create_client(signature_version)
+                    self._clients[signature_version] = client
+        return client
+
+    def reset(self):
+        self._clients = {}
+        self._lock = threading.Lock()
+
+    def warm_up(self):
+        """Creates the default client and opens one connection of its pool."""
+        try:
+            self.get().head_bucket(Bucket=settings.AWS_STORAGE_BUCKET_NAME)
+        except (BotoCoreError, ClientError) as e:
+            logger.error(e)
+
+    def stats(self):
+        """Returns the connection pools of each client, to size AWS_S3_MAX_POOL_CONNECTIONS."""
+        return {
+            str(signature_version or "default"): get_pool_stats(client)
+            for signature_version, client in list(self._clients.items())
+        }
+
+    def _create_client(self, signature_version):
+        config = Config(
+            signature_version=signature_version,
+            max_pool_connections=settings.AWS_S3_MAX_POOL_CONNECTIONS,
+            connect_timeout=settings.AWS_S3_CONNECT_TIMEOUT,
+            read_timeout=settings.AWS_S3_READ_TIMEOUT,
+            tcp_keepalive=settings.AWS_S3_TCP_KEEPALIVE,
+            retries={"total_max_attempts": settings.AWS_S3_MAX_ATTEMPTS, "mode": "standard"},
+        )
+        client = self.session.client(
+            "s3", endpoint_url=settings.AWS_S3_ENDPOINT_URL, config=config
+        )
+        instrument_s3_client(client)
+        if settings.METRICS_ENABLED:
+            client.meta.events.register("after-call.s3", self._observe_pools)
+        return client
+
+    def _observe_pools(self, **kwargs):
+        observe_s3_pools(self.stats().values())
+
+
+def get_pool_stats(client):
+    """
+    urllib3 keeps one pool per host, botocore does not expose them: they are read from
+    private attributes, without the pools when a botocore or urllib3 release moved them.
+    """
+    stats = {"max_pool_connections": client.meta.config.max_pool_connections, "pools": []}
+    try:
+        manager = client._endpoint.http_session._manager
+        for key in manager.pools.keys():
+            pool = manager.pools[key]
+            stats["pools"].append(
+                {
+                    "host": pool.host,
+                    "connections_opened": pool.num_connections,
+                    "requests": pool.num_requests,
+                    "idle_connections": pool.pool.qsize() if pool.pool else 0,
+                }
+            )
+    except (AttributeError, KeyError, TypeError) as e:
+        logger.debug("No S3 connection pool statistics: %r", e)
+        stats["pools"] = []
+    return stats
+
+
+S3_CLIENTS = S3ClientRegistry(S3_SESSION)
+
+
 def get_s3_client():
-    return S3_SESSION.client("s3")
+    return S3_CLIENTS.get()
+
+
+@functools.lru_cache(maxsize=None)
+def get_s3_executor():
+    return ThreadPoolExecutor(
+        max_workers=settings.ASYNC_S3_MAX_WORKERS, thread_name_prefix="s3"
+    )
+
+
+if hasattr(os, "register_at_fork"):
+    # the parent's threads do not exist in a forked child
+    os.register_at_fork(after_in_child=get_s3_executor.cache_clear)
+
+
+async def run_s3(func, *args, **kwargs):
+    """
+    Runs a blocking boto3, or storage engine, call on the S3 thread pool and waits
+    for it without blocking the event loop, which keeps serving other requests meanwhile.
+    """
+    loop = asyncio.get_running_loop()
+    # unlike sync_to_async, run_in_executor does not carry the request's context
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(
+        get_s3_executor(), functools.partial(context.run, func, *args, **kwargs)
+    )
@@ -1,6 +1,7 @@
 from rest_framework import serializers
 from django.conf import settings
-from mtfu.file_manager.s3_utils import get_s3_client
+from django.urls import reverse
+from mtfu.file_manager.storage import get_storage
 from mtfu.file_manager.models import File
 
 
@@ -11,6 +12,7 @@ class FileSerializer(serializers.ModelSerializer):
     class Meta:
         model = File
         fields = [
+            "id",
             "tenant_username",
             "resource",
             "resource_id",
@@ -18,6 +20,9 @@ class FileSerializer(serializers.ModelSerializer):
             "location",
             "expire_at",
             "is_public",
+            "etag",
+            "checksum",
+            "size",
             "url",
         ]
 
@@ -40,21 +45,30 @@ class FileSerializer(serializers.ModelSerializer):
                 self.fields.pop(field_name)
 
     def get_url(self, obj):
-        # Use an S3 client to generate a presigned URL for the file
-        s3_client = get_s3_client()
-        return s3_client.generate_presigned_url(
-            "get_object",
-            Params={
-                "Bucket": settings.AWS_STORAGE_BUCKET_NAME,
-                "Key": obj.location,
-            },
-            ExpiresIn=settings.AWS_S3_PRESIGNED_URLS_EXPIRE,
-        )
+        if settings.DOWNLOAD_URLS:
+            return reverse("mtfu.download", kwargs={"fileId": obj.id})
+
+        # a list serializer gets the URLs of the whole page signed in one go
+        urls = self.context.get("urls")
+        if urls is not None and obj.location in urls:
+            return urls[obj.location]
+        return get_storage().get_url(obj.location)
 
     def get_tenant_username(self, obj):
         return obj.tenant.username
 
 
+def checksum_field(**kwargs):
+    return serializers.RegexField(
+        r"^[0-9a-fA-F]{64}$",
+        error_messages={
+            "required": "No checksum found.",
+            "invalid": "Checksum must be the hex SHA-256 of the file.",
+        },
+        **kwargs,
+    )
+
+
 class UploadSerializer(serializers.Serializer):
     file = serializers.FileField(
         required=True,
@@ -71,13 +85,87 @@ class UploadSerializer(serializers.Serializer):
         required=True,
         error_messages={"required": "No resource id found."},
     )
+    # the SHA-256 of the file computed by the client, checked against its content
+    checksum = checksum_field(required=False)
+
+    def get_max_file_size(self):
+        return settings.MAX_FILE_SIZE
 
     def validate_file(self, value):
         if not hasattr(value, "size"):
             raise serializers.ValidationError("Invalid file")
 
-        if value.size > settings.MAX_FILE_SIZE:
+        max_file_size = self.get_max_file_size()
+        if value.size > max_file_size:
             raise serializers.ValidationError(
-                f"File size exceeds the maximum allowed size of {settings.MAX_FILE_SIZE} bytes"
+                f"File size exceeds the maximum allowed size of {max_file_size} bytes"
             )
         return value
+
+
+class StreamingUploadSerializer(UploadSerializer):
+    def get_max_file_size(self):
+        return settings.MAX_STREAMING_FILE_SIZE
+
+
+class BatchUploadSerializer(serializers.Serializer):
+    files = serializers.ListField(
+        child=serializers.FileField(allow_empty_file=True),
+        allow_empty=False,
+        error_messages={
+            "required": "No file was submitted.",
+            "empty": "No file was submitted.",
+        },
+    )
+    resource = serializers.CharField(
+        required=True,
+        error_messages={"required": "No resource found."},
+    )
+    resource_id = serializers.CharField(
+        required=True,
+        error_messages={"required": "No resource id found."},
+    )
+
+    def validate_files(self, value):
+        if len(value) > settings.MAX_BATCH_UPLOAD_FILES:
+            raise serializers.ValidationError(
+                f"No more than {settings.MAX_BATCH_UPLOAD_FILES} files can be uploaded at once"
+            )
+        return value
+
+
+class FileInfoSerializer(serializers.Serializer):
+    name = serializers.CharField(
+        required=True,
+        max_length=100,
+        error_messages={"required": "No file name found."},
+    )
+    resource = serializers.CharField(
+        required=True,
+        error_messages={"required": "No resource found."},
+    )
+    resource_id = serializers.CharField(
+        required=True,
+        error_messages={"required": "No resource id found."},
+    )
+
+    def validate_name(self, value):
+        # the name becomes the last segment of the S3 key under the tenant folder
+        if "/" in value or "\\" in value or value in (".", ".."):
+            raise serializers.ValidationError("Invalid file name")
+        return value
+
+
+class RefreshUploadSerializer(FileInfoSerializer):
+    checksum = checksum_field(required=True)
+
+
+class ConfirmUploadSerializer(FileInfoSerializer):
+    # the key of the presigned POST the file was sent with
+    key = serializers.CharField(
+        required=True,
+        error_messages={"required": "No upload key found."},
+    )
+    # the size and the SHA-256 of the file known to the client, checked against the upload
+    size = serializers.IntegerField(required=False, min_value=0)
+    checksum = checksum_field(required=False)
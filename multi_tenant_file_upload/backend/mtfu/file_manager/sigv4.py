@@ -0,0 +1,119 @@
+import datetime
+import functools
+import hashlib
+import hmac
+from urllib.parse import quote, urlsplit
+
+from botocore.config import Config
+from botocore.exceptions import NoCredentialsError
+from mtfu.file_manager.s3_utils import S3_CLIENTS, S3_SESSION
+
+ALGORITHM = "AWS4-HMAC-SHA256"
+SERVICE = "s3"
+UNSIGNED_PAYLOAD = "UNSIGNED-PAYLOAD"
+PROBE_KEY = "sigv4-probe"
+
+
+@functools.lru_cache(maxsize=None)
+def get_url_signer():
+    return PresignedUrlSigner(S3_SESSION, s3_client=S3_CLIENTS.get(signature_version="s3v4"))
+
+
+@functools.lru_cache(maxsize=16)
+def get_signing_key(secret_key, date_stamp, region, service):
+    # derived once per day, region and service instead of once per URL
+    key = _hmac(f"AWS4{secret_key}".encode("utf8"), date_stamp)
+    key = _hmac(key, region)
+    key = _hmac(key, service)
+    return _hmac(key, "aws4_request")
+
+
+class PresignedUrlSigner:
+    """
+    Signs S3 get_object URLs with SigV4 query parameters in batches.
+
+    The URLs are the ones botocore's generate_presigned_url returns for a client
+    using the s3v4 signature version, without running its event and handler chain
+    for every key.
+    """
+
+    def __init__(self, session, s3_client=None, **client_kwargs):
+        self.session = session
+        # only used to work out the URLs' endpoint, it must sign with s3v4
+        self.s3_client = s3_client or session.client(
+            "s3", config=Config(signature_version="s3v4"), **client_kwargs
+        )
+        self.region = self.s3_client.meta.region_name or "us-east-1"
+        self._base_urls = {}
+
+    def presign_get_objects(self, bucket, keys, expires_in, now=None):
+        """Returns a dict mapping each key to a presigned get_object URL."""
+        credentials = self.session.get_credentials()
+        if credentials is None:
+            raise NoCredentialsError()
+        credentials = credentials.get_frozen_credentials()
+
+        now = now or datetime.datetime.now(datetime.timezone.utc)
+        amz_date = now.strftime("%Y%m%dT%H%M%SZ")
+        date_stamp = now.strftime("%Y%m%d")
+        scope = f"{date_stamp}/{self.region}/{SERVICE}/aws4_request"
+        signing_key = get_signing_key(credentials.secret_key, date_stamp, self.region, SERVICE)
+
+        params = {
+            "X-Amz-Algorithm": ALGORITHM,
+            "X-Amz-Credential": f"{credentials.access_key}/{scope}",
+            "X-Amz-Date": amz_date,
+            "X-Amz-Expires": str(expires_in),
+            "X-Amz-SignedHeaders": "host",
+        }
+        if credentials.token:
+            params["X-Amz-Security-Token"] = credentials.token
+        # the same query string is shared by every key of the batch, it is signed
+        # sorted but kept in insertion order in the URL, like botocore does
+        query = _encode_query(params.items())
+        canonical_query = _encode_query(sorted(params.items()))
+
+        scheme, host, path_prefix = self._get_base_url(bucket)
+        request_suffix = f"{canonical_query}\nhost:{host}\n\nhost\n{UNSIGNED_PAYLOAD}"
+        string_to_sign_prefix = f"{ALGORITHM}\n{amz_date}\n{scope}\n"
+
+        urls = {}
+        for key in keys:
+            path = f"{path_prefix}/{quote(key, safe='/~')}"
+            canonical_request = f"GET\n{path}\n{request_suffix}"
+            string_to_sign = string_to_sign_prefix + _sha256(canonical_request)
+            signature = hmac.new(
+                signing_key, string_to_sign.encode("utf8"), hashlib.sha256
+            ).hexdigest()
+            urls[key] = f"{scheme}://{host}{path}?{query}&X-Amz-Signature={signature}"
+        return urls
+
+    def _get_base_url(self, bucket):
+        # let botocore work out the addressing style and endpoint once per bucket
+        if bucket not in self._base_urls:
+            probe_url = self.s3_client.generate_presigned_url(
+                "get_object", Params={"Bucket": bucket, "Key": PROBE_KEY}
+            )
+            parts = urlsplit(probe_url)
+            host = parts.netloc
+            if (parts.scheme, parts.port) in (("https", 443), ("http", 80)):
+                host = parts.hostname
+            path_prefix = parts.path[: -len(f"/{PROBE_KEY}")]
+            self._base_urls[bucket] = (parts.scheme, host, path_prefix)
+        return self._base_urls[bucket]
+
+
+def _encode_query(params):
+    return "&".join(f"{_quote(name)}={_quote(value)}" for name, value in params)
+
+
+def _quote(value):
+    return quote(value, safe="-_.~")
+
+
+def _sha256(value):
+    return hashlib.sha256(value.encode("utf8")).hexdigest()
+
+
+def _hmac(key, message):
+    return hmac.new(key, message.encode("utf8"), hashlib.sha256).digest()
@@ -0,0 +1,564 @@
+"""
+Storage engines, where the content of the files is kept.
+
+STORAGE_ENGINE picks the engine of the process:
+
+- "s3": the AWS_STORAGE_BUCKET_NAME bucket, files are downloaded with presigned S3 URLs
+- "local": a directory, LOCAL_STORAGE_ROOT, files are downloaded from the app which
+  sends them with sendfile, the content is never copied into the process
+- "memory": a dict in the process, every call waits MEMORY_STORAGE_LATENCY seconds
+  first like a round trip to S3 would. Measures the app without the network, one
+  process only
+
+Files are addressed by their location, e.g. asset_imgs/john/a.txt. Every engine
+raises StorageError when an operation fails.
+"""
+import contextlib
+import functools
+import hashlib
+import io
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from pathlib import Path
+
+from botocore.exceptions import ClientError
+from django.conf import settings
+from django.core import signing
+from django.core.exceptions import ImproperlyConfigured
+from django.urls import reverse
+
+from mtfu.file_manager.presigned_urls import get_presigned_urls
+from mtfu.file_manager.s3_utils import get_s3_client
+
+logger = logging.getLogger(__name__)
+
+COPY_BUFFER_SIZE = 1024 * 1024
+# smaller files are saved to S3 with one put_object, like upload_fileobj would
+S3_SINGLE_PUT_MAX_SIZE = 1024 * 1024 * 8
+
+
+class StorageError(Exception):
+    pass
+
+
+def get_md5_etag(content):
+    # the ETag S3 gives an object uploaded with a single request
+    return f'"{hashlib.md5(content).hexdigest()}"'
+
+
+def get_sha256(file):
+    """
+    Returns the hex SHA-256 of the content of an uploaded file, the one computed while
+    it was received when there is one, see upload_handlers.py, or read in chunks.
+    """
+    if getattr(file, "sha256", None) is not None:
+        return file.sha256
+
+    sha256 = hashlib.sha256()
+    for chunk in file.chunks(COPY_BUFFER_SIZE):
+        sha256.update(chunk)
+    file.seek(0)
+    return sha256.hexdigest()
+
+
+class StorageEngine:
+    def save(self, location, file):
+        """Stores the content of the readable binary file at location, returns its ETag."""
+        raise NotImplementedError
+
+    def create_folder(self, location):
+        raise NotImplementedError
+
+    def exists(self, location):
+        raise NotImplementedError
+
+    def stat(self, location):
+        """Returns the size and the ETag of the content at location."""
+        raise NotImplementedError
+
+    def open(self, location, offset=0, length=None):
+        """
+        Returns a readable binary file of the content at location, or of length bytes
+        of it from offset.
+        """
+        raise NotImplementedError
+
+    def delete(self, location):
+        raise NotImplementedError
+
+    def get_sha256(self, location):
+        """Returns the hex SHA-256 of the content at location, read in chunks."""
+        sha256 = hashlib.sha256()
+        with self.open(location) as file:
+            for chunk in iter(lambda: file.read(COPY_BUFFER_SIZE), b""):
+                sha256.update(chunk)
+        return sha256.hexdigest()
+
+    def move(self, source, destination):
+        """Moves the content at source to destination, replacing it, returns its ETag."""
+        raise NotImplementedError
+
+    def delete_many(self, locations):
+        """Deletes the locations, returns the ones that could not be deleted."""
+        failed = set()
+        for location in locations:
+            try:
+                self.delete(location)
+            except StorageError:
+                failed.add(location)
+        return failed
+
+    def get_url(self, location):
+        return self.get_urls([location])[location]
+
+    def get_urls(self, locations):
+        """Returns a dict mapping each location to a download URL."""
+        raise NotImplementedError
+
+    def presign_upload(self, location, max_size, expires_in):
+        """Returns the URL and the form fields a client uploads the file to directly."""
+        raise StorageError(f"Direct uploads are not supported by {type(self).__name__}")
+
+    # multipart uploads: the parts are numbered from 1 and assembled in order
+
+    def start_multipart(self, location):
+        """Returns the id of a new multipart upload to location."""
+        raise NotImplementedError
+
+    def upload_part(self, location, upload_id, part_number, body):
+        """Stores one part, returns its ETag."""
+        raise NotImplementedError
+
+    def complete_multipart(self, location, upload_id, parts):
+        """Assembles the parts, (part number, ETag) pairs, at location, returns its ETag."""
+        raise NotImplementedError
+
+    def abort_multipart(self, location, upload_id):
+        raise NotImplementedError
+
+
+@contextlib.contextmanager
+def s3_errors():
+    try:
+        yield
+    except ClientError as e:
+        raise StorageError(str(e)) from e
+
+
+class S3Storage(StorageEngine):
+    def save(self, location, file):
+        size = getattr(file, "size", None)
+        with s3_errors():
+            if size is not None and size < S3_SINGLE_PUT_MAX_SIZE:
+                # the response has the ETag, no head_object needed
+                response = get_s3_client().put_object(
+                    Bucket=settings.AWS_STORAGE_BUCKET_NAME, Key=location, Body=file
+                )
+                return response["ETag"]
+            get_s3_client().upload_fileobj(file, settings.AWS_STORAGE_BUCKET_NAME, location)
+        return self.stat(location)["etag"]
+
+    def create_folder(self, location):
+        with s3_errors():
+            get_s3_client().put_object(Bucket=settings.AWS_STORAGE_BUCKET_NAME, Key=location)
+
+    def exists(self, location):
+        try:
+            get_s3_client().head_object(Bucket=settings.AWS_STORAGE_BUCKET_NAME, Key=location)
+        except ClientError as e:
+            if e.response["Error"]["Code"] in ("404", "NoSuchKey"):
+                return False
+            raise StorageError(str(e)) from e
+        return True
+
+    def stat(self, location):
+        with s3_errors():
+            response = get_s3_client().head_object(
+                Bucket=settings.AWS_STORAGE_BUCKET_NAME, Key=location
+            )
+        return {"size": response["ContentLength"], "etag": response["ETag"]}
+
+    def open(self, location, offset=0, length=None):
+        params = {}
+        if offset or length is not None:
+            end = "" if length is None else offset + length - 1
+            params["Range"] = f"bytes={offset}-{end}"
+        with s3_errors():
+            response = get_s3_client().get_object(
+                Bucket=settings.AWS_STORAGE_BUCKET_NAME, Key=location, **params
+            )
+        return response["Body"]
+
+    def delete(self, location):
+        with s3_errors():
+            get_s3_client().delete_object(
+                Bucket=settings.AWS_STORAGE_BUCKET_NAME, Key=location
+            )
+
+    def move(self, source, destination):
+        # a server side copy, one request up to 5GB, the most an upload can be
+        with s3_errors():
+            response = get_s3_client().copy_object(
+                Bucket=settings.AWS_STORAGE_BUCKET_NAME,
+                Key=destination,
+                CopySource={"Bucket": settings.AWS_STORAGE_BUCKET_NAME, "Key": source},
+            )
+        self.delete(source)
+        return response["CopyObjectResult"]["ETag"]
+
+    def delete_many(self, locations):
+        # one request, up to 1000 keys
+        try:
+            response = get_s3_client().delete_objects(
+                Bucket=settings.AWS_STORAGE_BUCKET_NAME,
+                Delete={
+                    "Objects": [{"Key": location} for location in locations],
+                    "Quiet": True,
+                },
+            )
+        except ClientError as e:
+            logger.error(e)
+            return set(locations)
+
+        errors = response.get("Errors", [])
+        for error in errors:
+            logger.error("%s: %s", error["Key"], error.get("Message"))
+        return {error["Key"] for error in errors}
+
+    def get_urls(self, locations):
+        return get_presigned_urls(locations)
+
+    def presign_upload(self, location, max_size, expires_in):
+        # the policy pins the key and the size, S3 rejects anything else
+        with s3_errors():
+            return get_s3_client().generate_presigned_post(
+                settings.AWS_STORAGE_BUCKET_NAME,
+                location,
+                Conditions=[["content-length-range", 0, max_size]],
+                ExpiresIn=expires_in,
+            )
+
+    def start_multipart(self, location):
+        with s3_errors():
+            response = get_s3_client().create_multipart_upload(
+                Bucket=settings.AWS_STORAGE_BUCKET_NAME, Key=location
+            )
+        return response["UploadId"]
+
+    def upload_part(self, location, upload_id, part_number, body):
+        with s3_errors():
+            response = get_s3_client().upload_part(
+                Bucket=settings.AWS_STORAGE_BUCKET_NAME,
+                Key=location,
+                UploadId=upload_id,
+                PartNumber=part_number,
+                Body=body,
+            )
+        return response["ETag"]
+
+    def complete_multipart(self, location, upload_id, parts):
+        with s3_errors():
+            response = get_s3_client().complete_multipart_upload(
+                Bucket=settings.AWS_STORAGE_BUCKET_NAME,
+                Key=location,
+                UploadId=upload_id,
+                MultipartUpload={
+                    "Parts": [
+                        {"ETag": etag, "PartNumber": part_number}
+                        for part_number, etag in parts
+                    ]
+                },
+            )
+        return response["ETag"]
+
+    def abort_multipart(self, location, upload_id):
+        with s3_errors():
+            get_s3_client().abort_multipart_upload(
+                Bucket=settings.AWS_STORAGE_BUCKET_NAME, Key=location, UploadId=upload_id
+            )
+
+
+def get_signed_url(location):
+    """A URL of StorageDownloadView, valid for AWS_S3_PRESIGNED_URLS_EXPIRE seconds."""
+    _, timestamp, signature = get_url_signer().sign(location).rsplit(":", 2)
+    url = reverse("mtfu.storage_download", kwargs={"location": location})
+    return f"{url}?signature={timestamp}:{signature}"
+
+
+def check_signed_url(location, signature):
+    """Raises StorageError unless signature was made by get_signed_url and is still valid."""
+    try:
+        get_url_signer().unsign(
+            f"{location}:{signature}", max_age=settings.AWS_S3_PRESIGNED_URLS_EXPIRE
+        )
+    except signing.BadSignature as e:
+        raise StorageError(str(e)) from e
+
+
+def get_url_signer():
+    return signing.TimestampSigner(salt="mtfu.file_manager.storage")
+
+
+class FileRange(io.RawIOBase):
+    """
+    The next length bytes of a file. fileno() is the file's, so a WSGI server can
+    still sendfile them, sending Content-Length bytes from the file's position.
+    """
+
+    def __init__(self, file, length):
+        self.file = file
+        self.remaining = length
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        size = min(len(buffer), self.remaining)
+        data = self.file.read(size)
+        buffer[: len(data)] = data
+        self.remaining -= len(data)
+        return len(data)
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def close(self):
+        self.file.close()
+        super().close()
+
+
+class LocalStorage(StorageEngine):
+    @property
+    def root(self):
+        return Path(settings.LOCAL_STORAGE_ROOT)
+
+    def save(self, location, file):
+        path = self._get_path(location)
+        with self._write(path) as destination:
+            shutil.copyfileobj(file, destination, COPY_BUFFER_SIZE)
+        return self.stat(location)["etag"]
+
+    def create_folder(self, location):
+        with self._os_errors():
+            self._get_path(location).mkdir(parents=True, exist_ok=True)
+
+    def exists(self, location):
+        return self._get_path(location).is_file()
+
+    def stat(self, location):
+        with self._os_errors():
+            stat = self._get_path(location).stat()
+        # like nginx, a new mtime or size is a new ETag
+        return {"size": stat.st_size, "etag": f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'}
+
+    def open(self, location, offset=0, length=None):
+        with self._os_errors():
+            file = open(self._get_path(location), "rb")
+        if offset:
+            file.seek(offset)
+        if length is None:
+            return file
+        return FileRange(file, length)
+
+    def delete(self, location):
+        with self._os_errors():
+            self._get_path(location).unlink(missing_ok=True)
+
+    def move(self, source, destination):
+        path = self._get_path(destination)
+        with self._os_errors():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(self._get_path(source), path)
+        return self.stat(destination)["etag"]
+
+    def get_urls(self, locations):
+        return {location: get_signed_url(location) for location in locations}
+
+    def start_multipart(self, location):
+        upload_id = uuid.uuid4().hex
+        with self._os_errors():
+            self._get_upload_path(upload_id).mkdir(parents=True)
+        return upload_id
+
+    def upload_part(self, location, upload_id, part_number, body):
+        upload_path = self._get_upload_path(upload_id)
+        if not upload_path.is_dir():
+            raise StorageError(f"No such upload: {upload_id}")
+        with self._write(upload_path / str(part_number)) as destination:
+            destination.write(body)
+        return get_md5_etag(body)
+
+    def complete_multipart(self, location, upload_id, parts):
+        upload_path = self._get_upload_path(upload_id)
+        with self._write(self._get_path(location)) as destination:
+            for part_number, _ in parts:
+                with open(upload_path / str(part_number), "rb") as part:
+                    shutil.copyfileobj(part, destination, COPY_BUFFER_SIZE)
+        shutil.rmtree(upload_path, ignore_errors=True)
+        return self.stat(location)["etag"]
+
+    def abort_multipart(self, location, upload_id):
+        with self._os_errors():
+            shutil.rmtree(self._get_upload_path(upload_id))
+
+    def _get_path(self, location):
+        root = self.root.resolve()
+        path = (root / location).resolve()
+        if root not in path.parents:
+            raise StorageError(f"Invalid location: {location}")
+        return path
+
+    def _get_upload_path(self, upload_id):
+        # the parts of unfinished multipart uploads, next to the files
+        return self._get_path(f".uploads/{upload_id}")
+
+    @contextlib.contextmanager
+    def _write(self, path):
+        # readers see the whole file or nothing, never a partial one
+        with self._os_errors():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(dir=path.parent, prefix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as destination:
+                    yield destination
+                os.replace(temp_path, path)
+            except BaseException:
+                os.unlink(temp_path)
+                raise
+
+    @staticmethod
+    @contextlib.contextmanager
+    def _os_errors():
+        try:
+            yield
+        except OSError as e:
+            raise StorageError(str(e)) from e
+
+
+class MemoryStorage(StorageEngine):
+    def __init__(self):
+        self.objects = {}
+        self.uploads = {}
+        self._lock = threading.Lock()
+
+    def save(self, location, file):
+        self._wait()
+        content = file.read()
+        with self._lock:
+            self.objects[location] = content
+        return get_md5_etag(content)
+
+    def create_folder(self, location):
+        self._wait()
+        with self._lock:
+            self.objects[location] = b""
+
+    def exists(self, location):
+        self._wait()
+        return location in self.objects
+
+    def stat(self, location):
+        self._wait()
+        content = self._get_content(location)
+        return {"size": len(content), "etag": get_md5_etag(content)}
+
+    def open(self, location, offset=0, length=None):
+        self._wait()
+        content = self._get_content(location)
+        end = None if length is None else offset + length
+        return io.BytesIO(content[offset:end])
+
+    def delete(self, location):
+        self._wait()
+        with self._lock:
+            self.objects.pop(location, None)
+
+    def move(self, source, destination):
+        self._wait()
+        with self._lock:
+            content = self._get_content(source)
+            self.objects[destination] = self.objects.pop(source)
+        return get_md5_etag(content)
+
+    def delete_many(self, locations):
+        self._wait()
+        with self._lock:
+            for location in locations:
+                self.objects.pop(location, None)
+        return set()
+
+    def get_urls(self, locations):
+        return {location: get_signed_url(location) for location in locations}
+
+    def start_multipart(self, location):
+        self._wait()
+        upload_id = uuid.uuid4().hex
+        with self._lock:
+            self.uploads[upload_id] = {}
+        return upload_id
+
+    def upload_part(self, location, upload_id, part_number, body):
+        self._wait()
+        with self._lock:
+            if upload_id not in self.uploads:
+                raise StorageError(f"No such upload: {upload_id}")
+            self.uploads[upload_id][part_number] = bytes(body)
+        return get_md5_etag(body)
+
+    def complete_multipart(self, location, upload_id, parts):
+        self._wait()
+        with self._lock:
+            try:
+                upload = self.uploads.pop(upload_id)
+                content = b"".join(upload[part_number] for part_number, _ in parts)
+            except KeyError as e:
+                raise StorageError(f"Missing upload or part: {e}")
+            self.objects[location] = content
+        return get_md5_etag(content)
+
+    def abort_multipart(self, location, upload_id):
+        self._wait()
+        with self._lock:
+            if self.uploads.pop(upload_id, None) is None:
+                raise StorageError(f"No such upload: {upload_id}")
+
+    def clear(self):
+        with self._lock:
+            self.objects.clear()
+            self.uploads.clear()
+
+    def _get_content(self, location):
+        try:
+            return self.objects[location]
+        except KeyError:
+            raise StorageError(f"No such location: {location}")
+
+    def _wait(self):
+        if settings.MEMORY_STORAGE_LATENCY:
+            time.sleep(settings.MEMORY_STORAGE_LATENCY)
+
+
+STORAGE_ENGINES = {
+    "s3": S3Storage,
+    "local": LocalStorage,
+    "memory": MemoryStorage,
+}
+
+
+def get_storage():
+    return _get_storage(settings.STORAGE_ENGINE)
+
+
+@functools.lru_cache(maxsize=None)
+def _get_storage(engine):
+    try:
+        return STORAGE_ENGINES[engine]()
+    except KeyError:
+        raise ImproperlyConfigured(
+            f"STORAGE_ENGINE must be one of {', '.join(STORAGE_ENGINES)}, not {engine!r}"
+        )
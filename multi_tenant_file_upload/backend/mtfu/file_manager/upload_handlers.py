@@ -0,0 +1,203 @@
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import (
+    FileUploadHandler,
+    MemoryFileUploadHandler,
+    TemporaryFileUploadHandler,
+)
+from mtfu.file_manager.models import File
+from mtfu.file_manager.storage import StorageError, get_storage
+import hashlib
+import io
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class HashingUploadHandlerMixin:
+    """
+    Computes the SHA-256 of a file while it is received, as its sha256 attribute, so
+    get_sha256 does not read the file again.
+    """
+
+    def new_file(self, *args, **kwargs):
+        # before the memory handler stops the next ones
+        self.sha256 = hashlib.sha256()
+        super().new_file(*args, **kwargs)
+
+    def receive_data_chunk(self, raw_data, start):
+        remaining = super().receive_data_chunk(raw_data, start)
+        if remaining is None:
+            # kept by this handler
+            self.sha256.update(raw_data)
+        return remaining
+
+    def file_complete(self, file_size):
+        file = super().file_complete(file_size)
+        if file is not None:
+            file.sha256 = self.sha256.hexdigest()
+        return file
+
+
+class HashingMemoryFileUploadHandler(HashingUploadHandlerMixin, MemoryFileUploadHandler):
+    pass
+
+
+class HashingTemporaryFileUploadHandler(HashingUploadHandlerMixin, TemporaryFileUploadHandler):
+    pass
+
+
+class S3UploadedFile(UploadedFile):
+    """
+    A file whose content was streamed to the storage while the request was parsed.
+
+    The content is not stored yet: the multipart upload to its location is pending
+    until complete() is called, or it is kept in memory when it is smaller than one
+    part. ``location`` is None when nothing can be stored, either because the file was
+    too big or because the storage failed.
+    """
+
+    def __init__(
+        self,
+        name,
+        size,
+        content_type,
+        charset,
+        location,
+        upload_id=None,
+        parts=None,
+        content=None,
+        checksum=None,
+        failed=False,
+    ):
+        super().__init__(
+            file=None, name=name, content_type=content_type, size=size, charset=charset
+        )
+        self.location = location
+        self.upload_id = upload_id
+        self.parts = parts or []
+        self.content = content
+        self.checksum = checksum
+        self.failed = failed
+
+    def complete(self):
+        """Stores the content at its location, returns its ETag."""
+        storage = get_storage()
+        if self.upload_id is None:
+            return storage.save(self.location, io.BytesIO(self.content or b""))
+        return storage.complete_multipart(self.location, self.upload_id, self.parts)
+
+    def discard(self):
+        """Drops the content of a file that is not accepted."""
+        self.content = None
+        if self.upload_id is not None:
+            try:
+                get_storage().abort_multipart(self.location, self.upload_id)
+            except StorageError as e:
+                logger.error(e)
+            self.upload_id = None
+
+
+class S3StreamingUploadHandler(FileUploadHandler):
+    """
+    Forwards uploaded chunks into a multipart upload of the storage as they arrive.
+
+    The multipart upload goes to the location of the file but is only completed by the
+    view, once the request is accepted: a rejected upload is aborted and leaves the file
+    it would have replaced untouched, and an accepted one is not copied again.
+
+    At most one part is buffered in memory and nothing is written to disk, so the
+    memory used by an upload does not depend on its size. Files smaller than one
+    part are saved with a single call instead.
+    """
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.storage = get_storage()
+        self.location = File.get_location(self.request.user, self.file_name)
+        self.upload_id = None
+        self.sha256 = hashlib.sha256()
+        self.parts = []
+        self.buffer = bytearray()
+        self.size = 0
+        self.discarding = False
+        self.failed = False
+
+    def receive_data_chunk(self, raw_data, start):
+        self.size += len(raw_data)
+
+        if self.discarding:
+            return None
+
+        if self.size > settings.MAX_STREAMING_FILE_SIZE:
+            # keep counting so the size validation can report it, but store nothing
+            self._discard()
+            return None
+
+        self.sha256.update(raw_data)
+        self.buffer += raw_data
+        if len(self.buffer) >= settings.S3_STREAMING_PART_SIZE:
+            try:
+                self._upload_part()
+            except StorageError as e:
+                logger.error(e)
+                self.failed = True
+                self._discard()
+
+        # returning None keeps the chunk away from any other handler
+        return None
+
+    def file_complete(self, file_size):
+        location = None
+        content = None
+        if not self.discarding:
+            try:
+                if self.upload_id is None:
+                    # saved once the request is accepted
+                    content = bytes(self.buffer)
+                elif self.buffer:
+                    self._upload_part()
+                location = self.location
+            except StorageError as e:
+                logger.error(e)
+                self.failed = True
+                self._discard()
+
+        upload_file = S3UploadedFile(
+            name=self.file_name,
+            size=self.size,
+            content_type=self.content_type,
+            charset=self.charset,
+            location=location,
+            upload_id=self.upload_id,
+            parts=self.parts,
+            content=content,
+            checksum=self.sha256.hexdigest(),
+            failed=self.failed,
+        )
+        self.buffer = bytearray()
+        return upload_file
+
+    def upload_interrupted(self):
+        self._discard()
+
+    def _upload_part(self):
+        if self.upload_id is None:
+            self.upload_id = self.storage.start_multipart(self.location)
+
+        part_number = len(self.parts) + 1
+        etag = self.storage.upload_part(
+            self.location, self.upload_id, part_number, bytes(self.buffer)
+        )
+        self.parts.append((part_number, etag))
+        self.buffer.clear()
+
+    def _discard(self):
+        self.discarding = True
+        self.buffer = bytearray()
+        if self.upload_id is not None:
+            try:
+                self.storage.abort_multipart(self.location, self.upload_id)
+            except StorageError as e:
+                logger.error(e)
+            self.upload_id = None
@@ -1,12 +1,66 @@
-from .views import UploadView, FileView, ListFilesView
+from .views import (
+    UploadView,
+    BatchUploadView,
+    StreamingUploadView,
+    FileView,
+    ListFilesView,
+    PresignUploadView,
+    ConfirmUploadView,
+    RefreshUploadView,
+    UploadSessionView,
+    UploadSessionDetailView,
+    UploadSessionPartView,
+    UploadSessionCompleteView,
+    StorageDownloadView,
+    DownloadView,
+)
+from .async_views import AsyncUploadView, AsyncFileView, AsyncListFilesView
+from django.conf import settings
 from django.urls import path
 
+if settings.ASYNC_VIEWS:
+    # served through mtfu.asgi, the other views keep running on a thread
+    upload_view, file_view, list_files_view = (
+        AsyncUploadView,
+        AsyncFileView,
+        AsyncListFilesView,
+    )
+else:
+    upload_view, file_view, list_files_view = UploadView, FileView, ListFilesView
+
 urlpatterns = [
-    path("upload", UploadView.as_view(), name="mtfu.upload"),
+    path("upload", upload_view.as_view(), name="mtfu.upload"),
+    path("upload/batch", BatchUploadView.as_view(), name="mtfu.upload_batch"),
+    path("upload/stream", StreamingUploadView.as_view(), name="mtfu.upload_stream"),
+    path("upload/presign", PresignUploadView.as_view(), name="mtfu.upload_presign"),
+    path("upload/confirm", ConfirmUploadView.as_view(), name="mtfu.upload_confirm"),
+    path("upload/refresh", RefreshUploadView.as_view(), name="mtfu.upload_refresh"),
     path(
         "files/<str:resource>/<str:resourceId>",
-        FileView.as_view(),
+        file_view.as_view(),
         name="mtfu.files",
     ),
-    path("list_files", ListFilesView.as_view(), name="mtfu.list_files"),
+    path("list_files", list_files_view.as_view(), name="mtfu.list_files"),
+    path("download/<int:fileId>", DownloadView.as_view(), name="mtfu.download"),
+    path("upload_sessions", UploadSessionView.as_view(), name="mtfu.upload_sessions"),
+    path(
+        "upload_sessions/<int:sessionId>",
+        UploadSessionDetailView.as_view(),
+        name="mtfu.upload_session",
+    ),
+    path(
+        "upload_sessions/<int:sessionId>/parts/<int:partNumber>",
+        UploadSessionPartView.as_view(),
+        name="mtfu.upload_session_part",
+    ),
+    path(
+        "upload_sessions/<int:sessionId>/complete",
+        UploadSessionCompleteView.as_view(),
+        name="mtfu.upload_session_complete",
+    ),
+    path(
+        "storage/<path:location>",
+        StorageDownloadView.as_view(),
+        name="mtfu.storage_download",
+    ),
 ]
@@ -1,24 +1,36 @@
 from rest_framework.parsers import MultiPartParser, FileUploadParser
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated
-from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework.permissions import AllowAny, IsAuthenticated
+from mtfu.auth_user.authentication import TenantJWTAuthentication
+from mtfu.auth_user.throttling import UPLOAD_THROTTLES, UploadLeaseMixin
 from rest_framework import status
 
-from mtfu.file_manager.models import File
-from django.db import transaction
-from django.db.models import Q
-from django.utils import timezone
+from mtfu.file_manager.download_utils import serve_file
+from mtfu.file_manager.file_cache import get_file_cache, invalidate_cached_files
+from mtfu.file_manager.models import File, PreconditionFailed, UploadSession
 from mtfu.file_manager.pagination_utils import paginate_files
-from mtfu.file_manager.serializers import UploadSerializer
+from mtfu.file_manager.serializers import (
+    UploadSerializer,
+    BatchUploadSerializer,
+    StreamingUploadSerializer,
+    FileInfoSerializer,
+    RefreshUploadSerializer,
+    ConfirmUploadSerializer,
+)
+from mtfu.file_manager.storage import StorageError, check_signed_url
+from mtfu.file_manager.upload_handlers import S3StreamingUploadHandler, S3UploadedFile
+from django.conf import settings
 import logging
+import posixpath
 
 logger = logging.getLogger(__name__)
 
 
-class UploadView(APIView):
-    authentication_classes = [JWTAuthentication]
+class UploadView(UploadLeaseMixin, APIView):
+    authentication_classes = [TenantJWTAuthentication]
     permission_classes = [IsAuthenticated]
+    throttle_classes = UPLOAD_THROTTLES
     parser_classes = [MultiPartParser, FileUploadParser]
 
     def post(self, request):
@@ -29,32 +41,150 @@ class UploadView(APIView):
             resource_id = serializer.validated_data["resource_id"]
 
             try:
-                File.create(request.user, upload_file, resource, resource_id)
+                etag = File.create(
+                    request.user,
+                    upload_file,
+                    resource,
+                    resource_id,
+                    serializer.validated_data.get("checksum"),
+                    request.META.get("HTTP_IF_MATCH"),
+                    request.META.get("HTTP_IF_NONE_MATCH"),
+                )
+            except PreconditionFailed as e:
+                return Response(
+                    {"message": str(e)}, status=status.HTTP_412_PRECONDITION_FAILED
+                )
+            except ValueError as e:
+                return Response({"message": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+            if etag is None:
+                return Response({"message": "File is unchanged"})
+            return Response({"message": "File uploaded successfully"}, headers={"ETag": etag})
+        else:
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+class BatchUploadView(UploadLeaseMixin, APIView):
+    authentication_classes = [TenantJWTAuthentication]
+    permission_classes = [IsAuthenticated]
+    throttle_classes = UPLOAD_THROTTLES
+    parser_classes = [MultiPartParser]
+
+    def post(self, request):
+        serializer = BatchUploadSerializer(data=request.data)
+        if serializer.is_valid():
+            resource = serializer.validated_data["resource"]
+            resource_id = serializer.validated_data["resource_id"]
+
+            # files that can not be uploaded are reported without failing the others
+            errors = []
+            upload_files = []
+            filenames = set()
+            for upload_file in serializer.validated_data["files"]:
+                error = None
+                if upload_file.name in filenames:
+                    error = "Duplicate file name"
+                elif upload_file.size > settings.MAX_FILE_SIZE:
+                    error = (
+                        "File size exceeds the maximum allowed size of "
+                        f"{settings.MAX_FILE_SIZE} bytes"
+                    )
+                else:
+                    upload_files.append(upload_file)
+                filenames.add(upload_file.name)
+                errors.append((upload_file.name, error))
+
+            results = {}
+            if upload_files:
+                results = File.create_many(request.user, upload_files, resource, resource_id)
+
+            files = []
+            for filename, error in errors:
+                error = error or results[filename]
+                if error is None:
+                    files.append({"name": filename, "uploaded": True})
+                else:
+                    files.append({"name": filename, "uploaded": False, "message": error})
+
+            if all(file["uploaded"] for file in files):
+                return Response({"message": "Files uploaded successfully", "files": files})
+
+            return Response(
+                {"message": "Some files could not be uploaded", "files": files},
+                status=status.HTTP_207_MULTI_STATUS,
+            )
+        else:
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+class StreamingUploadView(UploadLeaseMixin, APIView):
+    authentication_classes = [TenantJWTAuthentication]
+    permission_classes = [IsAuthenticated]
+    throttle_classes = UPLOAD_THROTTLES
+    parser_classes = [MultiPartParser, FileUploadParser]
+
+    def post(self, request):
+        # the handlers must be in place before request.data is first read
+        request._request.upload_handlers = [S3StreamingUploadHandler(request._request)]
+
+        serializer = StreamingUploadSerializer(data=request.data)
+        if serializer.is_valid():
+            upload_file = serializer.validated_data["file"]
+            resource = serializer.validated_data["resource"]
+            resource_id = serializer.validated_data["resource_id"]
+
+            if upload_file.location is None:
+                return Response(
+                    {"message": "File upload failed"}, status=status.HTTP_400_BAD_REQUEST
+                )
+
+            checksum = serializer.validated_data.get("checksum")
+            if checksum is not None and checksum.lower() != upload_file.checksum:
+                upload_file.discard()
+                return Response(
+                    {"message": "Checksum mismatch"}, status=status.HTTP_400_BAD_REQUEST
+                )
+
+            try:
+                # only now is the file it replaces overwritten
+                etag = File.complete_upload(request.user, upload_file.name, upload_file)
+                File.record_upload(
+                    request.user,
+                    upload_file.name,
+                    resource,
+                    resource_id,
+                    upload_file.location,
+                    etag,
+                    upload_file.checksum,
+                    upload_file.size,
+                )
             except ValueError as e:
                 return Response({"message": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
             return Response({"message": "File uploaded successfully"})
         else:
+            # the multipart uploads were started while parsing, abort them
+            for upload_file in request.FILES.values():
+                if isinstance(upload_file, S3UploadedFile):
+                    upload_file.discard()
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
 class FileView(APIView):
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [TenantJWTAuthentication]
     permission_classes = [IsAuthenticated]
 
     def get(self, request, resource, resourceId):
         # get user from session
         user = request.user
 
-        files = File.objects.filter(
-            Q(tenant=user) | Q(is_public=True),
+        files = File.objects.visible_to(user).filter(
             resource=resource,
             resource_id=resourceId,
-            delete_flg=False,
-            expire_at__gte=timezone.now(),
         )
 
         returned_fields = [
+            "id",
             "tenant_username",
             "resource",
             "resource_id",
@@ -62,12 +192,14 @@ class FileView(APIView):
             "location",
             "expire_at",
             "is_public",
+            "etag",
+            "checksum",
+            "size",
             "url",
         ]
         data = paginate_files(request, files, returned_fields)
         return Response(data)
 
-    @transaction.atomic
     def delete(self, request, resource, resourceId):
         # get user from session
         user = request.user
@@ -78,26 +210,24 @@ class FileView(APIView):
             resource_id=resourceId,
             delete_flg=False,
         )
+        # their cached copies go with them, the locations are only read with a cache
+        locations = list(files.values_list("location", flat=True)) if get_file_cache() else []
 
-        for file in files:
-            file.delete_flg = True
-            file.save()
+        # one UPDATE, the objects are removed from the storage later by gc_files
+        files.update(delete_flg=True)
+        invalidate_cached_files(locations)
 
         return Response({"message": "File deleted successfully"})
 
 
 class ListFilesView(APIView):
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [TenantJWTAuthentication]
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
         # get user from session
         user = request.user
-        files = File.objects.filter(
-            Q(tenant=user) | Q(is_public=True),
-            delete_flg=False,
-            expire_at__gte=timezone.now(),
-        )
+        files = File.objects.visible_to(user)
 
         tenant_username = request.GET.get("tenant_username", None)
         if tenant_username is not None:
@@ -112,6 +242,7 @@ class ListFilesView(APIView):
             files = files.filter(resource_id=resource_id)
 
         returned_fields = [
+            "id",
             "tenant_username",
             "resource",
             "resource_id",
@@ -119,6 +250,263 @@ class ListFilesView(APIView):
             "location",
             "expire_at",
             "is_public",
+            "etag",
+            "checksum",
+            "size",
         ]
         data = paginate_files(request, files, returned_fields)
         return Response(data)
+
+
+class PresignUploadView(APIView):
+    authentication_classes = [TenantJWTAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        serializer = FileInfoSerializer(data=request.data)
+        if serializer.is_valid():
+            try:
+                presigned_post = File.presign_upload(
+                    request.user, serializer.validated_data["name"]
+                )
+            except ValueError as e:
+                return Response({"message": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+            return Response(
+                {
+                    "url": presigned_post["url"],
+                    "fields": presigned_post["fields"],
+                    # sent back to /upload/confirm
+                    "key": presigned_post["fields"]["key"],
+                    "max_file_size": settings.MAX_DIRECT_UPLOAD_SIZE,
+                    "expires_in": settings.AWS_S3_PRESIGNED_POST_EXPIRE,
+                }
+            )
+        else:
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+class RefreshUploadView(APIView):
+    """
+    Keeps a file one more day when its content has the given checksum, so a client
+    can skip the upload of an unchanged file. 412 tells it to upload the file.
+    """
+
+    authentication_classes = [TenantJWTAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        serializer = RefreshUploadSerializer(data=request.data)
+        if serializer.is_valid():
+            name = serializer.validated_data["name"]
+            resource = serializer.validated_data["resource"]
+            resource_id = serializer.validated_data["resource_id"]
+            checksum = serializer.validated_data["checksum"].lower()
+
+            if File.refresh(request.user, name, resource, resource_id, checksum):
+                return Response({"message": "File is unchanged"})
+
+            files = File.objects.live().filter(
+                tenant=request.user, name=name, resource=resource, resource_id=resource_id
+            )
+            if not files.exists():
+                return Response(
+                    {"message": "File not found"}, status=status.HTTP_404_NOT_FOUND
+                )
+            return Response(
+                {"message": "File has changed"}, status=status.HTTP_412_PRECONDITION_FAILED
+            )
+        else:
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+class ConfirmUploadView(APIView):
+    authentication_classes = [TenantJWTAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        serializer = ConfirmUploadSerializer(data=request.data)
+        if serializer.is_valid():
+            try:
+                File.confirm_upload(
+                    request.user,
+                    serializer.validated_data["name"],
+                    serializer.validated_data["resource"],
+                    serializer.validated_data["resource_id"],
+                    serializer.validated_data["key"],
+                    size=serializer.validated_data.get("size"),
+                    checksum=serializer.validated_data.get("checksum"),
+                )
+            except ValueError as e:
+                return Response({"message": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+            return Response({"message": "File uploaded successfully"})
+        else:
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+class UploadSessionView(APIView):
+    authentication_classes = [TenantJWTAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        serializer = FileInfoSerializer(data=request.data)
+        if serializer.is_valid():
+            try:
+                session = UploadSession.start(
+                    request.user,
+                    serializer.validated_data["name"],
+                    serializer.validated_data["resource"],
+                    serializer.validated_data["resource_id"],
+                )
+            except ValueError as e:
+                return Response({"message": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+            return Response(
+                {
+                    "session_id": session.id,
+                    "max_part_size": settings.MAX_UPLOAD_PART_SIZE,
+                    "max_parts": settings.MAX_UPLOAD_PARTS,
+                },
+                status=status.HTTP_201_CREATED,
+            )
+        else:
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+def get_upload_session(user, session_id):
+    return UploadSession.objects.filter(tenant=user, id=session_id).first()
+
+
+def upload_session_not_found():
+    return Response({"message": "Upload session not found"}, status=status.HTTP_404_NOT_FOUND)
+
+
+class UploadSessionDetailView(APIView):
+    authentication_classes = [TenantJWTAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, sessionId):
+        session = get_upload_session(request.user, sessionId)
+        if session is None:
+            return upload_session_not_found()
+
+        # lets a client resume by re-sending only the parts that are missing
+        parts = session.parts.order_by("part_number").values("part_number", "size", "etag")
+        return Response(
+            {
+                "session_id": session.id,
+                "name": session.name,
+                "resource": session.resource,
+                "resource_id": session.resource_id,
+                "status": session.status,
+                "parts": list(parts),
+            }
+        )
+
+    def delete(self, request, sessionId):
+        session = get_upload_session(request.user, sessionId)
+        if session is None:
+            return upload_session_not_found()
+
+        try:
+            session.abort()
+        except ValueError as e:
+            return Response({"message": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({"message": "Upload session aborted successfully"})
+
+
+class UploadSessionPartView(UploadLeaseMixin, APIView):
+    authentication_classes = [TenantJWTAuthentication]
+    permission_classes = [IsAuthenticated]
+    throttle_classes = UPLOAD_THROTTLES
+
+    def put(self, request, sessionId, partNumber):
+        session = get_upload_session(request.user, sessionId)
+        if session is None:
+            return upload_session_not_found()
+
+        content_length = int(request.META.get("CONTENT_LENGTH") or 0)
+        if content_length == 0:
+            return Response({"message": "Empty part"}, status=status.HTTP_400_BAD_REQUEST)
+
+        if content_length > settings.MAX_UPLOAD_PART_SIZE:
+            return Response(
+                {
+                    "message": "Part size exceeds the maximum allowed size of "
+                    f"{settings.MAX_UPLOAD_PART_SIZE} bytes"
+                },
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        # the raw body is read directly, it never goes through the parsers
+        body = request.read(content_length)
+
+        try:
+            session.upload_part(partNumber, body)
+        except ValueError as e:
+            return Response({"message": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({"message": "Part uploaded successfully"})
+
+
+class UploadSessionCompleteView(APIView):
+    authentication_classes = [TenantJWTAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, sessionId):
+        session = get_upload_session(request.user, sessionId)
+        if session is None:
+            return upload_session_not_found()
+
+        try:
+            session.complete()
+        except ValueError as e:
+            return Response({"message": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({"message": "File uploaded successfully"})
+
+
+class StorageDownloadView(APIView):
+    """
+    Sends a file of the local or the memory storage engine, the URLs their get_urls
+    return. A file of the local storage is sent with sendfile by the WSGI server.
+    Range and conditional requests are handled like DownloadView's.
+    """
+
+    # the signature in the URL authorizes the download, like a presigned S3 URL
+    authentication_classes = []
+    permission_classes = [AllowAny]
+
+    def get(self, request, location):
+        try:
+            check_signed_url(location, request.GET.get("signature", ""))
+        except StorageError:
+            return Response(
+                {"message": "Invalid or expired signature"}, status=status.HTTP_403_FORBIDDEN
+            )
+
+        return serve_file(request, location, posixpath.basename(location))
+
+
+class DownloadView(APIView):
+    """
+    Streams one file the user can see, its own or a public one, without a presigned
+    URL. Supports Range and If-None-Match, see download_utils.serve_file.
+    """
+
+    authentication_classes = [TenantJWTAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, fileId):
+        file = (
+            File.objects.visible_to(request.user)
+            .filter(id=fileId)
+            .only("name", "location", "etag")
+            .first()
+        )
+        if file is None:
+            return Response({"message": "File not found"}, status=status.HTTP_404_NOT_FOUND)
+
+        return serve_file(request, file.location, file.name, file.etag)
@@ -0,0 +1,15 @@
+from django.apps import AppConfig
+from django.conf import settings
+from django.db.backends.signals import connection_created
+
+
+class MetricsConfig(AppConfig):
+    name = "mtfu.metrics"
+
+    def ready(self):
+        from mtfu.metrics.collectors import instrument_connection
+        from mtfu.metrics.profiler import is_profiling_enabled
+
+        # the profiler's query log comes from the same wrapper
+        if settings.METRICS_ENABLED or is_profiling_enabled():
+            connection_created.connect(instrument_connection)
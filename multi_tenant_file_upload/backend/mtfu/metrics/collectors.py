@@ -0,0 +1,197 @@
+"""
+The Prometheus metrics of the app, exposed on /metrics:
+
+- the latency of each endpoint and, per request, the database queries and the time
+  spent in them, in S3 calls and in presigning URLs, the rest is the view's own work
+  and the serialization
+- the latency and the outcome of each S3 operation, taken from botocore's event hooks,
+  and the connections of the S3 connection pools
+- the bytes of the files each tenant uploads
+- the lookups of the download cache, the bytes it saved and fetched, and its size
+
+Samples are aggregated in process. With PROMETHEUS_MULTIPROC_DIR set each worker process
+writes them to its own memory mapped files there, and a scrape sums up the files of all
+the workers, whichever worker answers it.
+"""
+import contextlib
+import contextvars
+import time
+
+from django.conf import settings
+from prometheus_client import Counter, Gauge, Histogram
+
+REQUEST_LATENCY = Histogram(
+    "mtfu_request_duration_seconds",
+    "Time to answer a request, by endpoint.",
+    ["endpoint", "method", "status"],
+)
+REQUEST_DB_QUERIES = Histogram(
+    "mtfu_request_db_queries",
+    "Database queries made by a request.",
+    ["endpoint"],
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100, float("inf")),
+)
+REQUEST_DB_TIME = Histogram(
+    "mtfu_request_db_duration_seconds",
+    "Time a request spends in database queries.",
+    ["endpoint"],
+)
+REQUEST_S3_TIME = Histogram(
+    "mtfu_request_s3_duration_seconds",
+    "Time a request spends in S3 calls.",
+    ["endpoint"],
+)
+REQUEST_PRESIGN_TIME = Histogram(
+    "mtfu_request_presign_duration_seconds",
+    "Time a request spends presigning download URLs.",
+    ["endpoint"],
+)
+S3_LATENCY = Histogram(
+    "mtfu_s3_request_duration_seconds",
+    "Time of an S3 call, retries included.",
+    ["operation"],
+)
+S3_REQUESTS = Counter(
+    "mtfu_s3_requests",
+    "S3 calls by HTTP status, error when no response came back.",
+    ["operation", "status"],
+)
+UPLOAD_BYTES = Counter(
+    "mtfu_upload_bytes",
+    "Bytes of the files uploaded by each tenant.",
+    ["tenant"],
+)
+S3_POOL_MAX_CONNECTIONS = Gauge(
+    "mtfu_s3_pool_max_connections",
+    "Connections the S3 connection pools may keep, summed up over the live workers.",
+    multiprocess_mode="livesum",
+)
+S3_POOL_CONNECTIONS = Gauge(
+    "mtfu_s3_pool_connections_opened",
+    "Connections the S3 connection pools have opened, summed up over the live workers.",
+    multiprocess_mode="livesum",
+)
+S3_POOL_IDLE_CONNECTIONS = Gauge(
+    "mtfu_s3_pool_idle_connections",
+    "Idle connections of the S3 connection pools, summed up over the live workers.",
+    multiprocess_mode="livesum",
+)
+DOWNLOAD_CACHE_LOOKUPS = Counter(
+    "mtfu_download_cache_lookups",
+    "Lookups of the download cache, by result: hit or miss.",
+    ["result"],
+)
+DOWNLOAD_CACHE_BYTES = Counter(
+    "mtfu_download_cache_bytes",
+    "Bytes sent from the download cache (saved) and copied into it (fetched).",
+    ["kind"],
+)
+DOWNLOAD_CACHE_EVICTIONS = Counter(
+    "mtfu_download_cache_evictions",
+    "Entries evicted from the download cache.",
+)
+DOWNLOAD_CACHE_SIZE = Gauge(
+    "mtfu_download_cache_size_bytes",
+    "Bytes kept in the download cache, summed up over the live workers.",
+    multiprocess_mode="livesum",
+)
+
+
+class RequestStats:
+    """What a request spent, the queries and S3 calls add to it from any thread."""
+
+    __slots__ = ("db_queries", "db_seconds", "s3_seconds", "presign_seconds", "queries")
+
+    def __init__(self):
+        self.db_queries = 0
+        self.db_seconds = 0.0
+        self.s3_seconds = 0.0
+        self.presign_seconds = 0.0
+        # the (seconds, sql, params) of each query, only for a profiled request
+        self.queries = None
+
+    def observe(self, endpoint):
+        REQUEST_DB_QUERIES.labels(endpoint).observe(self.db_queries)
+        REQUEST_DB_TIME.labels(endpoint).observe(self.db_seconds)
+        REQUEST_S3_TIME.labels(endpoint).observe(self.s3_seconds)
+        REQUEST_PRESIGN_TIME.labels(endpoint).observe(self.presign_seconds)
+
+
+# set by MetricsMiddleware, sync_to_async and run_s3 carry it to their threads
+REQUEST_STATS = contextvars.ContextVar("request_stats", default=None)
+
+
+def instrument_connection(sender, connection, **kwargs):
+    """connection_created receiver, times the queries of every database connection."""
+    connection.execute_wrappers.append(time_query)
+
+
+def time_query(execute, sql, params, many, context):
+    stats = REQUEST_STATS.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        seconds = time.perf_counter() - started
+        stats.db_queries += 1
+        stats.db_seconds += seconds
+        if stats.queries is not None:
+            stats.queries.append((seconds, sql, params))
+
+
+def instrument_s3_client(client):
+    """Times every call of client, the context dict of a call is shared by its events."""
+    if not settings.METRICS_ENABLED:
+        return
+    events = client.meta.events
+    events.register("before-call.s3", _start_s3_call)
+    events.register("after-call.s3", _end_s3_call)
+    events.register("after-call-error.s3", _end_s3_call)
+
+
+def _start_s3_call(context, **kwargs):
+    context["metrics_started"] = time.perf_counter()
+
+
+def _end_s3_call(event_name, context, http_response=None, **kwargs):
+    started = context.pop("metrics_started", None)
+    if started is None:
+        return
+    seconds = time.perf_counter() - started
+    # after-call.s3.PutObject
+    operation = event_name.rsplit(".", 1)[-1]
+    status = http_response.status_code if http_response is not None else "error"
+
+    S3_LATENCY.labels(operation).observe(seconds)
+    S3_REQUESTS.labels(operation, status).inc()
+    stats = REQUEST_STATS.get()
+    if stats is not None:
+        stats.s3_seconds += seconds
+
+
+def observe_s3_pools(clients_stats):
+    """Sets the pool gauges from the S3ClientRegistry.stats() of each client."""
+    clients_stats = list(clients_stats)
+    pools = [pool for stats in clients_stats for pool in stats["pools"]]
+    S3_POOL_MAX_CONNECTIONS.set(sum(stats["max_pool_connections"] for stats in clients_stats))
+    S3_POOL_CONNECTIONS.set(sum(pool["connections_opened"] for pool in pools))
+    S3_POOL_IDLE_CONNECTIONS.set(sum(pool["idle_connections"] for pool in pools))
+
+
+@contextlib.contextmanager
+def time_presign():
+    stats = REQUEST_STATS.get()
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        if stats is not None:
+            stats.presign_seconds += time.perf_counter() - started
+
+
+def count_upload_bytes(user, size):
+    if settings.METRICS_ENABLED and size:
+        UPLOAD_BYTES.labels(user.username).inc(size)
@@ -0,0 +1,132 @@
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from mtfu.metrics.collectors import REQUEST_LATENCY, REQUEST_STATS, RequestStats
+from mtfu.metrics.profiler import (
+    StackSampler,
+    is_profiling_enabled,
+    save_profile,
+    should_profile,
+)
+
+
+class MetricsMiddleware:
+    """
+    Observes the latency of each request and what it spent in the database, in S3 and
+    in presigning, labeled by the name of its URL pattern. Works for sync and async views.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        stats = RequestStats()
+        token = REQUEST_STATS.set(stats)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            REQUEST_STATS.reset(token)
+        observe(request, response, stats, time.perf_counter() - started)
+        return response
+
+    async def __acall__(self, request):
+        stats = RequestStats()
+        token = REQUEST_STATS.set(stats)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            REQUEST_STATS.reset(token)
+        observe(request, response, stats, time.perf_counter() - started)
+        return response
+
+
+def observe(request, response, stats, seconds):
+    # the URL pattern's name keeps the label values few, unlike the paths
+    endpoint = request.resolver_match.view_name if request.resolver_match else "unmatched"
+    REQUEST_LATENCY.labels(endpoint, request.method, response.status_code).observe(seconds)
+    stats.observe(endpoint)
+
+
+class ProfilingMiddleware:
+    """
+    Profiles the requests sending "X-Profile: <PROFILING_TOKEN>" and a random
+    PROFILING_SAMPLE_RATE of the others: their stacks are sampled while the rest of
+    the pipeline runs, authentication, queries, pagination and serialization included,
+    and written with their queries to PROFILING_DIR. The response's X-Profile-Id header
+    names the files. Not loaded at all when neither setting is set.
+
+    An async request runs on several threads, all the threads are sampled then.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not is_profiling_enabled():
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not should_profile(request):
+            return self.get_response(request)
+
+        stats, token = start_query_log()
+        sampler = StackSampler(threading.get_ident(), settings.PROFILING_INTERVAL).start()
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            sampler.stop()
+            if token is not None:
+                REQUEST_STATS.reset(token)
+        return add_profile(request, response, sampler, stats, time.perf_counter() - started)
+
+    async def __acall__(self, request):
+        if not should_profile(request):
+            return await self.get_response(request)
+
+        stats, token = start_query_log()
+        sampler = StackSampler(None, settings.PROFILING_INTERVAL).start()
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            sampler.stop()
+            if token is not None:
+                REQUEST_STATS.reset(token)
+        return add_profile(request, response, sampler, stats, time.perf_counter() - started)
+
+
+def start_query_log():
+    # the stats of MetricsMiddleware when it runs, they log the queries too
+    stats, token = REQUEST_STATS.get(), None
+    if stats is None:
+        stats = RequestStats()
+        token = REQUEST_STATS.set(stats)
+    stats.queries = []
+    return stats, token
+
+
+def add_profile(request, response, sampler, stats, seconds):
+    response["X-Profile-Id"] = save_profile(request, response, sampler, stats.queries, seconds)
+    stats.queries = None
+    return response
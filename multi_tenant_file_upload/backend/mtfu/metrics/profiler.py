@@ -0,0 +1,123 @@
+"""
+A sampling profiler for single requests, see ProfilingMiddleware.
+
+A thread takes the stacks of the profiled thread every PROFILING_INTERVAL seconds.
+They are written in the collapsed format, one "root;...;leaf count" line per distinct
+stack, which flamegraph.pl, speedscope or inferno turn into a flame graph. The queries
+of the request are written to a log next to them.
+"""
+import collections
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.utils.crypto import constant_time_compare
+
+
+def is_profiling_enabled():
+    return bool(settings.PROFILING_TOKEN or settings.PROFILING_SAMPLE_RATE)
+
+
+def should_profile(request):
+    """A request is profiled when it sends the X-Profile token, or at random."""
+    token = request.headers.get("X-Profile")
+    if token is not None and settings.PROFILING_TOKEN:
+        return constant_time_compare(token, settings.PROFILING_TOKEN)
+    return random.random() < settings.PROFILING_SAMPLE_RATE
+
+
+class StackSampler:
+    """Samples the stacks of the thread thread_id, or of every thread when it is None."""
+
+    def __init__(self, thread_id=None, interval=0.005):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = collections.Counter()
+        self.samples = 0
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stopped.wait(self.interval):
+            frames = sys._current_frames()
+            if self.thread_id is not None:
+                frames = {self.thread_id: frames.get(self.thread_id)}
+
+            self.samples += 1
+            for thread_id, frame in frames.items():
+                if thread_id != own_id and frame is not None:
+                    self.stacks[get_stack(thread_id, frame, self.thread_id is None)] += 1
+
+    def collapsed(self):
+        """The samples in the collapsed stack format, the most frequent stacks first."""
+        return "".join(
+            f"{';'.join(stack)} {count}\n" for stack, count in self.stacks.most_common()
+        )
+
+
+def get_stack(thread_id, frame, with_thread_name):
+    stack = []
+    while frame is not None:
+        code = frame.f_code
+        stack.append(
+            f"{code.co_qualname} ({get_short_path(code.co_filename)}:{code.co_firstlineno})"
+        )
+        frame = frame.f_back
+    if with_thread_name:
+        stack.append(get_thread_name(thread_id))
+    stack.reverse()
+    return tuple(stack)
+
+
+def get_short_path(filename):
+    # site-packages/rest_framework/views.py, mtfu/file_manager/views.py
+    for prefix in ("site-packages" + os.sep, str(settings.BASE_DIR) + os.sep):
+        _, found, path = filename.rpartition(prefix)
+        if found:
+            return path
+    return filename
+
+
+def get_thread_name(thread_id):
+    thread = threading._active.get(thread_id)
+    return f"thread {thread.name if thread is not None else thread_id}"
+
+
+def format_queries(queries):
+    return "".join(
+        f"{seconds * 1000:9.2f} ms  {sql}  {params!r}\n" for seconds, sql, params in queries
+    )
+
+
+def save_profile(request, response, sampler, queries, seconds):
+    """Writes the stacks and the query log of a request, returns the id of the profile."""
+    profile_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}"
+    os.makedirs(settings.PROFILING_DIR, exist_ok=True)
+    path = os.path.join(settings.PROFILING_DIR, profile_id)
+
+    with open(f"{path}.collapsed", "w", encoding="utf8") as file:
+        file.write(sampler.collapsed())
+
+    query_seconds = sum(query[0] for query in queries)
+    with open(f"{path}.queries.log", "w", encoding="utf8") as file:
+        file.write(
+            f"# {request.method} {request.get_full_path()} {response.status_code} "
+            f"in {seconds * 1000:.2f} ms, {len(queries)} queries in "
+            f"{query_seconds * 1000:.2f} ms, {sampler.samples} samples\n"
+        )
+        file.write(format_queries(queries))
+
+    return profile_id
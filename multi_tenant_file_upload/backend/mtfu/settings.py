@@ -64,13 +64,15 @@ INSTALLED_APPS = [
     "corsheaders",
     "mtfu.auth_user",
     "mtfu.file_manager",
+    "mtfu.metrics",
 ]
 
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        "mtfu.auth_user.authentication.TenantJWTAuthentication",
     ),
     "DEFAULT_PERMISSION_CLASSES": ("rest_framework.permissions.IsAuthenticated",),
+    "DEFAULT_THROTTLE_CLASSES": ("mtfu.auth_user.throttling.TenantRequestThrottle",),
 }
 
 # JWT settings
@@ -82,6 +84,9 @@ SIMPLE_JWT = {
 }
 
 MIDDLEWARE = [
+    # first, to time the whole request
+    "mtfu.metrics.middleware.MetricsMiddleware",
+    "mtfu.metrics.middleware.ProfilingMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -176,6 +181,18 @@ STATIC_URL = "static/"
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    "presigned_urls": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "presigned_urls",
+        "OPTIONS": {"MAX_ENTRIES": 100000},
+    },
+}
+PRESIGNED_URLS_CACHE = "presigned_urls"
+
 LOGGING = {
     "version": 1,
     "disable_existing_loggers": False,
@@ -197,6 +214,8 @@ AWS_SECRET_ACCESS_KEY = os.getenv("AWS_SECRET_ACCESS_KEY")
 AWS_STORAGE_BUCKET_NAME = os.getenv("AWS_STORAGE_BUCKET_NAME")
 AWS_S3_CUSTOM_DOMAIN = "%s.s3.amazonaws.com" % AWS_STORAGE_BUCKET_NAME
 AWS_S3_REGION_NAME = os.getenv("AWS_S3_REGION_NAME")
+# an S3 compatible endpoint instead of AWS, e.g. a local stand-in
+AWS_S3_ENDPOINT_URL = os.getenv("AWS_S3_ENDPOINT_URL") or None
 AWS_S3_OBJECT_PARAMETERS = {
     "CacheControl": "max-age=86400",
 }
@@ -204,6 +223,8 @@ AWS_QUERYSTRING_AUTH = False
 AWS_DEFAULT_ACL = None
 AWS_S3_FILE_OVERWRITE = False
 AWS_S3_PRESIGNED_URLS_EXPIRE = 3600
+# a cached presigned URL is signed again once less than this many seconds are left
+AWS_S3_PRESIGNED_URLS_MIN_TTL = 900
 
 AWS_LOCATION = "static"
 STATIC_URL = "https://%s/%s/" % (AWS_S3_CUSTOM_DOMAIN, AWS_LOCATION)
@@ -218,3 +239,97 @@ STORAGES = {
 }
 
 MAX_FILE_SIZE = 1024 * 1024 * 10  # 10MB
+
+# resumable uploads backed by S3 multipart upload
+MAX_UPLOAD_SESSION_FILE_SIZE = 1024 * 1024 * 1024 * 5  # 5GB
+MAX_UPLOAD_PART_SIZE = 1024 * 1024 * 16  # 16MB, every part but the last must be >= 5MB
+MAX_UPLOAD_PARTS = 10000
+
+# direct-to-S3 uploads with a presigned POST policy
+MAX_DIRECT_UPLOAD_SIZE = 1024 * 1024 * 1024 * 5  # 5GB, the most a single POST can carry
+AWS_S3_PRESIGNED_POST_EXPIRE = 900
+
+# uploads streamed into S3 while the request is parsed
+MAX_STREAMING_FILE_SIZE = 1024 * 1024 * 1024 * 5  # 5GB
+S3_STREAMING_PART_SIZE = 1024 * 1024 * 8  # 8MB, the memory held per streaming upload
+# they are streamed under this folder first and moved in place once they are accepted
+UPLOAD_STAGING_FOLDER = "staging"
+
+# several files uploaded for one resource in a single request
+MAX_BATCH_UPLOAD_FILES = 200
+BATCH_UPLOAD_MAX_WORKERS = 8
+DATA_UPLOAD_MAX_NUMBER_FILES = MAX_BATCH_UPLOAD_FILES
+# the default handlers, hashing the files while they are received
+FILE_UPLOAD_HANDLERS = [
+    "mtfu.file_manager.upload_handlers.HashingMemoryFileUploadHandler",
+    "mtfu.file_manager.upload_handlers.HashingTemporaryFileUploadHandler",
+]
+
+# garbage collection of the soft deleted files
+FILE_GC_CHUNK_SIZE = 5000
+FILE_GC_MAX_WORKERS = 8
+
+# async upload, retrieve and list views, served by uvicorn through mtfu.asgi
+ASYNC_VIEWS = get_bool_from_env("ASYNC_VIEWS", False)
+ASYNC_S3_MAX_WORKERS = 64  # blocking boto3 calls in flight per process
+
+# tenants cached in each process by TenantJWTAuthentication, 0 loads them on every request
+TENANT_AUTH_CACHE_SIZE = 10000
+TENANT_AUTH_CACHE_TTL = 300
+
+# the S3 clients shared by the threads of a process, see s3_utils.S3ClientRegistry
+AWS_S3_MAX_POOL_CONNECTIONS = 64  # >= the threads calling S3 at once
+AWS_S3_CONNECT_TIMEOUT = 5
+AWS_S3_READ_TIMEOUT = 60
+AWS_S3_TCP_KEEPALIVE = True
+AWS_S3_MAX_ATTEMPTS = 3  # the first request included
+
+# where the files are kept: "s3", "local" or "memory", see file_manager/storage.py
+STORAGE_ENGINE = os.getenv("STORAGE_ENGINE", "s3")
+LOCAL_STORAGE_ROOT = os.getenv("LOCAL_STORAGE_ROOT", str(BASE_DIR / "storage"))
+MEMORY_STORAGE_LATENCY = float(os.getenv("MEMORY_STORAGE_LATENCY", 0))  # seconds per call
+
+# GET /api/download/<id>, streamed DOWNLOAD_CHUNK_SIZE bytes at a time
+DOWNLOAD_CHUNK_SIZE = 1024 * 64
+# the files' url is their download endpoint instead of a presigned URL, nothing is signed
+DOWNLOAD_URLS = get_bool_from_env("DOWNLOAD_URLS", False)
+# e.g. /protected/, the front proxy serves <prefix><location> from an internal location
+DOWNLOAD_ACCEL_REDIRECT = os.getenv("DOWNLOAD_ACCEL_REDIRECT") or None
+# downloads read through a cache on the local disk, see file_manager/file_cache.py
+DOWNLOAD_CACHE_DIR = os.getenv("DOWNLOAD_CACHE_DIR", str(BASE_DIR / "download_cache"))
+DOWNLOAD_CACHE_SIZE = int(os.getenv("DOWNLOAD_CACHE_SIZE", 0))  # bytes per node, 0 disables
+# the workers sharing DOWNLOAD_CACHE_DIR, each keeps its share of the size, gunicorn
+# starts WEB_CONCURRENCY workers
+DOWNLOAD_CACHE_WORKERS = int(
+    os.getenv("DOWNLOAD_CACHE_WORKERS", os.getenv("WEB_CONCURRENCY", 1))
+)
+DOWNLOAD_CACHE_MAX_FILE_SIZE = MAX_FILE_SIZE
+
+# content-addressed uploads: each content is stored once per tenant under BLOB_FOLDER
+DEDUP_UPLOADS = get_bool_from_env("DEDUP_UPLOADS", False)
+BLOB_FOLDER = "blobs"
+
+# bulk tenant import, see batch/init_data_impl.py
+TENANT_IMPORT_CHUNK_SIZE = 1000
+TENANT_IMPORT_PROCESSES = os.cpu_count() or 1  # password hashing
+TENANT_IMPORT_MAX_WORKERS = 32  # folder markers written at once
+
+# Prometheus metrics on /metrics, see metrics/collectors.py
+METRICS_ENABLED = get_bool_from_env("METRICS_ENABLED", True)
+# scrapes must send "Authorization: Bearer <METRICS_TOKEN>", /metrics is a 404 without it
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN")
+
+# opt-in request profiling, see metrics/profiler.py
+PROFILING_TOKEN = os.environ.get("PROFILING_TOKEN")  # profiles requests with this X-Profile
+PROFILING_SAMPLE_RATE = float(os.environ.get("PROFILING_SAMPLE_RATE", 0))
+PROFILING_DIR = os.getenv("PROFILING_DIR", str(BASE_DIR / "profiles"))
+PROFILING_INTERVAL = 0.005  # seconds between two samples of the stacks
+
+# per tenant admission control, see auth_user/throttling.py, 0 turns a limit off
+TENANT_REQUEST_RATE = float(os.environ.get("TENANT_REQUEST_RATE", 0))  # requests/s
+TENANT_REQUEST_BURST = int(os.environ.get("TENANT_REQUEST_BURST", 50))
+TENANT_UPLOAD_BYTES_RATE = float(os.environ.get("TENANT_UPLOAD_BYTES_RATE", 0))  # bytes/s
+TENANT_UPLOAD_BYTES_BURST = int(os.environ.get("TENANT_UPLOAD_BYTES_BURST", MAX_FILE_SIZE))
+TENANT_MAX_CONCURRENT_UPLOADS = int(os.environ.get("TENANT_MAX_CONCURRENT_UPLOADS", 0))
+UPLOAD_LEASE_TTL = 600  # seconds a lease counts when its worker died
+UPLOAD_LEASE_RETRY_AFTER = 1  # seconds
@@ -0,0 +1,193 @@
+import asyncio
+
+import pytest
+
+from asgiref.sync import async_to_sync
+from django.http.multipartparser import MultiPartParser
+from django.test import AsyncClient
+from django.urls import path
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.views import TokenObtainPairView
+from mtfu.auth_user.models import UploadLease
+from mtfu.file_manager.async_views import AsyncUploadView, AsyncFileView, AsyncListFilesView
+from mtfu.file_manager.models import Blob, File
+from mtfu.file_manager.views import FileView, ListFilesView, StorageDownloadView
+from mtfu.tests.utils import get_content_from_response, get_object_content, upload
+
+# the URLs of ASYNC_VIEWS=True, with the sync views under sync/ to compare them
+urlpatterns = [
+    path("api/token/", TokenObtainPairView.as_view()),
+    path("api/upload", AsyncUploadView.as_view()),
+    path("api/files/<str:resource>/<str:resourceId>", AsyncFileView.as_view()),
+    path("api/list_files", AsyncListFilesView.as_view()),
+    path("api/sync/files/<str:resource>/<str:resourceId>", FileView.as_view()),
+    path("api/sync/list_files", ListFilesView.as_view()),
+    path(
+        "api/storage/<path:location>",
+        StorageDownloadView.as_view(),
+        name="mtfu.storage_download",
+    ),
+]
+
+pytestmark = pytest.mark.urls(__name__)
+
+
+def test_async_upload_and_retrieve(john_client, tmp_path):
+    upload(john_client, tmp_path, "async_file.txt")
+    assert get_object_content("asset_imgs/john/async_file.txt") == b"async_file.txt content"
+
+    response = john_client.get("/api/files/product/1")
+    assert response.status_code == 200
+    assert response.json() == john_client.get("/api/sync/files/product/1").json()
+    assert [file["name"] for file in response.json()["files"]] == ["async_file.txt"]
+
+
+def test_async_upload_through_asgi(john_client, tmp_path):
+    file_path = tmp_path / "async_asgi_file.txt"
+    file_path.write_text("asgi content")
+    headers = {"Authorization": john_client._credentials["HTTP_AUTHORIZATION"]}
+
+    async def post():
+        with open(file_path, "rb") as file:
+            return await AsyncClient().post(
+                "/api/upload",
+                {"file": file, "resource": "product", "resource_id": 2},
+                headers=headers,
+            )
+
+    response = async_to_sync(post)()
+    assert response.status_code == 200
+    assert get_object_content("asset_imgs/john/async_asgi_file.txt") == b"asgi content"
+    assert File.objects.filter(name="async_asgi_file.txt", resource_id="2").exists()
+
+
+def test_async_upload_is_parsed_off_the_event_loop(john_client, tmp_path, monkeypatch):
+    parse = MultiPartParser.parse
+    on_event_loop = []
+
+    def checked_parse(self):
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            on_event_loop.append(False)
+        else:
+            on_event_loop.append(True)
+        return parse(self)
+
+    monkeypatch.setattr(MultiPartParser, "parse", checked_parse)
+    file_path = tmp_path / "async_parsed_file.txt"
+    file_path.write_text("parsed content")
+    headers = {"Authorization": john_client._credentials["HTTP_AUTHORIZATION"]}
+
+    async def post():
+        with open(file_path, "rb") as file:
+            return await AsyncClient().post(
+                "/api/upload",
+                {"file": file, "resource": "product", "resource_id": 1},
+                headers=headers,
+            )
+
+    assert async_to_sync(post)().status_code == 200
+    assert on_event_loop == [False]
+
+
+def test_async_upload_deduplicated(john_client, tmp_path, settings):
+    settings.DEDUP_UPLOADS = True
+    upload(john_client, tmp_path, "async_dedup_file.txt", resource_id=1)
+    upload(john_client, tmp_path, "async_dedup_file.txt", resource_id=2)
+
+    blob = Blob.objects.get()
+    assert blob.ref_count == 2
+    assert get_object_content(blob.location) == b"async_dedup_file.txt content"
+    assert set(File.objects.values_list("location", flat=True)) == {blob.location}
+
+
+def test_async_conditional_upload(john_client, tmp_path):
+    upload(john_client, tmp_path, "async_conditional.txt")
+
+    # the same content again, nothing is stored
+    response = upload(john_client, tmp_path, "async_conditional.txt")
+    assert get_content_from_response(response) == {"message": "File is unchanged"}
+
+    file_path = tmp_path / "async_conditional.txt"
+    with open(file_path, "rb") as file:
+        response = john_client.post(
+            "/api/upload",
+            {"file": file, "resource": "product", "resource_id": 1},
+            HTTP_IF_NONE_MATCH="*",
+        )
+    assert response.status_code == 412
+
+
+def test_async_upload_without_file(john_client):
+    response = john_client.post("/api/upload", {"resource": "product", "resource_id": 1})
+    assert response.status_code == 400
+    content = get_content_from_response(response)
+    assert content["file"] == ["No file was submitted."]
+
+
+@pytest.mark.parametrize(
+    "params",
+    [
+        {},
+        {"page": 2, "page_size": 2},
+        {"count": "none", "page_size": 2},
+        {"count": "estimated"},
+        {"pagination": "cursor", "page_size": 2},
+        {"tenant_username": "jimmy"},
+    ],
+)
+def test_async_list_files_matches_sync(john_client, jimmy_client, tmp_path, params):
+    for i in range(3):
+        upload(john_client, tmp_path, f"async_list_{i}.txt")
+    upload(jimmy_client, tmp_path, "async_list_jimmy.txt")
+    File.objects.filter(name="async_list_jimmy.txt").update(is_public=True)
+
+    response = john_client.get("/api/list_files", params)
+    assert response.status_code == 200
+    assert response.json() == john_client.get("/api/sync/list_files", params).json()
+
+
+def test_async_list_files_invalid_page_size(john_client):
+    response = john_client.get("/api/list_files", {"count": "none", "page_size": "many"})
+    assert response.status_code == 400
+    assert response.json() == {"page_size": ["Invalid page size"]}
+
+
+def test_async_delete_files(john_client, tmp_path):
+    upload(john_client, tmp_path, "async_deleted.txt")
+
+    response = john_client.delete("/api/files/product/1")
+    assert response.status_code == 200
+    assert File.objects.get(name="async_deleted.txt").delete_flg
+
+
+@pytest.mark.parametrize("authorization", [None, "Bearer invalid"])
+def test_async_views_require_authentication(authorization):
+    client = APIClient()
+    if authorization:
+        client.credentials(HTTP_AUTHORIZATION=authorization)
+
+    response = client.get("/api/list_files")
+    assert response.status_code == 401
+    assert response["WWW-Authenticate"] == 'Bearer realm="api"'
+    assert "detail" in response.json()
+
+
+def test_async_upload_throttled(john, john_client, tmp_path, settings):
+    settings.TENANT_MAX_CONCURRENT_UPLOADS = 1
+    lease_id = UploadLease.acquire(john, 1, ttl=600)
+
+    response = john_client.post("/api/upload", {"resource": "product", "resource_id": 1})
+    assert response.status_code == 429
+    assert response["Retry-After"] == "1"
+
+    UploadLease.release(lease_id)
+    settings.TENANT_REQUEST_RATE = 1
+    settings.TENANT_REQUEST_BURST = 1
+    assert upload(john_client, tmp_path, "async_throttled.txt").status_code == 200
+    assert not UploadLease.objects.exists()
+
+    response = john_client.get("/api/files/product/1")
+    assert response.status_code == 429
+    assert response["Retry-After"] == "1"
@@ -0,0 +1,99 @@
+import pytest
+
+from dateutil.relativedelta import relativedelta
+from django.utils import timezone
+from rest_framework.test import APIClient
+from mtfu.auth_user.authentication import TenantCache, TENANT_CACHE
+from mtfu.auth_user.models import Tenant
+from mtfu.file_manager.models import File
+
+
+@pytest.fixture(autouse=True)
+def john_file(john):
+    # an empty page is served without querying the files
+    File.objects.create(
+        tenant=john,
+        name="auth_file.txt",
+        location=File.get_location(john, "auth_file.txt"),
+        resource="product",
+        resource_id="1",
+        expire_at=timezone.now() + relativedelta(days=1),
+    )
+
+
+def test_tenant_is_loaded_once(john_client, django_assert_num_queries):
+    # authentication, the count and the page
+    with django_assert_num_queries(3):
+        john_client.get("/api/list_files")
+
+    # the count and the page
+    with django_assert_num_queries(2):
+        response = john_client.get("/api/list_files")
+    assert response.status_code == 200
+
+
+def test_cached_tenant_is_the_request_user(john, john_client):
+    john_client.get("/api/list_files")
+
+    tenant = TENANT_CACHE.get(john.id)
+    assert tenant == [john.id, "john"]
+
+    response = john_client.delete("/api/files/product/1")
+    assert response.status_code == 200
+
+
+def test_tenant_cache_disabled(john_client, settings, django_assert_num_queries):
+    settings.TENANT_AUTH_CACHE_SIZE = 0
+
+    john_client.get("/api/list_files")
+    with django_assert_num_queries(3):
+        john_client.get("/api/list_files")
+
+
+def test_deleted_tenant_is_not_authenticated(john, john_client):
+    john_client.get("/api/list_files")
+
+    Tenant.objects.get(id=john.id).delete()
+
+    response = john_client.get("/api/list_files")
+    assert response.status_code == 401
+    assert response.data["detail"].code == "user_not_found"
+
+
+def test_saved_tenant_is_reloaded(john, john_client, django_assert_num_queries):
+    john_client.get("/api/list_files")
+
+    john.username = "johnny"
+    john.save()
+    assert TENANT_CACHE.get(john.id) is None
+
+    with django_assert_num_queries(3):
+        john_client.get("/api/list_files")
+    assert TENANT_CACHE.get(john.id) == [john.id, "johnny"]
+
+
+def test_invalid_token_is_not_authenticated(john_client):
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION="Bearer invalid")
+
+    response = client.get("/api/list_files")
+    assert response.status_code == 401
+
+
+def test_tenant_cache_evicts_least_recently_used():
+    cache = TenantCache(size=2, ttl=60)
+    cache.set(1, [1, "a"])
+    cache.set(2, [2, "b"])
+    cache.get(1)
+    cache.set(3, [3, "c"])
+
+    assert cache.get(2) is None
+    assert cache.get(1) == [1, "a"]
+    assert cache.get(3) == [3, "c"]
+
+
+def test_tenant_cache_expires():
+    cache = TenantCache(size=2, ttl=-1)
+    cache.set(1, [1, "a"])
+
+    assert cache.get(1) is None
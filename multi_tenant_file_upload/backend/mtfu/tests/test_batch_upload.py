@@ -0,0 +1,104 @@
+import pytest
+
+from mtfu.file_manager.models import File
+from mtfu.tests.utils import get_content_from_response, get_object_content
+
+
+@pytest.fixture
+def batch_files(tmp_path):
+    files = []
+    for i in range(20):
+        file_path = tmp_path / f"batch_file_{i}.txt"
+        file_path.write_text(f"batch content {i}")
+        files.append(file_path)
+    return files
+
+
+def test_batch_upload(john_client, batch_files):
+    response = john_client.post(
+        "/api/upload/batch",
+        {
+            "files": [open(file_path, "rb") for file_path in batch_files],
+            "resource": "product",
+            "resource_id": 1,
+        },
+    )
+    assert response.status_code == 200
+    assert len(response.data["files"]) == 20
+    assert all(file["uploaded"] for file in response.data["files"])
+
+    assert File.objects.filter(resource="product", resource_id="1").count() == 20
+    assert get_object_content("asset_imgs/john/batch_file_7.txt") == b"batch content 7"
+
+    # uploading the same batch again updates the existing records
+    response = john_client.post(
+        "/api/upload/batch",
+        {
+            "files": [open(file_path, "rb") for file_path in batch_files],
+            "resource": "product",
+            "resource_id": 1,
+        },
+    )
+    assert response.status_code == 200
+    assert File.objects.filter(resource="product", resource_id="1").count() == 20
+
+
+def test_batch_upload_partial_failure(john_client, batch_files, tmp_path):
+    bigger_than_10mb_file = tmp_path / "bigger_than_10mb_file.txt"
+    bigger_than_10mb_file.write_text("a" * 1024 * 1024 * 11)
+
+    response = john_client.post(
+        "/api/upload/batch",
+        {
+            "files": [
+                open(batch_files[0], "rb"),
+                open(bigger_than_10mb_file, "rb"),
+                open(batch_files[0], "rb"),
+                open(batch_files[1], "rb"),
+            ],
+            "resource": "product",
+            "resource_id": 1,
+        },
+    )
+    assert response.status_code == 207
+    assert response.data["files"] == [
+        {"name": "batch_file_0.txt", "uploaded": True},
+        {
+            "name": "bigger_than_10mb_file.txt",
+            "uploaded": False,
+            "message": "File size exceeds the maximum allowed size of 10485760 bytes",
+        },
+        {"name": "batch_file_0.txt", "uploaded": False, "message": "Duplicate file name"},
+        {"name": "batch_file_1.txt", "uploaded": True},
+    ]
+    assert File.objects.count() == 2
+
+
+def test_batch_upload_too_many_files(john_client, batch_files, settings):
+    settings.MAX_BATCH_UPLOAD_FILES = 10
+
+    response = john_client.post(
+        "/api/upload/batch",
+        {
+            "files": [open(file_path, "rb") for file_path in batch_files],
+            "resource": "product",
+            "resource_id": 1,
+        },
+    )
+    assert response.status_code == 400
+    content = get_content_from_response(response)
+    assert content["files"] == ["No more than 10 files can be uploaded at once"]
+    assert File.objects.count() == 0
+
+
+def test_batch_upload_without_files(john_client):
+    response = john_client.post(
+        "/api/upload/batch",
+        {
+            "resource": "product",
+            "resource_id": 1,
+        },
+    )
+    assert response.status_code == 400
+    content = get_content_from_response(response)
+    assert content["files"] == ["No file was submitted."]
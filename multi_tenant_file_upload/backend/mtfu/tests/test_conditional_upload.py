@@ -0,0 +1,254 @@
+import hashlib
+
+import pytest
+
+from dateutil.relativedelta import relativedelta
+from django.core.files.uploadedfile import InMemoryUploadedFile
+from django.db import connection
+from django.utils import timezone
+from mtfu.file_manager.download_utils import etag_matches
+from mtfu.file_manager.models import File
+from mtfu.file_manager.storage import get_storage
+from mtfu.tests.utils import get_content_from_response, get_object_content
+
+
+@pytest.fixture
+def saved_locations(monkeypatch):
+    storage_class = type(get_storage())
+    save = storage_class.save
+    locations = []
+
+    def counting_save(self, location, file):
+        locations.append(location)
+        return save(self, location, file)
+
+    monkeypatch.setattr(storage_class, "save", counting_save)
+    return locations
+
+
+def upload(client, tmp_path, name, content, resource_id=1, checksum=None, **headers):
+    file_path = tmp_path / name
+    file_path.write_bytes(content)
+    data = {"resource": "product", "resource_id": resource_id}
+    if checksum is not None:
+        data["checksum"] = checksum
+    with open(file_path, "rb") as file:
+        return client.post("/api/upload", {"file": file, **data}, **headers)
+
+
+def sha256(content):
+    return hashlib.sha256(content).hexdigest()
+
+
+def test_unchanged_file_is_not_uploaded_again(john_client, tmp_path, saved_locations):
+    response = upload(john_client, tmp_path, "same_file.txt", b"same content")
+    assert response.status_code == 200
+    assert saved_locations == ["asset_imgs/john/same_file.txt"]
+
+    file = File.objects.get(name="same_file.txt")
+    assert file.checksum == sha256(b"same content")
+    assert file.size == len(b"same content")
+    assert response["ETag"] == file.etag
+
+    soon = timezone.now() + relativedelta(hours=1)
+    File.objects.filter(id=file.id).update(expire_at=soon)
+
+    response = upload(john_client, tmp_path, "same_file.txt", b"same content")
+    assert response.status_code == 200
+    assert get_content_from_response(response) == {"message": "File is unchanged"}
+    assert len(saved_locations) == 1
+    assert File.objects.get(id=file.id).expire_at > soon
+
+    response = upload(john_client, tmp_path, "same_file.txt", b"new content")
+    assert get_content_from_response(response) == {"message": "File uploaded successfully"}
+    assert len(saved_locations) == 2
+    assert File.objects.get(id=file.id).checksum == sha256(b"new content")
+
+
+def test_object_shared_by_another_resource(john_client, tmp_path):
+    # both resources use asset_imgs/john/shared_name.txt
+    upload(john_client, tmp_path, "shared_name.txt", b"first content", resource_id=1)
+    upload(john_client, tmp_path, "shared_name.txt", b"second content", resource_id=2)
+    assert set(File.objects.values_list("checksum", flat=True)) == {sha256(b"second content")}
+
+    response = upload(
+        john_client, tmp_path, "shared_name.txt", b"first content", resource_id=1
+    )
+    assert get_content_from_response(response) == {"message": "File uploaded successfully"}
+    assert get_object_content("asset_imgs/john/shared_name.txt") == b"first content"
+
+
+def test_client_checksum(john_client, tmp_path):
+    response = upload(
+        john_client, tmp_path, "checked_file.txt", b"content", checksum=sha256(b"other")
+    )
+    assert response.status_code == 400
+    assert get_content_from_response(response) == {"message": "Checksum mismatch"}
+    assert not File.objects.filter(name="checked_file.txt").exists()
+
+    response = upload(
+        john_client,
+        tmp_path,
+        "checked_file.txt",
+        b"content",
+        checksum=sha256(b"content").upper(),
+    )
+    assert response.status_code == 200
+
+    response = upload(john_client, tmp_path, "checked_file.txt", b"content", checksum="abc")
+    assert response.status_code == 400
+    assert get_content_from_response(response)["checksum"] == [
+        "Checksum must be the hex SHA-256 of the file."
+    ]
+
+
+def test_refresh_endpoint(john_client, tmp_path, saved_locations):
+    upload(john_client, tmp_path, "refreshed_file.txt", b"content")
+    data = {"name": "refreshed_file.txt", "resource": "product", "resource_id": 1}
+
+    response = john_client.post(
+        "/api/upload/refresh", {**data, "checksum": sha256(b"content")}
+    )
+    assert response.status_code == 200
+    assert get_content_from_response(response) == {"message": "File is unchanged"}
+
+    response = john_client.post("/api/upload/refresh", {**data, "checksum": sha256(b"other")})
+    assert response.status_code == 412
+    assert get_content_from_response(response) == {"message": "File has changed"}
+
+    response = john_client.post(
+        "/api/upload/refresh",
+        {**data, "name": "missing_file.txt", "checksum": sha256(b"content")},
+    )
+    assert response.status_code == 404
+
+    response = john_client.post("/api/upload/refresh", data)
+    assert response.status_code == 400
+    assert get_content_from_response(response)["checksum"] == ["No checksum found."]
+    assert len(saved_locations) == 1
+
+
+def test_if_none_match(john_client, tmp_path):
+    response = upload(
+        john_client, tmp_path, "created_once.txt", b"first", HTTP_IF_NONE_MATCH="*"
+    )
+    assert response.status_code == 200
+
+    response = upload(
+        john_client, tmp_path, "created_once.txt", b"second", HTTP_IF_NONE_MATCH="*"
+    )
+    assert response.status_code == 412
+    assert get_content_from_response(response) == {"message": "File already exists"}
+    assert get_object_content("asset_imgs/john/created_once.txt") == b"first"
+
+
+def test_if_match(john_client, tmp_path, saved_locations):
+    response = upload(john_client, tmp_path, "matched_file.txt", b"first")
+    etag = response["ETag"]
+
+    response = upload(john_client, tmp_path, "matched_file.txt", b"second", HTTP_IF_MATCH=etag)
+    assert response.status_code == 200
+    assert response["ETag"] != etag
+
+    # another writer replaced the version the client had read
+    response = upload(john_client, tmp_path, "matched_file.txt", b"third", HTTP_IF_MATCH=etag)
+    assert response.status_code == 412
+    assert get_content_from_response(response) == {"message": "File has changed"}
+    assert get_object_content("asset_imgs/john/matched_file.txt") == b"second"
+    assert len(saved_locations) == 2
+
+    response = upload(john_client, tmp_path, "missing_file.txt", b"first", HTTP_IF_MATCH="*")
+    assert response.status_code == 412
+
+
+def test_batch_upload_skips_unchanged_files(john_client, tmp_path, saved_locations):
+    contents = {"batch_same_1.txt": b"one", "batch_same_2.txt": b"two"}
+
+    def upload_batch():
+        for name, content in contents.items():
+            (tmp_path / name).write_bytes(content)
+        response = john_client.post(
+            "/api/upload/batch",
+            {
+                "files": [open(tmp_path / name, "rb") for name in contents],
+                "resource": "product",
+                "resource_id": 1,
+            },
+        )
+        assert response.status_code == 200
+
+    upload_batch()
+    assert len(saved_locations) == 2
+
+    contents["batch_same_2.txt"] = b"changed"
+    upload_batch()
+    assert saved_locations[2:] == ["asset_imgs/john/batch_same_2.txt"]
+    assert File.objects.get(name="batch_same_2.txt").checksum == sha256(b"changed")
+
+
+def test_streaming_upload_checksum(john_client, tmp_path):
+    file_path = tmp_path / "streamed_checksum.txt"
+    file_path.write_bytes(b"streamed")
+
+    with open(file_path, "rb") as file:
+        response = john_client.post(
+            "/api/upload/stream",
+            {"file": file, "resource": "product", "resource_id": 1, "checksum": sha256(b"x")},
+        )
+    assert response.status_code == 400
+    assert get_content_from_response(response) == {"message": "Checksum mismatch"}
+
+    with open(file_path, "rb") as file:
+        response = john_client.post(
+            "/api/upload/stream", {"file": file, "resource": "product", "resource_id": 1}
+        )
+    assert response.status_code == 200
+    file = File.objects.get(name="streamed_checksum.txt")
+    assert (file.checksum, file.size) == (sha256(b"streamed"), len(b"streamed"))
+
+
+def test_checksum_is_computed_while_received(john_client, tmp_path, monkeypatch):
+    def chunks(self, chunk_size=None):
+        raise AssertionError("read again to be hashed")
+
+    monkeypatch.setattr(InMemoryUploadedFile, "chunks", chunks)
+    response = upload(john_client, tmp_path, "hashed_file.txt", b"hashed content")
+    assert response.status_code == 200
+    assert File.objects.get(name="hashed_file.txt").checksum == sha256(b"hashed content")
+
+
+@pytest.mark.parametrize(
+    "header, etag, weak, expected",
+    [
+        ('"a", "b"', '"b"', False, True),
+        ("*", '"a"', False, True),
+        ('"a"', '"b"', False, False),
+        ('W/"a"', '"a"', False, False),
+        ('"a"', 'W/"a"', False, False),
+        ('W/"a"', '"a"', True, True),
+        ('"a"', 'W/"a"', True, True),
+        (None, '"a"', True, False),
+        ('"a"', None, False, False),
+    ],
+)
+def test_etag_matches(header, etag, weak, expected):
+    assert etag_matches(header, etag, weak) == expected
+
+
+def test_conditional_upload_holds_no_lock_while_uploading(john_client, tmp_path, monkeypatch):
+    storage_class = type(get_storage())
+    save = storage_class.save
+    depth = len(connection.atomic_blocks)
+    transactions = []
+
+    def checked_save(self, location, file):
+        transactions.append(len(connection.atomic_blocks) - depth)
+        return save(self, location, file)
+
+    monkeypatch.setattr(storage_class, "save", checked_save)
+    response = upload(
+        john_client, tmp_path, "unlocked_file.txt", b"first", HTTP_IF_NONE_MATCH="*"
+    )
+    assert response.status_code == 200
+    assert transactions == [0]
+    assert get_object_content("asset_imgs/john/unlocked_file.txt") == b"first"
@@ -0,0 +1,87 @@
+import pytest
+
+from django.db import connection
+from mtfu.file_manager.models import File
+from mtfu.file_manager import pagination_utils
+from mtfu.file_manager.pagination_utils import estimate_count
+from mtfu.tests.utils import get_content_from_response
+
+
+@pytest.fixture
+def files(create_files, john):
+    create_files(john, 7)
+
+
+@pytest.mark.count_queries(autouse=False)
+def test_list_files_without_count(john_client, files, count_queries):
+    response = john_client.get("/api/list_files", {"count": "none", "page_size": 3})
+    assert response.status_code == 200
+    assert response.data["count"] is None
+    assert response.data["num_pages"] is None
+    assert response.data["has_next"] is True
+    assert len(response.data["files"]) == 3
+
+    # JWT authentication and the page only
+    assert len(count_queries) == 2
+    assert "COUNT" not in count_queries.captured_queries[-1]["sql"].upper()
+
+    response = john_client.get("/api/list_files", {"count": "none", "page": 3, "page_size": 3})
+    assert response.data["has_next"] is False
+    assert [file["name"] for file in response.data["files"]] == ["test_file_6.txt"]
+
+
+def test_retrieve_files_with_estimated_count(john_client, files):
+    response = john_client.get("/api/files/product/1", {"count": "estimated", "page_size": 3})
+    assert response.status_code == 200
+    assert response.data["count"] >= 0
+    assert len(response.data["files"]) == 3
+
+
+@pytest.mark.parametrize("estimate", [3, 100])
+def test_list_files_with_wrong_estimate(john_client, files, monkeypatch, estimate):
+    monkeypatch.setattr(pagination_utils, "estimate_count", lambda files: estimate)
+
+    names, page = [], 1
+    while True:
+        response = john_client.get(
+            "/api/list_files", {"count": "estimated", "page": page, "page_size": 3}
+        )
+        assert response.status_code == 200
+        assert response.data["count"] == estimate
+        assert response.data["num_pages"] == -(-estimate // 3)
+        names += [file["name"] for file in response.data["files"]]
+        if not response.data["has_next"]:
+            break
+        page += 1
+
+    # the pages are not clipped to the estimate
+    assert names == [f"test_file_{i}.txt" for i in range(7)]
+    assert page == 3
+
+
+def test_list_files_with_exact_count(john_client, files):
+    response = john_client.get("/api/list_files", {"count": "exact", "page_size": 3})
+    assert response.data["count"] == 7
+    assert response.data["num_pages"] == 3
+
+
+def test_cursor_pagination_with_count(john_client, files):
+    response = john_client.get("/api/list_files", {"pagination": "cursor"})
+    assert "count" not in response.data
+
+    response = john_client.get("/api/list_files", {"pagination": "cursor", "count": "exact"})
+    assert response.data["count"] == 7
+
+
+def test_list_files_with_invalid_count(john_client, files):
+    response = john_client.get("/api/list_files", {"count": "all"})
+    assert response.status_code == 400
+    content = get_content_from_response(response)
+    assert content["count"] == ["Invalid count"]
+
+
+@pytest.mark.skipif(connection.vendor != "postgresql", reason="uses the PostgreSQL planner")
+def test_estimate_count_uses_planner(files, django_assert_num_queries):
+    with django_assert_num_queries(1) as captured:
+        assert estimate_count(File.objects.filter(resource="product")) > 0
+    assert captured.captured_queries[0]["sql"].startswith("EXPLAIN")
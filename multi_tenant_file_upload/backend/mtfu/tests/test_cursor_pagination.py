@@ -0,0 +1,76 @@
+import pytest
+
+from mtfu.file_manager.models import File
+from mtfu.tests.utils import get_content_from_response
+
+
+@pytest.fixture
+def files(create_files, john):
+    # the same names under two resource ids, so the id breaks the ties
+    create_files(john, 5, resource_ids=("1", "2"))
+    return list(File.objects.order_by("name", "id").values_list("name", "resource_id"))
+
+
+def names(response):
+    return [(file["name"], file["resource_id"]) for file in response.data["files"]]
+
+
+def test_cursor_pagination(john_client, files):
+    response = john_client.get("/api/list_files", {"pagination": "cursor", "page_size": 3})
+    assert response.status_code == 200
+    assert response.data["previous"] is None
+    pages = [names(response)]
+
+    while response.data["next"] is not None:
+        response = john_client.get(
+            "/api/list_files", {"cursor": response.data["next"], "page_size": 3}
+        )
+        pages.append(names(response))
+
+    assert [len(page) for page in pages] == [3, 3, 3, 1]
+    assert [name for page in pages for name in page] == files
+
+    # and back again
+    for page in reversed(pages[:-1]):
+        response = john_client.get(
+            "/api/list_files", {"cursor": response.data["previous"], "page_size": 3}
+        )
+        assert names(response) == page
+    assert response.data["previous"] is None
+
+
+def test_cursor_pagination_with_retrieve_files(john_client, files):
+    response = john_client.get(
+        "/api/files/product/1", {"pagination": "cursor", "page_size": 2}
+    )
+    assert names(response) == [("test_file_0.txt", "1"), ("test_file_1.txt", "1")]
+
+    response = john_client.get(
+        "/api/files/product/1", {"cursor": response.data["next"], "page_size": 2}
+    )
+    assert names(response) == [("test_file_2.txt", "1"), ("test_file_3.txt", "1")]
+    assert "url" in response.data["files"][0]
+
+
+@pytest.mark.count_queries(autouse=False)
+def test_cursor_pagination_queries(john_client, files, count_queries):
+    response = john_client.get("/api/list_files", {"pagination": "cursor", "page_size": 3})
+    john_client.get("/api/list_files", {"cursor": response.data["next"], "page_size": 3})
+
+    # the tenant is loaded by the first request only, then one query per page, no count
+    assert len(count_queries) == 3
+    assert "COUNT" not in count_queries.captured_queries[-1]["sql"].upper()
+
+
+def test_invalid_cursor(john_client, files):
+    response = john_client.get("/api/list_files", {"cursor": "not-a-cursor"})
+    assert response.status_code == 400
+    content = get_content_from_response(response)
+    assert content["cursor"] == ["Invalid cursor"]
+
+
+def test_cursor_pagination_with_invalid_page_size(john_client, files):
+    response = john_client.get("/api/list_files", {"pagination": "cursor", "page_size": 0})
+    assert response.status_code == 400
+    content = get_content_from_response(response)
+    assert content["page_size"] == ["Invalid page size"]
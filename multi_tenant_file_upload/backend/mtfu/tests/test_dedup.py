@@ -0,0 +1,200 @@
+import io
+
+import pytest
+
+from django.core.management import call_command
+from django.db.models import RestrictedError
+from mtfu.batch.gc_files_impl import gc_blobs, gc_files
+from mtfu.file_manager.models import Blob, File
+from mtfu.file_manager.storage import get_storage
+from mtfu.tests.utils import get_object_content, object_exists
+
+LOGO = b"the same logo, uploaded again and again"
+
+
+@pytest.fixture(autouse=True)
+def dedup_uploads(settings):
+    settings.DEDUP_UPLOADS = True
+
+
+@pytest.fixture
+def saved_locations(monkeypatch):
+    storage_class = type(get_storage())
+    save = storage_class.save
+    locations = []
+
+    def counting_save(self, location, file):
+        locations.append(location)
+        return save(self, location, file)
+
+    monkeypatch.setattr(storage_class, "save", counting_save)
+    return locations
+
+
+def upload(client, tmp_path, name, content, resource_id=1):
+    file_path = tmp_path / name
+    file_path.write_bytes(content)
+    with open(file_path, "rb") as file:
+        response = client.post(
+            "/api/upload", {"file": file, "resource": "product", "resource_id": resource_id}
+        )
+    assert response.status_code == 200
+
+
+def test_same_content_is_stored_once(john_client, tmp_path, saved_locations):
+    upload(john_client, tmp_path, "dedup_logo.png", LOGO)
+    upload(john_client, tmp_path, "dedup_logo_copy.png", LOGO, resource_id=2)
+
+    blob = Blob.objects.get()
+    assert blob.ref_count == 2
+    assert blob.size == len(LOGO)
+    assert saved_locations == [blob.location]
+    assert blob.location.startswith("blobs/john/")
+    assert get_object_content(blob.location) == LOGO
+
+    files = File.objects.filter(name__startswith="dedup_logo")
+    assert {(file.location, file.etag, file.blob_id) for file in files} == {
+        (blob.location, blob.etag, blob.id)
+    }
+
+    # the files are downloaded under their own name
+    file = files.get(name="dedup_logo_copy.png")
+    response = john_client.get(f"/api/download/{file.id}")
+    assert b"".join(response.streaming_content) == LOGO
+    assert 'filename="dedup_logo_copy.png"' in response["Content-Disposition"]
+
+
+def test_tenants_do_not_share_blobs(john_client, jimmy_client, tmp_path):
+    upload(john_client, tmp_path, "dedup_shared_logo.png", LOGO)
+    upload(jimmy_client, tmp_path, "dedup_shared_logo.png", LOGO)
+
+    assert Blob.objects.count() == 2
+    assert set(Blob.objects.values_list("ref_count", flat=True)) == {1}
+
+
+def test_overwrite_releases_the_previous_blob(john_client, tmp_path):
+    upload(john_client, tmp_path, "dedup_overwritten.png", LOGO)
+    old_blob = Blob.objects.get()
+
+    # the same content again keeps its single reference
+    upload(john_client, tmp_path, "dedup_overwritten.png", LOGO)
+    assert Blob.objects.get().ref_count == 1
+
+    upload(john_client, tmp_path, "dedup_overwritten.png", b"a new logo")
+    old_blob.refresh_from_db()
+    assert old_blob.ref_count == 0
+    new_blob = Blob.objects.get(ref_count=1)
+    assert File.objects.get(name="dedup_overwritten.png").location == new_blob.location
+
+    assert gc_blobs() == {"blobs": 1, "failed": 0}
+    assert not Blob.objects.filter(id=old_blob.id).exists()
+    assert not object_exists(old_blob.location)
+    assert object_exists(new_blob.location)
+
+
+def test_batch_upload(john_client, tmp_path, saved_locations):
+    contents = {"dedup_a.png": LOGO, "dedup_b.png": LOGO, "dedup_c.png": b"another logo"}
+    for name, content in contents.items():
+        (tmp_path / name).write_bytes(content)
+
+    def upload_batch():
+        response = john_client.post(
+            "/api/upload/batch",
+            {
+                "files": [open(tmp_path / name, "rb") for name in contents],
+                "resource": "product",
+                "resource_id": 1,
+            },
+        )
+        assert response.status_code == 200
+
+    upload_batch()
+    assert len(saved_locations) == 2
+    assert sorted(Blob.objects.values_list("ref_count", flat=True)) == [1, 2]
+
+    # nothing is uploaded again and the references are unchanged
+    upload_batch()
+    assert len(saved_locations) == 2
+    assert sorted(Blob.objects.values_list("ref_count", flat=True)) == [1, 2]
+    assert File.objects.filter(name__startswith="dedup_").count() == 3
+
+
+def test_gc_keeps_blobs_in_use(john_client, tmp_path):
+    upload(john_client, tmp_path, "dedup_gc_deleted.png", LOGO, resource_id=1)
+    upload(john_client, tmp_path, "dedup_gc_kept.png", LOGO, resource_id=2)
+    blob = Blob.objects.get()
+
+    john_client.delete("/api/files/product/1")
+    # the blob is not one of the deleted objects
+    assert gc_files() == {"files": 1, "objects": 0, "failed": 0}
+    blob.refresh_from_db()
+    assert blob.ref_count == 1
+
+    assert gc_blobs() == {"blobs": 0, "failed": 0}
+    assert object_exists(blob.location)
+
+    john_client.delete("/api/files/product/2")
+    gc_files()
+    assert gc_blobs() == {"blobs": 1, "failed": 0}
+    assert not object_exists(blob.location)
+
+
+def test_delete_tenant_with_deduplicated_files(john, john_client, jimmy_client, tmp_path):
+    upload(john_client, tmp_path, "dedup_tenant_logo.png", LOGO, resource_id=1)
+    upload(john_client, tmp_path, "dedup_tenant_logo_copy.png", LOGO, resource_id=2)
+    upload(jimmy_client, tmp_path, "dedup_tenant_logo.png", LOGO)
+
+    # a blob in use can not be deleted on its own
+    with pytest.raises(RestrictedError):
+        Blob.objects.get(tenant=john).delete()
+
+    # but goes with its tenant and the files using it
+    john.delete()
+    assert not File.objects.filter(tenant=john.id).exists()
+    assert not Blob.objects.filter(tenant=john.id).exists()
+    assert Blob.objects.get().ref_count == 1
+
+
+def test_upload_after_gc_stores_the_content_again(john_client, tmp_path):
+    upload(john_client, tmp_path, "dedup_again.png", LOGO)
+    john_client.delete("/api/files/product/1")
+    gc_files()
+    gc_blobs()
+
+    upload(john_client, tmp_path, "dedup_again.png", LOGO)
+    blob = Blob.objects.get()
+    assert blob.ref_count == 1
+    assert get_object_content(blob.location) == LOGO
+
+
+def test_dedup_stats(john, john_client, jimmy_client, tmp_path):
+    upload(john_client, tmp_path, "dedup_stats_1.png", LOGO, resource_id=1)
+    upload(john_client, tmp_path, "dedup_stats_2.png", LOGO, resource_id=2)
+    upload(john_client, tmp_path, "dedup_stats_3.png", b"x" * len(LOGO), resource_id=3)
+    upload(jimmy_client, tmp_path, "dedup_stats_1.png", LOGO)
+
+    stats = Blob.get_stats()[john.id]
+    assert stats == {
+        "files": 3,
+        "blobs": 2,
+        "file_size": 3 * len(LOGO),
+        "stored_size": 2 * len(LOGO),
+        "dedup_ratio": 1.5,
+    }
+
+    out = io.StringIO()
+    call_command("dedup_stats", stdout=out)
+    lines = out.getvalue().splitlines()
+    assert lines[0].startswith("john: 3 files in 2 blobs")
+    assert lines[1].startswith("jimmy: 1 files in 1 blobs")
+    assert "(ratio 1.33)" in lines[2]
+
+
+def test_dedup_disabled(settings, john_client, tmp_path):
+    settings.DEDUP_UPLOADS = False
+    upload(john_client, tmp_path, "dedup_disabled.png", LOGO)
+
+    file = File.objects.get(name="dedup_disabled.png")
+    assert file.blob is None
+    assert file.location == "asset_imgs/john/dedup_disabled.png"
+    assert not Blob.objects.exists()
@@ -0,0 +1,160 @@
+import pytest
+
+from mtfu.file_manager.download_utils import parse_range
+from mtfu.file_manager.models import File
+from mtfu.file_manager.storage import get_storage
+from mtfu.tests.utils import get_content_from_response, upload
+
+CONTENT = b"download_file.txt content"
+
+
+@pytest.fixture(params=["s3", "local", "memory"])
+def storage_engine(request, settings, tmp_path):
+    settings.STORAGE_ENGINE = request.param
+    settings.LOCAL_STORAGE_ROOT = str(tmp_path / "storage")
+    return request.param
+
+
+@pytest.fixture
+def file_id(storage_engine, john_client, tmp_path):
+    upload(john_client, tmp_path, "download_file.txt")
+    return File.objects.get(name="download_file.txt").id
+
+
+def download(client, file_id, **headers):
+    response = client.get(f"/api/download/{file_id}", **headers)
+    content = b"".join(response.streaming_content) if response.streaming else response.content
+    return response, content
+
+
+def test_download(john_client, file_id):
+    response, content = download(john_client, file_id)
+    assert response.status_code == 200
+    assert content == CONTENT
+    assert response["Content-Length"] == str(len(CONTENT))
+    assert response["Content-Type"] == "text/plain"
+    assert response["Accept-Ranges"] == "bytes"
+    assert response["ETag"] == get_storage().stat("asset_imgs/john/download_file.txt")["etag"]
+
+
+@pytest.mark.parametrize(
+    "header, content_range, expected",
+    [
+        ("bytes=0-7", "bytes 0-7/25", CONTENT[:8]),
+        ("bytes=18-", "bytes 18-24/25", CONTENT[18:]),
+        ("bytes=-7", "bytes 18-24/25", CONTENT[-7:]),
+        ("bytes=20-100", "bytes 20-24/25", CONTENT[20:]),
+    ],
+)
+def test_download_range(john_client, file_id, header, content_range, expected):
+    response, content = download(john_client, file_id, HTTP_RANGE=header)
+    assert response.status_code == 206
+    assert content == expected
+    assert response["Content-Range"] == content_range
+    assert response["Content-Length"] == str(len(expected))
+
+
+def test_download_unsatisfiable_range(john_client, file_id):
+    response, _ = download(john_client, file_id, HTTP_RANGE="bytes=25-")
+    assert response.status_code == 416
+    assert response["Content-Range"] == "bytes */25"
+
+
+def test_download_range_of_another_version(john_client, file_id):
+    # If-Range with an old ETag: the file changed, the whole new content is sent
+    response, content = download(
+        john_client, file_id, HTTP_RANGE="bytes=0-7", HTTP_IF_RANGE='"old"'
+    )
+    assert response.status_code == 200
+    assert content == CONTENT
+
+
+def test_download_not_modified(john_client, file_id):
+    etag = download(john_client, file_id)[0]["ETag"]
+
+    response, content = download(john_client, file_id, HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 304
+    assert content == b""
+    assert response["ETag"] == etag
+
+    response, _ = download(john_client, file_id, HTTP_IF_NONE_MATCH=f'"other", W/{etag}')
+    assert response.status_code == 304
+
+    response, content = download(john_client, file_id, HTTP_IF_NONE_MATCH='"other"')
+    assert response.status_code == 200
+    assert content == CONTENT
+
+
+def test_download_with_accel_redirect(john_client, file_id, settings):
+    settings.DOWNLOAD_ACCEL_REDIRECT = "/protected/"
+
+    response, content = download(john_client, file_id)
+    assert response.status_code == 200
+    assert content == b""
+    assert response["X-Accel-Redirect"] == "/protected/asset_imgs/john/download_file.txt"
+    assert response["Content-Type"] == "text/plain"
+
+
+def test_download_file_of_another_tenant(jimmy_client, file_id):
+    response, _ = download(jimmy_client, file_id)
+    assert response.status_code == 404
+    assert get_content_from_response(response) == {"message": "File not found"}
+
+    File.objects.filter(id=file_id).update(is_public=True)
+    response, content = download(jimmy_client, file_id)
+    assert response.status_code == 200
+    assert content == CONTENT
+
+
+def test_download_deleted_file(john_client, file_id):
+    john_client.delete("/api/files/product/1")
+
+    response, _ = download(john_client, file_id)
+    assert response.status_code == 404
+
+
+def test_download_urls(john_client, file_id, settings, monkeypatch):
+    settings.DOWNLOAD_URLS = True
+
+    def sign(locations):
+        raise AssertionError("nothing should be signed")
+
+    monkeypatch.setattr(
+        type(get_storage()), "get_urls", lambda self, locations: sign(locations)
+    )
+
+    response = john_client.get("/api/files/product/1")
+    assert response.status_code == 200
+    file = response.data["files"][0]
+    assert file["id"] == file_id
+    assert file["url"] == f"/api/download/{file_id}"
+
+    response, content = download(john_client, file_id)
+    assert content == CONTENT
+
+
+def test_download_without_authentication(file_id, client):
+    response = client.get(f"/api/download/{file_id}")
+    assert response.status_code == 401
+
+
+@pytest.mark.parametrize(
+    "header, expected",
+    [
+        (None, None),
+        ("bytes=0-0", (0, 1)),
+        ("bytes=5-", (5, 5)),
+        ("bytes=-20", (0, 10)),
+        ("bytes=0-1,4-5", None),
+        ("items=0-1", None),
+        ("bytes=-", None),
+    ],
+)
+def test_parse_range(header, expected):
+    assert parse_range(header, 10) == expected
+
+
+@pytest.mark.parametrize("header", ["bytes=10-", "bytes=5-2", "bytes=-0"])
+def test_parse_unsatisfiable_range(header):
+    with pytest.raises(ValueError):
+        parse_range(header, 10)
@@ -0,0 +1,260 @@
+import io
+import os
+
+import pytest
+
+from mtfu.file_manager.file_cache import FileCache, get_file_cache
+from mtfu.file_manager.models import File
+from mtfu.file_manager.storage import get_storage
+from mtfu.tests.test_metrics import sample
+from mtfu.tests.utils import upload
+
+
+@pytest.fixture
+def storage(settings, tmp_path):
+    settings.STORAGE_ENGINE = "memory"
+    settings.DOWNLOAD_CACHE_DIR = str(tmp_path / "download_cache")
+    settings.DOWNLOAD_CACHE_SIZE = 1024 * 1024
+    engine = get_storage()
+    engine.clear()
+    return engine
+
+
+def download(client, file_id, **headers):
+    response = client.get(f"/api/download/{file_id}", **headers)
+    return response, b"".join(response.streaming_content)
+
+
+def no_storage_calls(monkeypatch, storage):
+    def fail(*args, **kwargs):
+        raise AssertionError("the storage should not be called")
+
+    monkeypatch.setattr(storage, "open", fail)
+    monkeypatch.setattr(storage, "stat", fail)
+
+
+def test_hit_is_served_from_disk(storage, john_client, tmp_path, monkeypatch):
+    upload(john_client, tmp_path, "cached_file.txt")
+    file = File.objects.get(name="cached_file.txt")
+    assert file.etag == storage.stat(file.location)["etag"]
+
+    response, content = download(john_client, file.id)
+    assert response["X-Cache"] == "MISS"
+    assert content == b"cached_file.txt content"
+
+    no_storage_calls(monkeypatch, storage)
+    response, content = download(john_client, file.id)
+    assert response["X-Cache"] == "HIT"
+    assert content == b"cached_file.txt content"
+
+    response, content = download(john_client, file.id, HTTP_RANGE="bytes=0-5")
+    assert response.status_code == 206
+    assert response["X-Cache"] == "HIT"
+    assert content == b"cached"
+
+    stats = get_file_cache().stats()
+    assert stats["hits"] == 2
+    assert stats["misses"] == 1
+    assert stats["hit_rate"] == 2 / 3
+    assert stats["bytes_fetched"] == len(b"cached_file.txt content")
+    assert stats["bytes_saved"] == len(b"cached_file.txt content") + 6
+
+
+def test_overwrite_is_a_miss(storage, john_client, tmp_path):
+    upload(john_client, tmp_path, "overwritten_file.txt")
+    file = File.objects.get(name="overwritten_file.txt")
+    download(john_client, file.id)
+    assert get_file_cache().stats()["entries"] == 1
+
+    (tmp_path / "overwritten_file.txt").write_text("new content")
+    with open(tmp_path / "overwritten_file.txt", "rb") as new_file:
+        response = john_client.post(
+            "/api/upload", {"file": new_file, "resource": "product", "resource_id": 1}
+        )
+    assert response.status_code == 200
+    # the old version was dropped right away
+    assert get_file_cache().stats()["entries"] == 0
+
+    response, content = download(john_client, file.id)
+    assert response["X-Cache"] == "MISS"
+    assert content == b"new content"
+
+
+def test_stale_etag_is_not_cached(storage, tmp_path):
+    storage.save("asset_imgs/john/stale.txt", io.BytesIO(b"content"))
+    cache = FileCache(str(tmp_path / "cache"), 1024, 1024)
+
+    assert cache.fill(storage, "asset_imgs/john/stale.txt", '"old"') is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_eviction(storage, tmp_path):
+    cache = FileCache(str(tmp_path / "cache"), 10, 10)
+    for name in ("a", "b", "c"):
+        location = f"asset_imgs/john/{name}.txt"
+        etag = storage.save(location, io.BytesIO(b"12345"))
+        assert cache.fill(storage, location, etag) is not None
+
+    # a was the least recently used one
+    stats = cache.stats()
+    assert stats["entries"] == 2
+    assert stats["size"] == 10
+    assert stats["evictions"] == 1
+    assert (
+        cache.get("asset_imgs/john/a.txt", storage.stat("asset_imgs/john/a.txt")["etag"])
+        is None
+    )
+    assert cache.get("asset_imgs/john/c.txt", storage.stat("asset_imgs/john/c.txt")["etag"])
+
+
+def test_big_files_are_not_cached(storage, tmp_path):
+    etag = storage.save("asset_imgs/john/big.txt", io.BytesIO(b"0123456789"))
+    cache = FileCache(str(tmp_path / "cache"), 100, 5)
+
+    assert cache.fill(storage, "asset_imgs/john/big.txt", etag) is None
+    assert cache.stats()["size"] == 0
+
+
+def test_files_cached_by_another_worker(storage, tmp_path):
+    etag = storage.save("asset_imgs/john/shared.txt", io.BytesIO(b"content"))
+    FileCache(str(tmp_path / "cache"), 100, 100).fill(
+        storage, "asset_imgs/john/shared.txt", etag
+    )
+
+    other = FileCache(str(tmp_path / "cache"), 100, 100)
+    assert other.get("asset_imgs/john/shared.txt", etag) is not None
+
+
+def fill_files(cache, storage, names, size=25):
+    locations = {}
+    for name in names:
+        location = f"asset_imgs/john/{name}.txt"
+        locations[location] = storage.save(location, io.BytesIO(name.encode() * size))
+        assert cache.fill(storage, location, locations[location]) is not None
+    return locations
+
+
+def test_hits_of_another_worker_are_not_counted(storage, tmp_path):
+    worker_a = FileCache(str(tmp_path / "cache"), 100, 100)
+    worker_b = FileCache(str(tmp_path / "cache"), 100, 100)
+    locations = fill_files(worker_a, storage, "abcd")
+
+    for location, etag in locations.items():
+        assert worker_b.get(location, etag) is not None
+    assert worker_a.stats()["size"] == 100
+    assert worker_b.stats()["size"] == 0
+
+    # worker_b has its whole share for its own files, worker_a's ones stay
+    fill_files(worker_b, storage, "efgh")
+    assert worker_b.stats()["size"] == 100
+    for location, etag in locations.items():
+        assert worker_b.get(location, etag) is not None
+    assert len([name for name in os.listdir(tmp_path / "cache") if name[0] != "."]) == 8
+
+
+def test_files_of_an_exiting_worker_are_handed_over(storage, tmp_path):
+    worker_a = FileCache(str(tmp_path / "cache"), 100, 100)
+    worker_b = FileCache(str(tmp_path / "cache"), 100, 100)
+    locations = fill_files(worker_a, storage, "ab")
+
+    worker_a.close()
+    fill_files(worker_b, storage, "c")
+    stats = worker_b.stats()
+    assert stats["entries"] == 3
+    assert stats["size"] == 75
+
+    # the locations are handed over too
+    worker_b.invalidate("asset_imgs/john/a.txt")
+    assert worker_b.get("asset_imgs/john/a.txt", locations["asset_imgs/john/a.txt"]) is None
+
+
+def test_first_worker_adopts_the_files_of_a_previous_run(storage, tmp_path):
+    previous = FileCache(str(tmp_path / "cache"), 100, 100)
+    fill_files(previous, storage, "ab")
+    previous.close()
+
+    first = FileCache(str(tmp_path / "cache"), 100, 100)
+    second = FileCache(str(tmp_path / "cache"), 100, 100)
+    assert first.stats()["size"] == 50
+    assert second.stats()["size"] == 0
+    # the handed over files are not counted twice
+    fill_files(second, storage, "c")
+    assert second.stats()["size"] == 25
+
+
+def test_workers_share_the_size(storage, settings):
+    settings.DOWNLOAD_CACHE_WORKERS = 4
+    assert get_file_cache().max_size == 1024 * 1024 // 4
+
+
+def test_cache_metrics(storage, tmp_path):
+    before = {
+        "hits": sample("mtfu_download_cache_lookups_total", result="hit"),
+        "misses": sample("mtfu_download_cache_lookups_total", result="miss"),
+        "saved": sample("mtfu_download_cache_bytes_total", kind="saved"),
+        "fetched": sample("mtfu_download_cache_bytes_total", kind="fetched"),
+        "size": sample("mtfu_download_cache_size_bytes"),
+    }
+    etag = storage.save("asset_imgs/john/metrics.txt", io.BytesIO(b"content"))
+    cache = FileCache(str(tmp_path / "cache"), 100, 100)
+
+    assert cache.get("asset_imgs/john/metrics.txt", etag) is None
+    cache.fill(storage, "asset_imgs/john/metrics.txt", etag)
+    assert cache.get("asset_imgs/john/metrics.txt", etag) is not None
+    cache.record_hit(7)
+
+    assert sample("mtfu_download_cache_lookups_total", result="hit") == before["hits"] + 1
+    assert sample("mtfu_download_cache_lookups_total", result="miss") == before["misses"] + 1
+    assert sample("mtfu_download_cache_bytes_total", kind="saved") == before["saved"] + 7
+    assert sample("mtfu_download_cache_bytes_total", kind="fetched") == before["fetched"] + 7
+    assert sample("mtfu_download_cache_size_bytes") == before["size"] + 7
+
+    cache.invalidate("asset_imgs/john/metrics.txt")
+    assert sample("mtfu_download_cache_size_bytes") == before["size"]
+
+
+def test_cache_disabled(storage, settings, john_client, tmp_path):
+    settings.DOWNLOAD_CACHE_SIZE = 0
+    upload(john_client, tmp_path, "uncached_file.txt")
+
+    response, content = download(john_client, File.objects.get(name="uncached_file.txt").id)
+    assert content == b"uncached_file.txt content"
+    assert "X-Cache" not in response
+
+
+def test_etag_of_each_upload_path(storage, john_client, tmp_path):
+    paths = []
+    for name in ("etag_batch_1.txt", "etag_batch_2.txt", "etag_streamed.txt"):
+        paths.append(tmp_path / name)
+        paths[-1].write_text(f"{name} content")
+
+    response = john_client.post(
+        "/api/upload/batch",
+        {
+            "files": [open(file_path, "rb") for file_path in paths[:2]],
+            "resource": "product",
+            "resource_id": 1,
+        },
+    )
+    assert response.status_code == 200
+
+    with open(paths[2], "rb") as file:
+        response = john_client.post(
+            "/api/upload/stream", {"file": file, "resource": "product", "resource_id": 1}
+        )
+    assert response.status_code == 200
+
+    files = File.objects.filter(name__startswith="etag_")
+    assert len(files) == 3
+    for file in files:
+        assert file.etag == storage.stat(file.location)["etag"]
+
+
+def test_delete_drops_cached_copies(storage, john_client, tmp_path):
+    upload(john_client, tmp_path, "deleted_cached_file.txt", resource_id=2)
+    download(john_client, File.objects.get(name="deleted_cached_file.txt").id)
+    assert get_file_cache().stats()["entries"] == 1
+
+    response = john_client.delete("/api/files/product/2")
+    assert response.status_code == 200
+    assert get_file_cache().stats()["entries"] == 0
@@ -0,0 +1,89 @@
+from mtfu.batch import gc_files_impl
+from mtfu.batch.gc_files_impl import gc_files
+from mtfu.file_manager.models import File
+from mtfu.tests.utils import object_exists, upload
+
+
+def test_delete_files_is_one_update(john_client, tmp_path, django_assert_num_queries):
+    for i in range(5):
+        upload(john_client, tmp_path, f"gc_update_{i}.txt")
+
+    # the update only, the uploads cached the tenant
+    with django_assert_num_queries(1):
+        john_client.delete("/api/files/product/1")
+
+    assert File.objects.filter(delete_flg=True).count() == 5
+
+
+def test_gc_files(john_client, tmp_path):
+    for i in range(5):
+        upload(john_client, tmp_path, f"gc_file_{i}.txt")
+    upload(john_client, tmp_path, "gc_kept.txt", resource_id=2)
+
+    john_client.delete("/api/files/product/1")
+    stats = gc_files(chunk_size=2)
+
+    assert stats == {"files": 5, "objects": 5, "failed": 0}
+    assert not File.objects.filter(resource_id="1").exists()
+    assert not object_exists("asset_imgs/john/gc_file_3.txt")
+    assert object_exists("asset_imgs/john/gc_kept.txt")
+
+    # nothing left to collect
+    assert gc_files() == {"files": 0, "objects": 0, "failed": 0}
+
+
+def test_gc_files_keeps_shared_objects(john_client, tmp_path):
+    upload(john_client, tmp_path, "gc_shared.txt", resource_id=1)
+    upload(john_client, tmp_path, "gc_shared.txt", resource_id=2)
+
+    john_client.delete("/api/files/product/1")
+    stats = gc_files()
+
+    assert stats == {"files": 1, "objects": 0, "failed": 0}
+    assert object_exists("asset_imgs/john/gc_shared.txt")
+    response = john_client.get("/api/files/product/2")
+    assert [file["name"] for file in response.data["files"]] == ["gc_shared.txt"]
+
+
+def test_gc_files_keeps_rows_of_failed_objects(john_client, tmp_path, monkeypatch):
+    upload(john_client, tmp_path, "gc_failed.txt")
+    john_client.delete("/api/files/product/1")
+
+    monkeypatch.setattr(gc_files_impl, "delete_objects", lambda locations: set(locations))
+    stats = gc_files()
+
+    assert stats == {"files": 0, "objects": 0, "failed": 1}
+    assert File.objects.filter(name="gc_failed.txt", delete_flg=True).exists()
+    assert object_exists("asset_imgs/john/gc_failed.txt")
+
+
+def test_upload_revives_deleted_file(john_client, tmp_path):
+    upload(john_client, tmp_path, "gc_revived.txt")
+    john_client.delete("/api/files/product/1")
+
+    upload(john_client, tmp_path, "gc_revived.txt")
+    assert gc_files()["files"] == 0
+
+    response = john_client.get("/api/files/product/1")
+    assert [file["name"] for file in response.data["files"]] == ["gc_revived.txt"]
+
+
+def test_gc_files_during_upload_of_deleted_file(john_client, tmp_path, monkeypatch):
+    upload(john_client, tmp_path, "gc_raced.txt")
+    john_client.delete("/api/files/product/1")
+
+    # the collector runs once the new content is stored, before its row is recorded
+    record_upload = File.record_upload
+    stats = {}
+
+    def collect_then_record_upload(*args, **kwargs):
+        stats.update(gc_files())
+        return record_upload(*args, **kwargs)
+
+    monkeypatch.setattr(File, "record_upload", collect_then_record_upload)
+    upload(john_client, tmp_path, "gc_raced.txt")
+
+    assert stats == {"files": 0, "objects": 0, "failed": 0}
+    file = File.objects.get(name="gc_raced.txt")
+    assert not file.delete_flg
+    assert object_exists(file.location)
@@ -0,0 +1,126 @@
+import io
+
+import pytest
+
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from mtfu.auth_user.models import Tenant
+from mtfu.batch.init_data_impl import import_tenants, read_tenants
+from mtfu.file_manager.storage import StorageError, get_storage
+
+CSV = """username,password
+import_1,secret1
+john,changed
+import_2,secret2
+
+import_1,duplicate
+{long_name},secret
+import_3,secret3
+"""
+
+
+@pytest.fixture(autouse=True)
+def fast_hasher(settings):
+    settings.PASSWORD_HASHERS = ["django.contrib.auth.hashers.MD5PasswordHasher"]
+
+
+@pytest.fixture
+def folders(monkeypatch):
+    storage_class = type(get_storage())
+    create_folder = storage_class.create_folder
+    locations = []
+
+    def recording_create_folder(self, location):
+        if "failing" in location:
+            raise StorageError("Could not create the folder")
+        locations.append(location)
+        return create_folder(self, location)
+
+    monkeypatch.setattr(storage_class, "create_folder", recording_create_folder)
+    return locations
+
+
+@pytest.fixture
+def csv_path(tmp_path):
+    path = tmp_path / "tenants.csv"
+    path.write_text(CSV.format(long_name="x" * 200))
+    return path
+
+
+def test_import_tenants(john, csv_path, folders):
+    reports = []
+    with open(csv_path, newline="") as file:
+        stats = import_tenants(
+            read_tenants(file), chunk_size=3, processes=2, on_chunk=reports.append
+        )
+
+    # the duplicate import_1 is in the second chunk, after import_1 was created
+    assert stats == {"rows": 6, "created": 3, "existing": 2, "invalid": 1, "failed": 0}
+    # the same dict is updated after each of the 2 chunks
+    assert len(reports) == 2
+
+    for username, password in [("import_1", "secret1"), ("import_2", "secret2")]:
+        assert Tenant.objects.get(username=username).check_password(password)
+    assert Tenant.objects.get(username="import_3").check_password("secret3")
+    # the existing tenant keeps its password
+    john.refresh_from_db()
+    assert john.check_password("mypassword")
+
+    assert sorted(folders) == [
+        "asset_imgs/import_1/",
+        "asset_imgs/import_2/",
+        "asset_imgs/import_3/",
+    ]
+
+
+def test_tenant_without_folder_is_not_created(folders):
+    rows = [("import_ok", "secret"), ("import_failing", "secret")]
+    stats = import_tenants(rows, processes=1)
+
+    assert stats["created"] == 1
+    assert stats["failed"] == 1
+    assert list(Tenant.objects.values_list("username", flat=True)) == ["import_ok"]
+
+
+def test_empty_password_is_invalid(folders):
+    stats = import_tenants([("import_no_password", ""), ("import_password", "x")], processes=1)
+
+    assert stats == {"rows": 2, "created": 1, "existing": 0, "invalid": 1, "failed": 0}
+    assert not Tenant.objects.filter(username="import_no_password").exists()
+
+
+def test_tenant_created_meanwhile_is_existing(monkeypatch):
+    bulk_create = Tenant.objects.bulk_create
+
+    def racing_bulk_create(tenants, **kwargs):
+        # another import inserts it after the query of the existing usernames
+        Tenant.objects.create(username="import_raced", password=make_password("other"))
+        return bulk_create(tenants, **kwargs)
+
+    monkeypatch.setattr(Tenant.objects, "bulk_create", racing_bulk_create)
+    stats = import_tenants(
+        [("import_raced", "mine"), ("import_won", "mine")], processes=1, create_folders=False
+    )
+
+    assert stats == {"rows": 2, "created": 1, "existing": 1, "invalid": 0, "failed": 0}
+    assert Tenant.objects.get(username="import_raced").check_password("other")
+
+
+def test_skip_folders(folders):
+    stats = import_tenants([("import_no_folder", "secret")], processes=1, create_folders=False)
+    assert stats["created"] == 1
+    assert folders == []
+
+
+def test_import_tenants_command(csv_path, folders):
+    out = io.StringIO()
+    call_command(
+        "import_tenants", str(csv_path), "--chunk-size=4", "--processes=1", stdout=out
+    )
+    lines = out.getvalue().splitlines()
+    assert len(lines) == 3
+    assert lines[0].startswith("4 rows, 3 created, 0 existing, 1 invalid, 0 failed in ")
+    assert lines[2].startswith("Done: 6 rows, 4 created, 0 existing, 2 invalid, 0 failed")
+    assert "rows/s)" in lines[2]
+    assert Tenant.objects.filter(username__startswith="import_").count() == 3
+    assert Tenant.objects.get(username="john").check_password("changed")
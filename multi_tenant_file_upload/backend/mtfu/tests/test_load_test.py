@@ -0,0 +1,107 @@
+import io
+import json
+
+import pytest
+
+from django.core.management import CommandError, call_command
+from mtfu.auth_user.models import Tenant
+from mtfu.benchmarks.load_test_impl import (
+    ENDPOINTS,
+    compare_results,
+    run_load_test,
+    summarize,
+)
+
+
+@pytest.fixture(autouse=True)
+def fast_hasher(settings):
+    settings.PASSWORD_HASHERS = ["django.contrib.auth.hashers.MD5PasswordHasher"]
+
+
+def test_summarize():
+    timings = [i / 1000 for i in range(1, 101)]
+    stats = summarize(timings, errors=5, elapsed=2)
+
+    assert stats["requests"] == 100
+    assert stats["error_rate"] == 0.05
+    assert stats["throughput"] == 50
+    assert stats["p50"] == pytest.approx(50.5)
+    assert stats["p95"] == pytest.approx(95.05)
+    assert stats["p99"] == pytest.approx(99.01)
+
+    assert summarize([0.2], errors=0, elapsed=1)["p99"] == pytest.approx(200)
+
+
+def test_compare_results():
+    baseline = {
+        "endpoints": {
+            "upload": {"p50": 10, "p95": 20, "p99": 40, "throughput": 100, "error_rate": 0},
+        }
+    }
+    results = {
+        "endpoints": {
+            "upload": {"p50": 11, "p95": 30, "p99": 40, "throughput": 70, "error_rate": 0.1},
+            "retrieve": {"p50": 1, "p95": 2, "p99": 3, "throughput": 5, "error_rate": 0},
+        }
+    }
+
+    lines, regressions = compare_results(results, baseline, tolerance=0.2)
+    # the endpoint missing from the baseline is not compared
+    assert len(lines) == 5
+    assert lines[0] == "upload p50: 10.00 -> 11.00 (+10%)"
+    assert regressions == [
+        "upload p95: 20.00 -> 30.00 (+50%)",
+        "upload throughput: 100.00 -> 70.00 (-30%)",
+        "upload error_rate: 0.00 -> 0.10 (+100%)",
+    ]
+
+
+@pytest.mark.django_db(transaction=True)
+def test_run_load_test(live_server):
+    # one client, the live server threads share the test database connection
+    results = run_load_test(
+        tenants=2, files=15, page_size=10, clients=1, count=6, base_url=live_server.url
+    )
+
+    assert set(results["endpoints"]) == set(ENDPOINTS)
+    for stats in results["endpoints"].values():
+        assert stats["requests"] == 6
+        assert stats["errors"] == 0
+    assert results["config"]["server"] == live_server.url
+    # the seeded tenants are deleted
+    assert not Tenant.objects.filter(username__startswith="load_test_").exists()
+
+
+@pytest.mark.django_db(transaction=True)
+def test_load_test_command(live_server, tmp_path):
+    baseline_path = tmp_path / "baseline.json"
+    options = ["--tenants=1", "--files=1", "--clients=1", "--requests=2"]
+    out = io.StringIO()
+    call_command(
+        "load_test",
+        *options,
+        f"--base-url={live_server.url}",
+        "--output",
+        baseline_path,
+        stdout=out,
+    )
+    assert out.getvalue().splitlines()[1].strip().startswith("upload")
+
+    baseline = json.loads(baseline_path.read_text())
+    assert baseline["config"]["requests"] == 2
+    baseline["endpoints"]["list_files"]["p95"] = 1e-6
+    baseline_path.write_text(json.dumps(baseline))
+
+    out = io.StringIO()
+    with pytest.raises(CommandError, match="1 metrics regressed"):
+        call_command(
+            "load_test",
+            *options,
+            f"--base-url={live_server.url}",
+            "--compare",
+            baseline_path,
+            # only the doctored metric, the others vary between runs
+            "--tolerance=1000",
+            stdout=out,
+        )
+    assert "list_files p95: 0.00 -> " in out.getvalue()
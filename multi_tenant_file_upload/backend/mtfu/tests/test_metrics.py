@@ -0,0 +1,112 @@
+from asgiref.sync import async_to_sync
+from django.conf import settings as django_settings
+from prometheus_client import REGISTRY
+from mtfu.file_manager.s3_utils import get_s3_client, run_s3
+from mtfu.metrics.collectors import REQUEST_STATS, RequestStats
+from mtfu.tests.utils import upload
+
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+def test_request_metrics(john_client, tmp_path):
+    count = sample(
+        "mtfu_request_duration_seconds_count",
+        endpoint="mtfu.files",
+        method="GET",
+        status="200",
+    )
+    db_queries = sample("mtfu_request_db_queries_sum", endpoint="mtfu.files")
+    presigns = sample("mtfu_request_presign_duration_seconds_sum", endpoint="mtfu.files")
+
+    upload(john_client, tmp_path, "metrics_file.txt")
+    response = john_client.get("/api/files/product/1")
+    assert response.status_code == 200
+
+    assert (
+        sample(
+            "mtfu_request_duration_seconds_count",
+            endpoint="mtfu.files",
+            method="GET",
+            status="200",
+        )
+        == count + 1
+    )
+    assert sample("mtfu_request_db_queries_sum", endpoint="mtfu.files") > db_queries
+    # the URL of the new file was not cached yet
+    assert (
+        sample("mtfu_request_presign_duration_seconds_sum", endpoint="mtfu.files") > presigns
+    )
+
+
+def test_unmatched_request(client):
+    count = sample(
+        "mtfu_request_duration_seconds_count", endpoint="unmatched", method="GET", status="404"
+    )
+    client.get("/api/no_such_endpoint")
+    assert (
+        sample(
+            "mtfu_request_duration_seconds_count",
+            endpoint="unmatched",
+            method="GET",
+            status="404",
+        )
+        == count + 1
+    )
+
+
+def test_s3_and_upload_metrics(john_client, tmp_path):
+    puts = sample("mtfu_s3_requests_total", operation="PutObject", status="200")
+    s3_time = sample("mtfu_request_s3_duration_seconds_sum", endpoint="mtfu.upload")
+    uploaded = sample("mtfu_upload_bytes_total", tenant="john")
+
+    upload(john_client, tmp_path, "metrics_upload.txt")
+
+    assert sample("mtfu_s3_requests_total", operation="PutObject", status="200") == puts + 1
+    assert sample("mtfu_s3_request_duration_seconds_count", operation="PutObject") > 0
+    assert sample("mtfu_request_s3_duration_seconds_sum", endpoint="mtfu.upload") > s3_time
+    assert sample("mtfu_upload_bytes_total", tenant="john") == uploaded + len(
+        b"metrics_upload.txt content"
+    )
+
+
+def test_s3_time_of_async_calls():
+    stats = RequestStats()
+
+    async def call():
+        REQUEST_STATS.set(stats)
+        await run_s3(
+            get_s3_client().head_bucket, Bucket=django_settings.AWS_STORAGE_BUCKET_NAME
+        )
+
+    async_to_sync(call)()
+    assert stats.s3_seconds > 0
+
+
+def test_metrics_endpoint(client, settings):
+    settings.METRICS_TOKEN = "scraper-token"
+    client.get("/api/list_files")
+    response = client.get("/metrics", HTTP_AUTHORIZATION="Bearer scraper-token")
+    assert response.status_code == 200
+    assert response["Content-Type"].startswith("text/plain")
+    assert (
+        b'mtfu_request_duration_seconds_bucket{endpoint="mtfu.list_files"' in response.content
+    )
+
+    assert client.get("/metrics").status_code == 401
+    assert client.get("/metrics", HTTP_AUTHORIZATION="Bearer other-token").status_code == 401
+
+
+def test_metrics_without_token(client, settings):
+    # the tenant names and upload volumes are not public by default
+    settings.METRICS_TOKEN = None
+    assert client.get("/metrics").status_code == 404
+    assert client.get("/metrics", HTTP_AUTHORIZATION="Bearer ").status_code == 404
+
+
+def test_metrics_disabled(client, settings):
+    settings.METRICS_ENABLED = False
+    settings.METRICS_TOKEN = "scraper-token"
+    response = client.get("/metrics", HTTP_AUTHORIZATION="Bearer scraper-token")
+    assert response.status_code == 404
@@ -0,0 +1,130 @@
+import hashlib
+
+import pytest
+import requests
+
+from mtfu.file_manager.models import File
+from mtfu.tests.utils import get_content_from_response, get_object_content, object_exists
+
+
+def presign(client, name="direct_file.txt"):
+    return client.post(
+        "/api/upload/presign",
+        {
+            "name": name,
+            "resource": "product",
+            "resource_id": 1,
+        },
+    )
+
+
+def confirm(client, key, name="direct_file.txt", **params):
+    return client.post(
+        "/api/upload/confirm",
+        {
+            "name": name,
+            "resource": "product",
+            "resource_id": 1,
+            "key": key,
+            **params,
+        },
+    )
+
+
+def post_to_s3(client, content, name="direct_file.txt"):
+    """Sends the file straight to S3 as a client does, returns its key."""
+    response = presign(client, name)
+    assert response.status_code == 200
+    s3_response = requests.post(
+        response.data["url"],
+        data=response.data["fields"],
+        files={"file": (name, content)},
+    )
+    assert s3_response.status_code in (200, 201, 204)
+    return response.data["key"]
+
+
+def test_presigned_upload(john_client):
+    key = post_to_s3(john_client, b"direct content")
+    assert key.startswith("staging/john/")
+    assert key.endswith("/direct_file.txt")
+
+    # nothing is recorded until the upload is confirmed
+    assert File.objects.count() == 0
+
+    response = confirm(
+        john_client,
+        key,
+        size=len(b"direct content"),
+        checksum=hashlib.sha256(b"direct content").hexdigest(),
+    )
+    assert response.status_code == 200
+
+    file = File.objects.get(name="direct_file.txt")
+    assert file.location == "asset_imgs/john/direct_file.txt"
+    assert file.tenant.username == "john"
+    assert file.size == len(b"direct content")
+    assert file.checksum == hashlib.sha256(b"direct content").hexdigest()
+    assert get_object_content(file.location) == b"direct content"
+    assert not object_exists(key)
+
+
+def test_unconfirmed_upload_keeps_the_file(john_client):
+    key = post_to_s3(john_client, b"direct content")
+    assert confirm(john_client, key).status_code == 200
+
+    # a second upload that is never confirmed does not touch the served content
+    post_to_s3(john_client, b"never confirmed")
+    file = File.objects.get(name="direct_file.txt")
+    assert get_object_content(file.location) == b"direct content"
+
+
+@pytest.mark.parametrize(
+    "params, message",
+    [
+        ({"size": 1}, "Size mismatch"),
+        ({"checksum": hashlib.sha256(b"other content").hexdigest()}, "Checksum mismatch"),
+    ],
+)
+def test_confirm_rejected_upload(john_client, params, message):
+    key = post_to_s3(john_client, b"direct content")
+
+    response = confirm(john_client, key, **params)
+    assert response.status_code == 400
+    assert get_content_from_response(response)["message"] == message
+    assert File.objects.count() == 0
+    assert not object_exists(key)
+
+
+@pytest.mark.parametrize(
+    "key",
+    [
+        "asset_imgs/john/direct_file.txt",
+        "staging/jimmy/0123456789abcdef0123456789abcdef/direct_file.txt",
+        "staging/john/0123456789abcdef0123456789abcdef/other_file.txt",
+        "staging/john/../direct_file.txt",
+    ],
+)
+def test_confirm_with_invalid_key(john_client, key):
+    response = confirm(john_client, key)
+    assert response.status_code == 400
+    assert get_content_from_response(response)["message"] == "Invalid upload key"
+
+
+def test_confirm_without_upload(john_client):
+    response = confirm(
+        john_client,
+        "staging/john/0123456789abcdef0123456789abcdef/never_uploaded.txt",
+        name="never_uploaded.txt",
+    )
+    assert response.status_code == 400
+    content = get_content_from_response(response)
+    assert content["message"] == "Uploaded file not found"
+    assert File.objects.count() == 0
+
+
+def test_presign_with_invalid_name(john_client):
+    response = presign(john_client, name="../jimmy/direct_file.txt")
+    assert response.status_code == 400
+    content = get_content_from_response(response)
+    assert content["name"] == ["Invalid file name"]
@@ -0,0 +1,81 @@
+import pytest
+
+from django.core.cache import caches
+from mtfu.file_manager import presigned_urls
+from mtfu.file_manager.presigned_urls import get_presigned_url, get_presigned_urls
+from mtfu.file_manager.s3_utils import get_s3_client
+
+
+@pytest.fixture(autouse=True)
+def clear_presigned_urls_cache(settings):
+    caches[settings.PRESIGNED_URLS_CACHE].clear()
+
+
+@pytest.fixture
+def signed_locations(monkeypatch):
+    # records every location that actually gets signed
+    locations = []
+    sign_urls = presigned_urls._sign_urls
+
+    def record_sign_urls(missing_locations):
+        locations.extend(missing_locations)
+        return sign_urls(missing_locations)
+
+    monkeypatch.setattr(presigned_urls, "_sign_urls", record_sign_urls)
+    return locations
+
+
+def test_s3_client_is_shared():
+    assert get_s3_client() is get_s3_client()
+
+
+def test_presigned_url_is_cached(signed_locations):
+    url = get_presigned_url("asset_imgs/john/a.txt")
+    assert "asset_imgs/john/a.txt" in url
+
+    assert get_presigned_url("asset_imgs/john/a.txt") == url
+    assert signed_locations == ["asset_imgs/john/a.txt"]
+
+
+def test_only_missing_presigned_urls_are_signed(signed_locations):
+    get_presigned_url("asset_imgs/john/a.txt")
+
+    urls = get_presigned_urls(["asset_imgs/john/a.txt", "asset_imgs/john/b.txt"])
+    assert set(urls) == {"asset_imgs/john/a.txt", "asset_imgs/john/b.txt"}
+    assert signed_locations == ["asset_imgs/john/a.txt", "asset_imgs/john/b.txt"]
+
+
+def test_presigned_url_is_cached_until_min_ttl(settings, monkeypatch):
+    timeouts = []
+    cache = caches[settings.PRESIGNED_URLS_CACHE]
+    set_many = cache.set_many
+
+    def record_set_many(data, timeout):
+        timeouts.append(timeout)
+        return set_many(data, timeout)
+
+    monkeypatch.setattr(cache, "set_many", record_set_many)
+    get_presigned_url("asset_imgs/john/a.txt")
+    assert timeouts == [
+        settings.AWS_S3_PRESIGNED_URLS_EXPIRE - settings.AWS_S3_PRESIGNED_URLS_MIN_TTL
+    ]
+
+
+def test_retrieve_files_signs_each_location_once(john_client, tmp_file, signed_locations):
+    with open(tmp_file, "rb") as file:
+        john_client.post(
+            "/api/upload",
+            {
+                "file": file,
+                "resource": "product",
+                "resource_id": 1,
+            },
+        )
+
+    response = john_client.get("/api/files/product/1")
+    url = response.data["files"][0]["url"]
+    assert "asset_imgs/john/test_file.txt" in url
+
+    response = john_client.get("/api/files/product/1")
+    assert response.data["files"][0]["url"] == url
+    assert signed_locations == ["asset_imgs/john/test_file.txt"]
@@ -0,0 +1,90 @@
+import threading
+import time
+
+import pytest
+
+from asgiref.sync import async_to_sync
+from django.core.exceptions import MiddlewareNotUsed
+from django.test import AsyncClient
+from mtfu.metrics.middleware import ProfilingMiddleware
+from mtfu.metrics.profiler import StackSampler
+
+
+@pytest.fixture
+def profiles(settings, tmp_path):
+    settings.PROFILING_TOKEN = "profile-token"
+    settings.PROFILING_DIR = str(tmp_path / "profiles")
+    settings.PROFILING_INTERVAL = 0.001
+    return tmp_path / "profiles"
+
+
+def test_profile_with_token(john_client, profiles):
+    response = john_client.get("/api/list_files", HTTP_X_PROFILE="profile-token")
+    assert response.status_code == 200
+
+    profile_id = response["X-Profile-Id"]
+    assert (profiles / f"{profile_id}.collapsed").exists()
+    queries = (profiles / f"{profile_id}.queries.log").read_text().splitlines()
+    assert queries[0].startswith("# GET /api/list_files 200 in ")
+    # the tenant of the JWT token, then the files
+    assert any("auth_user_tenant" in query for query in queries[1:])
+    assert any('FROM "file"' in query for query in queries[1:])
+
+
+def test_request_not_profiled(john_client, profiles):
+    response = john_client.get("/api/list_files", HTTP_X_PROFILE="wrong-token")
+    assert response.status_code == 200
+    assert "X-Profile-Id" not in response
+
+    assert "X-Profile-Id" not in john_client.get("/api/list_files")
+    assert not profiles.exists()
+
+
+def test_sample_rate(john_client, settings, tmp_path):
+    settings.PROFILING_SAMPLE_RATE = 1
+    settings.PROFILING_DIR = str(tmp_path)
+    assert "X-Profile-Id" in john_client.get("/api/list_files")
+
+
+def test_async_request(john_client, profiles):
+    headers = {
+        "Authorization": john_client._credentials["HTTP_AUTHORIZATION"],
+        "X-Profile": "profile-token",
+    }
+
+    async def get():
+        return await AsyncClient().get("/api/list_files", headers=headers)
+
+    response = async_to_sync(get)()
+    assert response.status_code == 200
+    assert (profiles / f"{response['X-Profile-Id']}.queries.log").exists()
+
+
+def test_disabled_by_default():
+    with pytest.raises(MiddlewareNotUsed):
+        ProfilingMiddleware(lambda request: None)
+
+
+def busy_function(stop):
+    while not stop.is_set():
+        sum(range(1000))
+
+
+def test_stack_sampler():
+    stop = threading.Event()
+    thread = threading.Thread(target=busy_function, args=(stop,))
+    thread.start()
+
+    sampler = StackSampler(thread.ident, interval=0.001).start()
+    time.sleep(0.1)
+    sampler.stop()
+    stop.set()
+    thread.join()
+
+    assert sampler.samples > 0
+    lines = sampler.collapsed().splitlines()
+    stack, count = lines[0].rsplit(" ", 1)
+    assert int(count) > 0
+    assert "busy_function (mtfu/tests/test_profiling.py:" in stack
+    # the root of the stack first
+    assert stack.index("Thread.run") < stack.index("busy_function")
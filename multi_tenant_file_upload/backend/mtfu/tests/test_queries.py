@@ -0,0 +1,43 @@
+import pytest
+
+# JWT authentication, the count and the page itself
+QUERIES_PER_PAGE = 3
+
+
+@pytest.fixture(params=[3, 30])
+def files(request, create_files, john, jimmy):
+    create_files(john, request.param)
+    create_files(jimmy, request.param, is_public=True)
+    return request.param * 2
+
+
+@pytest.mark.count_queries(autouse=False)
+def test_retrieve_files_queries(john_client, files, count_queries):
+    response = john_client.get("/api/files/product/1", {"page_size": 100})
+    assert len(response.data["files"]) == files
+    assert len(count_queries) == QUERIES_PER_PAGE
+
+
+@pytest.mark.count_queries(autouse=False)
+def test_list_files_queries(john_client, files, count_queries):
+    response = john_client.get("/api/list_files", {"page_size": 100})
+    assert len(response.data["files"]) == files
+    assert {file["tenant_username"] for file in response.data["files"]} == {"john", "jimmy"}
+    assert len(count_queries) == QUERIES_PER_PAGE
+
+
+@pytest.mark.count_queries(autouse=False)
+def test_list_files_by_tenant_queries(john_client, files, count_queries):
+    response = john_client.get("/api/list_files", {"tenant_username": "jimmy"})
+    assert len(response.data["files"]) == min(files // 2, 10)
+    assert len(count_queries) == QUERIES_PER_PAGE
+
+
+@pytest.mark.count_queries(autouse=False)
+def test_list_files_loads_only_returned_columns(john_client, files, count_queries):
+    john_client.get("/api/list_files")
+
+    page_query = count_queries.captured_queries[-1]["sql"]
+    assert "delete_flg" not in page_query.split("FROM")[0]
+    assert '"auth_user_tenant"."username"' in page_query
+    assert '"auth_user_tenant"."password"' not in page_query
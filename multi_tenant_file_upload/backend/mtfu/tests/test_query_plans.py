@@ -0,0 +1,110 @@
+import json
+import os
+
+import pytest
+
+from django.db import connection
+from django.db.models import Q
+from mtfu.auth_user.models import Tenant
+from mtfu.file_manager.models import File
+from mtfu.file_manager.pagination_utils import project_files
+
+pytestmark = pytest.mark.skipif(
+    connection.vendor != "postgresql", reason="uses the PostgreSQL planner"
+)
+
+# rows seeded in the file table, MTFU_PLAN_ROWS=100000 for a quicker run
+PLAN_ROWS = int(os.environ.get("MTFU_PLAN_ROWS", 1_000_000))
+PLAN_TENANTS = 1000
+PLAN_RESOURCE_IDS = 10000
+
+SEED_TENANTS_SQL = """
+INSERT INTO auth_user_tenant (username, password)
+SELECT 'plan_' || i, '' FROM generate_series(0, %s - 1) AS i
+"""
+
+# 1% public, 10% soft deleted and 10% expired files
+SEED_FILES_SQL = """
+INSERT INTO file (
+    tenant_id, name, location, expire_at, is_public, resource, resource_id, delete_flg
+)
+SELECT
+    first_tenant.id + i %% %s,
+    'file_' || lpad(i::text, 7, '0') || '.txt',
+    'asset_imgs/plan_' || i %% %s || '/file_' || lpad(i::text, 7, '0') || '.txt',
+    CASE WHEN i %% 10 = 2 THEN now() - interval '1 day' ELSE now() + interval '1 day' END,
+    i %% 100 = 0,
+    'product',
+    (i %% %s)::text,
+    i %% 10 = 1
+FROM generate_series(0, %s - 1) AS i,
+    (SELECT min(id) AS id FROM auth_user_tenant WHERE username LIKE 'plan_%%') AS first_tenant
+"""
+
+LIST_FIELDS = ["tenant_username", "resource", "resource_id", "name", "location", "is_public"]
+
+
+@pytest.fixture(scope="module")
+def plan_tenant(django_db_setup, django_db_blocker):
+    with django_db_blocker.unblock():
+        with connection.cursor() as cursor:
+            cursor.execute(SEED_TENANTS_SQL, [PLAN_TENANTS])
+            cursor.execute(
+                SEED_FILES_SQL, [PLAN_TENANTS, PLAN_TENANTS, PLAN_RESOURCE_IDS, PLAN_ROWS]
+            )
+            cursor.execute("ANALYZE file")
+            cursor.execute("ANALYZE auth_user_tenant")
+
+        yield Tenant.objects.get(username="plan_7")
+
+        with connection.cursor() as cursor:
+            cursor.execute("TRUNCATE file, auth_user_tenant CASCADE")
+
+
+def plan_nodes(files):
+    """Returns every node of the files' query plan."""
+    nodes = [json.loads(files.explain(format="json"))[0]["Plan"]]
+    for node in nodes:
+        nodes.extend(node.get("Plans", []))
+    return nodes
+
+
+def assert_no_seq_scan(nodes):
+    seq_scans = [
+        node
+        for node in nodes
+        if node["Node Type"] == "Seq Scan" and node["Relation Name"] == "file"
+    ]
+    assert not seq_scans, json.dumps(nodes, indent=2)
+
+
+def index_names(nodes):
+    return {node["Index Name"] for node in nodes if "Index Name" in node}
+
+
+def test_retrieve_files_plan(plan_tenant):
+    # FileView, the first page of one resource
+    files = File.objects.visible_to(plan_tenant).filter(resource="product", resource_id="7")
+    nodes = plan_nodes(project_files(files, ["name", "url"]).order_by("name")[:10])
+
+    assert_no_seq_scan(nodes)
+    assert "file_resource_live_idx" in index_names(nodes)
+
+
+def test_list_files_plan(plan_tenant):
+    # ListFilesView, the first page of the tenant's and the public files
+    files = File.objects.visible_to(plan_tenant)
+    nodes = plan_nodes(project_files(files, LIST_FIELDS).order_by("name")[:10])
+
+    assert_no_seq_scan(nodes)
+    assert "file_public_name_live_idx" in index_names(nodes)
+
+
+def test_list_files_by_tenant_cursor_plan(plan_tenant):
+    # ListFilesView?tenant_username=...&cursor=..., a page deep in the tenant's files
+    files = File.objects.visible_to(plan_tenant).filter(tenant__username=plan_tenant.username)
+    files = files.filter(Q(name__gt="file_0500000.txt") | Q(name="file_0500000.txt", id__gt=0))
+    nodes = plan_nodes(project_files(files, LIST_FIELDS).order_by("name", "id")[:11])
+
+    assert_no_seq_scan(nodes)
+    assert index_names(nodes) & {"file_tenant_name_live_idx", "file_public_name_live_idx"}
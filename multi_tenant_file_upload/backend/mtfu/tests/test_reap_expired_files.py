@@ -0,0 +1,43 @@
+from io import StringIO
+
+from dateutil.relativedelta import relativedelta
+from django.core.management import call_command
+from django.utils import timezone
+from mtfu.file_manager.models import File
+from mtfu.tests.utils import object_exists, upload
+
+
+def expire(**filters):
+    File.objects.filter(**filters).update(expire_at=timezone.now() - relativedelta(hours=1))
+
+
+def test_reap_expired_files(john_client, tmp_path):
+    for i in range(5):
+        upload(john_client, tmp_path, f"reap_file_{i}.txt")
+    upload(john_client, tmp_path, "reap_live.txt", resource_id=2)
+    expire(resource_id="1")
+
+    out = StringIO()
+    call_command("reap_expired_files", "--chunk-size", "2", stdout=out)
+
+    assert not File.objects.filter(resource_id="1").exists()
+    assert not object_exists("asset_imgs/john/reap_file_4.txt")
+    assert File.objects.filter(name="reap_live.txt").exists()
+    assert object_exists("asset_imgs/john/reap_live.txt")
+
+    lines = out.getvalue().splitlines()
+    # one line per chunk and the total
+    assert len(lines) == 4
+    assert lines[-1].startswith("Done: 5 files, 5 objects, 0 failed in ")
+    assert "files/s" in lines[-1]
+
+
+def test_reap_expired_files_keeps_shared_objects(john_client, tmp_path):
+    upload(john_client, tmp_path, "reap_shared.txt", resource_id=1)
+    upload(john_client, tmp_path, "reap_shared.txt", resource_id=2)
+    expire(resource_id="1")
+
+    call_command("reap_expired_files", stdout=StringIO())
+
+    assert File.objects.filter(name="reap_shared.txt").count() == 1
+    assert object_exists("asset_imgs/john/reap_shared.txt")
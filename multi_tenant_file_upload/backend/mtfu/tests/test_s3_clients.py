@@ -0,0 +1,90 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from mtfu.file_manager.s3_utils import S3_SESSION, S3ClientRegistry, get_s3_client
+from mtfu.tests.test_metrics import sample
+
+
+@pytest.fixture
+def registry():
+    return S3ClientRegistry(S3_SESSION)
+
+
+def test_threads_share_the_client(registry):
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        clients = list(executor.map(lambda _: registry.get(), range(32)))
+    assert all(client is clients[0] for client in clients)
+
+
+def test_one_client_per_signature_version(registry):
+    assert registry.get(signature_version="s3v4") is registry.get(signature_version="s3v4")
+    assert registry.get(signature_version="s3v4") is not registry.get()
+
+
+def test_reset_creates_new_clients(registry):
+    client = registry.get()
+    registry.reset()
+    assert registry.get() is not client
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="needs fork")
+def test_forked_child_creates_its_own_client():
+    client = get_s3_client()
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        # the child must not reuse the parent's connections
+        os.write(write_fd, b"1" if get_s3_client() is not client else b"0")
+        os._exit(0)
+    os.waitpid(pid, 0)
+    assert os.read(read_fd, 1) == b"1"
+    assert get_s3_client() is client
+
+
+def test_client_config(registry, settings):
+    settings.AWS_S3_MAX_POOL_CONNECTIONS = 7
+    settings.AWS_S3_CONNECT_TIMEOUT = 2
+    settings.AWS_S3_READ_TIMEOUT = 9
+    settings.AWS_S3_MAX_ATTEMPTS = 4
+
+    config = registry.get().meta.config
+    assert config.max_pool_connections == 7
+    assert config.connect_timeout == 2
+    assert config.read_timeout == 9
+    assert config.tcp_keepalive is True
+    assert config.retries == {"total_max_attempts": 4, "mode": "standard"}
+
+
+def test_pool_stats(registry, settings):
+    registry.warm_up()
+    registry.get().head_bucket(Bucket=settings.AWS_STORAGE_BUCKET_NAME)
+
+    stats = registry.stats()
+    assert list(stats) == ["default"]
+    assert stats["default"]["max_pool_connections"] == settings.AWS_S3_MAX_POOL_CONNECTIONS
+    for pool in stats["default"]["pools"]:
+        assert set(pool) == {"host", "connections_opened", "requests", "idle_connections"}
+
+
+def test_pool_stats_without_the_private_attributes(registry, monkeypatch):
+    client = registry.get()
+    monkeypatch.setattr(client, "_endpoint", object())
+
+    assert registry.stats() == {
+        "default": {
+            "max_pool_connections": client.meta.config.max_pool_connections,
+            "pools": [],
+        }
+    }
+
+
+def test_pool_metrics(registry, settings):
+    registry.get().head_bucket(Bucket=settings.AWS_STORAGE_BUCKET_NAME)
+
+    max_connections = sample("mtfu_s3_pool_max_connections")
+    assert max_connections == settings.AWS_S3_MAX_POOL_CONNECTIONS
+    assert sample("mtfu_s3_pool_connections_opened") == sum(
+        pool["connections_opened"] for pool in registry.stats()["default"]["pools"]
+    )
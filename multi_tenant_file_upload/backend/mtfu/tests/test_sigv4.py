@@ -0,0 +1,78 @@
+import datetime
+from urllib.parse import parse_qs, urlsplit
+
+import boto3
+import pytest
+from botocore.config import Config
+from mtfu.file_manager.sigv4 import PresignedUrlSigner, get_signing_key
+
+KEYS = [
+    "asset_imgs/john/test_file.txt",
+    "asset_imgs/john/a b+c~é.txt",
+    "asset_imgs/john/%2F?#&=;.txt",
+    "/leading//double_slash",
+]
+
+
+def botocore_url(session, bucket, key, expires_in, **client_kwargs):
+    s3_client = session.client("s3", config=Config(signature_version="s3v4"), **client_kwargs)
+    return s3_client.generate_presigned_url(
+        "get_object", Params={"Bucket": bucket, "Key": key}, ExpiresIn=expires_in
+    )
+
+
+def signed_at(url):
+    amz_date = parse_qs(urlsplit(url).query)["X-Amz-Date"][0]
+    return datetime.datetime.strptime(amz_date, "%Y%m%dT%H%M%SZ").replace(
+        tzinfo=datetime.timezone.utc
+    )
+
+
+@pytest.mark.parametrize(
+    "region_name, endpoint_url, token",
+    [
+        ("us-east-1", None, None),
+        ("ap-northeast-1", None, None),
+        ("eu-west-1", None, "session/token="),
+        ("eu-west-1", "http://localhost:9000", None),
+        ("us-west-2", "https://s3.example.com:8443", "session/token="),
+    ],
+)
+@pytest.mark.parametrize("bucket", ["mtfu-bucket", "mtfu.bucket"])
+def test_presigned_urls_match_botocore(region_name, endpoint_url, token, bucket):
+    session = boto3.session.Session(
+        aws_access_key_id="AKIDEXAMPLE",
+        aws_secret_access_key="wJalrXUtnFEMI/K7MDENG+bPxRfiCYEXAMPLEKEY",
+        aws_session_token=token,
+        region_name=region_name,
+    )
+    signer = PresignedUrlSigner(session, endpoint_url=endpoint_url)
+
+    for key in KEYS:
+        expected = botocore_url(session, bucket, key, 3600, endpoint_url=endpoint_url)
+        urls = signer.presign_get_objects(bucket, [key], 3600, now=signed_at(expected))
+        assert urls[key] == expected
+
+
+def test_presigned_urls_are_signed_in_one_batch():
+    session = boto3.session.Session(
+        aws_access_key_id="AKIDEXAMPLE",
+        aws_secret_access_key="wJalrXUtnFEMI/K7MDENG+bPxRfiCYEXAMPLEKEY",
+        region_name="ap-northeast-1",
+    )
+    signer = PresignedUrlSigner(session)
+    now = datetime.datetime(2023, 5, 15, 12, 30, tzinfo=datetime.timezone.utc)
+
+    get_signing_key.cache_clear()
+    urls = signer.presign_get_objects("mtfu-bucket", KEYS, 600, now=now)
+
+    assert list(urls) == KEYS
+    # one signing key for the whole batch
+    assert get_signing_key.cache_info().misses == 1
+    for url in urls.values():
+        query = parse_qs(urlsplit(url).query)
+        assert query["X-Amz-Date"] == ["20230515T123000Z"]
+        assert query["X-Amz-Expires"] == ["600"]
+        assert query["X-Amz-Credential"] == [
+            "AKIDEXAMPLE/20230515/ap-northeast-1/s3/aws4_request"
+        ]
@@ -0,0 +1,190 @@
+import hashlib
+import io
+import time
+
+import pytest
+
+from django.core.exceptions import ImproperlyConfigured
+from rest_framework.test import APIClient
+from mtfu.file_manager.storage import StorageError, get_storage
+from mtfu.tests.utils import get_content_from_response, upload
+
+
+@pytest.fixture(params=["local", "memory"])
+def storage(request, settings, tmp_path):
+    settings.STORAGE_ENGINE = request.param
+    settings.LOCAL_STORAGE_ROOT = str(tmp_path / "storage")
+    engine = get_storage()
+    if request.param == "memory":
+        engine.clear()
+    return engine
+
+
+def download(url):
+    response = APIClient().get(url)
+    content = b"".join(response.streaming_content) if response.status_code == 200 else None
+    return response, content
+
+
+def test_save_open_delete(storage):
+    storage.save("asset_imgs/john/a.txt", io.BytesIO(b"a content"))
+    assert storage.exists("asset_imgs/john/a.txt")
+    with storage.open("asset_imgs/john/a.txt") as file:
+        assert file.read() == b"a content"
+
+    storage.delete("asset_imgs/john/a.txt")
+    assert not storage.exists("asset_imgs/john/a.txt")
+    with pytest.raises(StorageError):
+        storage.open("asset_imgs/john/a.txt")
+
+
+def test_delete_many(storage):
+    for name in ("a.txt", "b.txt"):
+        storage.save(f"asset_imgs/john/{name}", io.BytesIO(b"content"))
+
+    failed = storage.delete_many(["asset_imgs/john/a.txt", "asset_imgs/john/b.txt"])
+    assert failed == set()
+    assert not storage.exists("asset_imgs/john/a.txt")
+    assert not storage.exists("asset_imgs/john/b.txt")
+
+
+def test_get_sha256(storage):
+    storage.save("asset_imgs/john/a.txt", io.BytesIO(b"a content"))
+    assert (
+        storage.get_sha256("asset_imgs/john/a.txt") == hashlib.sha256(b"a content").hexdigest()
+    )
+
+
+def test_move(storage):
+    storage.save("asset_imgs/john/a.txt", io.BytesIO(b"old content"))
+    storage.save("staging/john/1/a.txt", io.BytesIO(b"new content"))
+
+    etag = storage.move("staging/john/1/a.txt", "asset_imgs/john/a.txt")
+    assert etag == storage.stat("asset_imgs/john/a.txt")["etag"]
+    assert not storage.exists("staging/john/1/a.txt")
+    with storage.open("asset_imgs/john/a.txt") as file:
+        assert file.read() == b"new content"
+
+    with pytest.raises(StorageError):
+        storage.move("staging/john/1/a.txt", "asset_imgs/john/a.txt")
+
+
+def test_multipart(storage):
+    upload_id = storage.start_multipart("asset_imgs/john/parts.txt")
+    etags = {
+        part_number: storage.upload_part(
+            "asset_imgs/john/parts.txt", upload_id, part_number, body
+        )
+        for part_number, body in [(2, b"second"), (1, b"first ")]
+    }
+    storage.complete_multipart(
+        "asset_imgs/john/parts.txt", upload_id, [(1, etags[1]), (2, etags[2])]
+    )
+
+    with storage.open("asset_imgs/john/parts.txt") as file:
+        assert file.read() == b"first second"
+
+
+def test_abort_multipart(storage):
+    upload_id = storage.start_multipart("asset_imgs/john/aborted.txt")
+    storage.upload_part("asset_imgs/john/aborted.txt", upload_id, 1, b"part")
+    storage.abort_multipart("asset_imgs/john/aborted.txt", upload_id)
+
+    assert not storage.exists("asset_imgs/john/aborted.txt")
+    with pytest.raises(StorageError):
+        storage.upload_part("asset_imgs/john/aborted.txt", upload_id, 2, b"part")
+
+
+def test_direct_uploads_are_not_supported(storage):
+    with pytest.raises(StorageError):
+        storage.presign_upload("asset_imgs/john/direct.txt", 1024, 60)
+
+
+def test_local_storage_stays_in_its_root(settings, tmp_path):
+    settings.STORAGE_ENGINE = "local"
+    settings.LOCAL_STORAGE_ROOT = str(tmp_path / "storage")
+
+    with pytest.raises(StorageError):
+        get_storage().save("../outside.txt", io.BytesIO(b"content"))
+    assert not (tmp_path / "outside.txt").exists()
+
+
+def test_memory_storage_latency(settings):
+    settings.STORAGE_ENGINE = "memory"
+    settings.MEMORY_STORAGE_LATENCY = 0.05
+
+    start = time.perf_counter()
+    get_storage().save("asset_imgs/john/slow.txt", io.BytesIO(b"content"))
+    assert time.perf_counter() - start >= 0.05
+
+
+def test_unknown_storage_engine(settings):
+    settings.STORAGE_ENGINE = "tape"
+    with pytest.raises(ImproperlyConfigured):
+        get_storage()
+
+
+def test_upload_and_download(storage, john_client, tmp_path):
+    upload(john_client, tmp_path, "stored_file.txt")
+
+    response = john_client.get("/api/files/product/1")
+    assert response.status_code == 200
+    url = response.data["files"][0]["url"]
+
+    response, content = download(url)
+    assert response.status_code == 200
+    assert content == b"stored_file.txt content"
+    assert response["Content-Disposition"] == 'inline; filename="stored_file.txt"'
+
+
+def test_download_with_invalid_signature(storage, john_client, tmp_path):
+    upload(john_client, tmp_path, "signed_file.txt")
+    url = storage.get_url("asset_imgs/john/signed_file.txt")
+
+    response, _ = download(url.replace("signed_file", "other_file"))
+    assert response.status_code == 403
+
+    response, _ = download(url[:-1] + ("A" if url[-1] != "A" else "B"))
+    assert response.status_code == 403
+    assert get_content_from_response(response) == {"message": "Invalid or expired signature"}
+
+
+def test_download_of_a_removed_file(storage, john_client, tmp_path):
+    upload(john_client, tmp_path, "removed_file.txt")
+    url = storage.get_url("asset_imgs/john/removed_file.txt")
+    storage.delete("asset_imgs/john/removed_file.txt")
+
+    response, _ = download(url)
+    assert response.status_code == 404
+
+
+def test_expired_download_url(storage, settings):
+    storage.save("asset_imgs/john/expired.txt", io.BytesIO(b"content"))
+    url = storage.get_url("asset_imgs/john/expired.txt")
+
+    # the URL was signed more than -1 seconds ago
+    settings.AWS_S3_PRESIGNED_URLS_EXPIRE = -1
+    response, _ = download(url)
+    assert response.status_code == 403
+
+
+def test_upload_session(storage, john_client):
+    response = john_client.post(
+        "/api/upload_sessions",
+        {"name": "session_file.txt", "resource": "product", "resource_id": 1},
+    )
+    assert response.status_code == 201
+    session_id = response.data["session_id"]
+
+    for part_number, body in [(1, b"first "), (2, b"second")]:
+        response = john_client.put(
+            f"/api/upload_sessions/{session_id}/parts/{part_number}",
+            body,
+            content_type="application/octet-stream",
+        )
+        assert response.status_code == 200
+
+    response = john_client.post(f"/api/upload_sessions/{session_id}/complete")
+    assert response.status_code == 200
+    with storage.open("asset_imgs/john/session_file.txt") as file:
+        assert file.read() == b"first second"
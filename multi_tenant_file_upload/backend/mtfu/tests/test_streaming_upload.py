@@ -0,0 +1,147 @@
+import pytest
+
+from django.conf import settings as django_settings
+from mtfu.file_manager.models import File
+from mtfu.file_manager.storage import get_storage
+from mtfu.tests.utils import (
+    get_content_from_response,
+    get_object_content,
+    object_exists,
+    upload,
+)
+
+
+@pytest.fixture
+def multi_part_file(tmp_path):
+    # spans two S3 parts
+    file_path = tmp_path / "multi_part_file.bin"
+    file_path.write_bytes(b"a" * django_settings.S3_STREAMING_PART_SIZE + b"b" * 1024)
+    return file_path
+
+
+def test_streaming_upload(john_client, tmp_file):
+    with open(tmp_file, "rb") as file:
+        response = john_client.post(
+            "/api/upload/stream",
+            {
+                "file": file,
+                "resource": "product",
+                "resource_id": 1,
+            },
+        )
+        assert response.status_code == 200
+
+    file = File.objects.get(name="test_file.txt")
+    assert file.location == "asset_imgs/john/test_file.txt"
+    assert get_object_content(file.location) == b"test content"
+
+
+def test_streaming_upload_multi_part(john_client, multi_part_file):
+    with open(multi_part_file, "rb") as file:
+        response = john_client.post(
+            "/api/upload/stream",
+            {
+                "file": file,
+                "resource": "product",
+                "resource_id": 1,
+            },
+        )
+        assert response.status_code == 200
+
+    file = File.objects.get(name="multi_part_file.bin")
+    assert get_object_content(file.location) == multi_part_file.read_bytes()
+
+
+def test_streaming_upload_too_big(john_client, tmp_path, settings):
+    settings.MAX_STREAMING_FILE_SIZE = 1024
+    too_big_file = tmp_path / "too_big_file.bin"
+    too_big_file.write_bytes(b"a" * 2048)
+
+    with open(too_big_file, "rb") as file:
+        response = john_client.post(
+            "/api/upload/stream",
+            {
+                "file": file,
+                "resource": "product",
+                "resource_id": 1,
+            },
+        )
+        assert response.status_code == 400
+        content = get_content_from_response(response)
+        assert content["file"] == ["File size exceeds the maximum allowed size of 1024 bytes"]
+
+    assert File.objects.count() == 0
+    assert not object_exists("asset_imgs/john/too_big_file.bin")
+
+
+def test_streaming_upload_without_resource(john_client, tmp_path):
+    invalid_file = tmp_path / "invalid_file.txt"
+    invalid_file.write_text("test content")
+
+    with open(invalid_file, "rb") as file:
+        response = john_client.post(
+            "/api/upload/stream",
+            {
+                "file": file,
+                "resource_id": 1,
+            },
+        )
+        assert response.status_code == 400
+        content = get_content_from_response(response)
+        assert content["resource"] == ["No resource found."]
+
+    # the streamed object is removed again
+    assert not object_exists("asset_imgs/john/invalid_file.txt")
+
+
+@pytest.mark.parametrize(
+    "data",
+    [{"resource": "product"}, {"resource": "product", "resource_id": 1, "checksum": "0" * 64}],
+)
+def test_rejected_streaming_upload_keeps_existing_file(john_client, tmp_path, data):
+    upload(john_client, tmp_path, "kept_file.txt")
+    file = File.objects.get(name="kept_file.txt")
+
+    replacement = tmp_path / "replacement" / "kept_file.txt"
+    replacement.parent.mkdir()
+    replacement.write_text("replacement content")
+    with open(replacement, "rb") as upload_file:
+        response = john_client.post("/api/upload/stream", {"file": upload_file, **data})
+        assert response.status_code == 400
+
+    assert get_object_content(file.location) == b"kept_file.txt content"
+    assert john_client.get(f"/api/download/{file.id}").status_code == 200
+
+
+def test_multi_part_upload_is_completed_in_place(john_client, multi_part_file, monkeypatch):
+    storage_class = type(get_storage())
+    abort_multipart = storage_class.abort_multipart
+    aborted = []
+
+    def recording_abort(self, location, upload_id):
+        aborted.append(location)
+        return abort_multipart(self, location, upload_id)
+
+    def move(self, source, destination):
+        raise AssertionError("the upload is copied again")
+
+    monkeypatch.setattr(storage_class, "abort_multipart", recording_abort)
+    monkeypatch.setattr(storage_class, "move", move)
+    # a name no other test stored
+    multi_part_file = multi_part_file.rename(multi_part_file.with_name("in_place_file.bin"))
+
+    def post(**data):
+        with open(multi_part_file, "rb") as file:
+            return john_client.post(
+                "/api/upload/stream",
+                {"file": file, "resource": "product", "resource_id": 1, **data},
+            )
+
+    # a rejected upload is aborted before anything is stored
+    assert post(checksum="0" * 64).status_code == 400
+    assert aborted == ["asset_imgs/john/in_place_file.bin"]
+    assert not object_exists("asset_imgs/john/in_place_file.bin")
+
+    assert post().status_code == 200
+    file = File.objects.get(name="in_place_file.bin")
+    assert get_object_content(file.location) == multi_part_file.read_bytes()
@@ -0,0 +1,113 @@
+from datetime import timedelta
+
+import pytest
+
+from django.db.models import F
+from django.utils import timezone
+from mtfu.auth_user.models import TokenBucket, UploadLease
+from mtfu.file_manager.models import File
+from mtfu.tests.utils import get_content_from_response
+
+
+def upload(client, tmp_path, name, content=b"content"):
+    file_path = tmp_path / name
+    file_path.write_bytes(content)
+    with open(file_path, "rb") as file:
+        return client.post(
+            "/api/upload", {"file": file, "resource": "product", "resource_id": 1}
+        )
+
+
+def test_bucket(john):
+    assert TokenBucket.take(john, "test", rate=10, capacity=2) == 0
+    assert TokenBucket.take(john, "test", rate=10, capacity=2) == 0
+    assert TokenBucket.take(john, "test", rate=10, capacity=2) == pytest.approx(0.1, abs=0.01)
+
+    # one second later the bucket is full again, not more
+    TokenBucket.objects.filter(tenant=john, name="test").update(updated_at=F("updated_at") - 1)
+    assert TokenBucket.take(john, "test", rate=10, capacity=2, cost=2) == 0
+    assert TokenBucket.take(john, "test", rate=10, capacity=2) > 0
+
+
+def test_cost_above_capacity_leaves_a_debt(john):
+    assert TokenBucket.take(john, "bytes", rate=100, capacity=1000, cost=1500) == 0
+    # 500 bytes of debt, then 1000 to take
+    assert TokenBucket.take(
+        john, "bytes", rate=100, capacity=1000, cost=1000
+    ) == pytest.approx(15, abs=0.1)
+
+
+def test_request_rate(settings, john_client, jimmy_client):
+    settings.TENANT_REQUEST_RATE = 1
+    settings.TENANT_REQUEST_BURST = 2
+
+    assert john_client.get("/api/list_files").status_code == 200
+    assert john_client.get("/api/list_files").status_code == 200
+    response = john_client.get("/api/list_files")
+    assert response.status_code == 429
+    assert response["Retry-After"] == "1"
+
+    # the other tenants have their own bucket
+    assert jimmy_client.get("/api/list_files").status_code == 200
+
+
+def test_upload_bytes_rate(settings, john_client, tmp_path):
+    settings.TENANT_UPLOAD_BYTES_RATE = 100
+    settings.TENANT_UPLOAD_BYTES_BURST = 1000
+
+    response = upload(john_client, tmp_path, "throttled_1.txt", b"x" * 800)
+    assert response.status_code == 200
+
+    response = upload(john_client, tmp_path, "throttled_2.txt", b"x" * 800)
+    assert response.status_code == 429
+    assert int(response["Retry-After"]) > 10
+    assert not File.objects.filter(name="throttled_2.txt").exists()
+
+    # the other endpoints do not count the bytes
+    assert john_client.get("/api/list_files").status_code == 200
+
+
+def test_concurrent_uploads(settings, john, john_client, tmp_path):
+    settings.TENANT_MAX_CONCURRENT_UPLOADS = 1
+    lease_id = UploadLease.acquire(john, 1, ttl=600)
+
+    response = upload(john_client, tmp_path, "concurrent.txt")
+    assert response.status_code == 429
+    assert response["Retry-After"] == "1"
+    assert get_content_from_response(response)["detail"].startswith(
+        "Too many concurrent uploads."
+    )
+
+    UploadLease.release(lease_id)
+    assert upload(john_client, tmp_path, "concurrent.txt").status_code == 200
+    # released with the response, an error response too
+    assert not UploadLease.objects.exists()
+    response = john_client.post("/api/upload", {"resource": "product", "resource_id": 1})
+    assert response.status_code == 400
+    assert not UploadLease.objects.exists()
+
+
+def test_lease_released_when_the_view_raises(settings, john_client, tmp_path, monkeypatch):
+    settings.TENANT_MAX_CONCURRENT_UPLOADS = 1
+
+    def create(*args, **kwargs):
+        raise RuntimeError("storage bug")
+
+    monkeypatch.setattr(File, "create", create)
+    with pytest.raises(RuntimeError):
+        upload(john_client, tmp_path, "raising.txt")
+    assert not UploadLease.objects.exists()
+
+
+def test_expired_lease_does_not_count(settings, john, john_client, tmp_path):
+    settings.TENANT_MAX_CONCURRENT_UPLOADS = 1
+    UploadLease.objects.create(tenant=john, expire_at=timezone.now() - timedelta(seconds=1))
+
+    assert upload(john_client, tmp_path, "after_dead_worker.txt").status_code == 200
+
+
+def test_limits_off_by_default(john_client, tmp_path):
+    for i in range(3):
+        assert upload(john_client, tmp_path, f"unthrottled_{i}.txt").status_code == 200
+    assert not TokenBucket.objects.exists()
+    assert not UploadLease.objects.exists()
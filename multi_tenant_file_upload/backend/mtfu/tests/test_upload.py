@@ -7,47 +7,10 @@ os.environ.setdefault("DJANGO_SETTINGS_MODULE", "mtfu.settings")
 django.setup()
 
 from rest_framework.test import APIClient
-from mtfu.auth_user.models import Tenant
 from mtfu.file_manager.models import File
 from mtfu.tests.utils import get_content_from_response
 
 
-@pytest.fixture
-def john():
-    return Tenant.create("john", "mypassword")
-
-
-@pytest.fixture
-def jimmy():
-    return Tenant.create("jimmy", "mypassword")
-
-
-@pytest.fixture
-def john_client(john):
-    return api_client(john)
-
-
-@pytest.fixture
-def jimmy_client(jimmy):
-    return api_client(jimmy)
-
-
-def api_client(tenant):
-    token_data = {
-        "username": tenant.username,
-        "password": "mypassword",
-    }
-    token_response = APIClient().post("/api/token/", data=token_data)
-
-    token = token_response.data["access"]
-
-    # Create an authenticated test client using the JWT token
-    client = APIClient()
-    client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
-
-    return client
-
-
 @pytest.fixture
 def tmp_files(tmp_path):
     # Generate files with different names and content
@@ -60,14 +23,6 @@ def tmp_files(tmp_path):
     return files
 
 
-@pytest.fixture
-def tmp_file(tmp_path):
-    file_path = tmp_path / "test_file.txt"
-    with open(file_path, "w") as f:
-        f.write("test content")
-    return file_path
-
-
 def test_upload_tmp_files(tmp_files, john_client):
     # Upload the files
     for file_path in tmp_files:
@@ -0,0 +1,168 @@
+import pytest
+
+from rest_framework.test import APIClient
+from mtfu.file_manager.models import File, UploadSession
+from mtfu.file_manager.storage import get_storage
+from mtfu.tests.utils import get_content_from_response
+
+FIRST_PART = b"a" * 1024 * 1024 * 5
+LAST_PART = b"b" * 1024
+
+
+def start_session(client, name="big_file.bin", resource="product", resource_id=1):
+    return client.post(
+        "/api/upload_sessions",
+        {
+            "name": name,
+            "resource": resource,
+            "resource_id": resource_id,
+        },
+    )
+
+
+def put_part(client, session_id, part_number, body):
+    return client.put(
+        f"/api/upload_sessions/{session_id}/parts/{part_number}",
+        data=body,
+        content_type="application/octet-stream",
+    )
+
+
+@pytest.fixture
+def session_id(john_client):
+    response = start_session(john_client)
+    assert response.status_code == 201
+    return response.data["session_id"]
+
+
+def test_upload_session(john_client, session_id):
+    assert put_part(john_client, session_id, 1, FIRST_PART).status_code == 200
+    assert put_part(john_client, session_id, 2, LAST_PART).status_code == 200
+
+    # the file only appears once the session is completed
+    assert File.objects.count() == 0
+
+    response = john_client.post(f"/api/upload_sessions/{session_id}/complete")
+    assert response.status_code == 200
+
+    file = File.objects.get(name="big_file.bin")
+    assert file.location == "asset_imgs/john/big_file.bin"
+    assert file.resource == "product"
+    assert file.resource_id == "1"
+
+    session = UploadSession.objects.get(id=session_id)
+    assert session.status == UploadSession.STATUS_COMPLETED
+
+    # completing again is a no-op
+    response = john_client.post(f"/api/upload_sessions/{session_id}/complete")
+    assert response.status_code == 200
+    assert File.objects.count() == 1
+
+
+def test_upload_session_retry_part(john_client, session_id):
+    assert put_part(john_client, session_id, 1, b"lost" * 100).status_code == 200
+    assert put_part(john_client, session_id, 1, FIRST_PART).status_code == 200
+    assert put_part(john_client, session_id, 2, LAST_PART).status_code == 200
+
+    response = john_client.get(f"/api/upload_sessions/{session_id}")
+    assert response.status_code == 200
+    assert [part["part_number"] for part in response.data["parts"]] == [1, 2]
+    assert response.data["parts"][0]["size"] == len(FIRST_PART)
+
+    response = john_client.post(f"/api/upload_sessions/{session_id}/complete")
+    assert response.status_code == 200
+    assert File.objects.filter(name="big_file.bin").exists()
+
+
+def test_complete_upload_session_after_record_failure(john_client, session_id, monkeypatch):
+    assert put_part(john_client, session_id, 1, FIRST_PART).status_code == 200
+    assert put_part(john_client, session_id, 2, LAST_PART).status_code == 200
+
+    def fail(*args, **kwargs):
+        raise RuntimeError("database is unavailable")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(File, "_create_file_object", fail)
+        response = john_client.post(f"/api/upload_sessions/{session_id}/complete")
+    assert response.status_code == 400
+    assert get_content_from_response(response)["message"] == "File save failed"
+    assert not File.objects.exists()
+
+    # the assembled object is kept for the retry
+    session = UploadSession.objects.get(id=session_id)
+    assert session.status == UploadSession.STATUS_ASSEMBLED
+    assert session.size == len(FIRST_PART) + len(LAST_PART)
+
+    response = john_client.post(f"/api/upload_sessions/{session_id}/complete")
+    assert response.status_code == 200
+
+    file = File.objects.get(name="big_file.bin")
+    assert file.etag == session.etag
+    assert file.size == len(FIRST_PART) + len(LAST_PART)
+    with get_storage().open(file.location) as content:
+        assert content.read() == FIRST_PART + LAST_PART
+
+    session.refresh_from_db()
+    assert session.status == UploadSession.STATUS_COMPLETED
+
+
+def test_abort_upload_session(john_client, session_id):
+    assert put_part(john_client, session_id, 1, FIRST_PART).status_code == 200
+
+    response = john_client.delete(f"/api/upload_sessions/{session_id}")
+    assert response.status_code == 200
+
+    response = put_part(john_client, session_id, 2, LAST_PART)
+    assert response.status_code == 400
+    content = get_content_from_response(response)
+    assert content["message"] == "Upload session is not in progress"
+
+    response = john_client.post(f"/api/upload_sessions/{session_id}/complete")
+    assert response.status_code == 400
+    assert File.objects.count() == 0
+
+
+def test_complete_upload_session_without_parts(john_client, session_id):
+    response = john_client.post(f"/api/upload_sessions/{session_id}/complete")
+    assert response.status_code == 400
+    content = get_content_from_response(response)
+    assert content["message"] == "No parts were uploaded"
+
+
+def test_upload_empty_part(john_client, session_id):
+    response = put_part(john_client, session_id, 1, b"")
+    assert response.status_code == 400
+    content = get_content_from_response(response)
+    assert content["message"] == "Empty part"
+
+
+def test_upload_part_with_invalid_part_number(john_client, session_id):
+    response = put_part(john_client, session_id, 10001, LAST_PART)
+    assert response.status_code == 400
+    content = get_content_from_response(response)
+    assert content["message"] == "Part number must be between 1 and 10000"
+
+
+def test_upload_session_of_another_tenant(jimmy_client, session_id):
+    assert put_part(jimmy_client, session_id, 1, LAST_PART).status_code == 404
+    assert jimmy_client.get(f"/api/upload_sessions/{session_id}").status_code == 404
+    assert jimmy_client.post(f"/api/upload_sessions/{session_id}/complete").status_code == 404
+    assert jimmy_client.delete(f"/api/upload_sessions/{session_id}").status_code == 404
+
+
+def test_start_upload_session_without_name(john_client):
+    response = john_client.post(
+        "/api/upload_sessions",
+        {
+            "resource": "product",
+            "resource_id": 1,
+        },
+    )
+    assert response.status_code == 400
+    content = get_content_from_response(response)
+    assert content["name"] == ["No file name found."]
+
+
+def test_upload_session_with_unauthorized_user():
+    response = start_session(APIClient())
+    assert response.status_code == 401
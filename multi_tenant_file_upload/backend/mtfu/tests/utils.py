@@ -1,5 +1,33 @@
 import json
 
+from mtfu.file_manager.storage import get_storage
+
 
 def get_content_from_response(response):
     return json.loads(response.content.decode("utf8"))
+
+
+def get_object_content(location):
+    with get_storage().open(location) as file:
+        return file.read()
+
+
+def object_exists(location):
+    return get_storage().exists(location)
+
+
+def upload(client, tmp_path, name, resource_id=1):
+    """Uploads a small text file named name for the product resource_id."""
+    file_path = tmp_path / name
+    file_path.write_text(f"{name} content")
+    with open(file_path, "rb") as file:
+        response = client.post(
+            "/api/upload",
+            {
+                "file": file,
+                "resource": "product",
+                "resource_id": resource_id,
+            },
+        )
+    assert response.status_code == 200
+    return response
@@ -0,0 +1,4 @@
+from mtfu.benchmarks.bench_async_views_impl import bench_async_views
+
+# Uploads and retrieves per second, one sync gunicorn worker vs one async uvicorn worker
+bench_async_views()
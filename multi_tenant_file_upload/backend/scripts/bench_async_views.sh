@@ -0,0 +1,4 @@
+#!/bin/bash
+
+set -e;
+python3 manage.py shell < ./scripts/bench_async_views.py
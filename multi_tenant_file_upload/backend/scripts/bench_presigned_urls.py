@@ -0,0 +1,4 @@
+from mtfu.benchmarks.bench_presigned_urls_impl import bench_presigned_urls
+
+# Per-page cost of FileView.get before and after the presigned URL cache
+bench_presigned_urls()
@@ -0,0 +1,4 @@
+#!/bin/bash
+
+set -e;
+python3 manage.py shell < ./scripts/bench_presigned_urls.py
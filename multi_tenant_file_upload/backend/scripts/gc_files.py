@@ -0,0 +1,4 @@
+from mtfu.batch.gc_files_impl import gc_files
+
+# Remove the soft deleted files and their S3 objects
+print(gc_files())
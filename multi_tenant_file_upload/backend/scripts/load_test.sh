@@ -0,0 +1,4 @@
+#!/bin/bash
+
+set -e;
+python3 manage.py load_test "$@"
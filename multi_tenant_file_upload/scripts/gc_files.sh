@@ -0,0 +1,5 @@
+#!/bin/bash
+
+reset
+
+docker-compose -f docker-compose.yml run --rm mtfu_backend ./scripts/gc_files.sh